@@ -5,6 +5,7 @@ from config import Config
 from api.routes import api_bp
 from api.feedback import feedback_bp
 from api.category_tree import category_tree_bp
+from api.jobs import jobs_bp, init_jobs
 from flask_jwt_extended import JWTManager
 from database.models import db
 
@@ -34,9 +35,36 @@ def create_app():
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(feedback_bp, url_prefix='/api')
     app.register_blueprint(category_tree_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
 
     @app.route('/health')
     def health():
-        return {"status": "ok"}, 200
+        from api.model_cache import get_registry_status
+        return {"status": "ok", "pid": os.getpid(), **get_registry_status()}, 200
+
+    if Config.PREFORK_MODELS:
+        # gunicorn --preload: модели грузятся в мастере до fork, потоки и БД - в каждом воркере
+        # (start_worker_tasks вызывается из post_fork в gunicorn.conf.py)
+        from api.model_cache import preload_for_fork
+        preload_for_fork()
+    else:
+        start_worker_tasks(app)
 
     return app
+
+
+def start_worker_tasks(app):
+    """Фоновые потоки и подключения воркера (после fork их нельзя наследовать от мастера)"""
+    # Пул обработчиков фоновых задач + восстановление очереди после рестарта
+    init_jobs(app)
+
+    if Config.PRELOAD_MODELS:
+        # Модели маркетплейсов грузятся и прогреваются в фоне при старте воркера
+        # (в режиме prefork уже загруженные в мастере пропускаются)
+        from api.model_cache import start_warmup
+        start_warmup()
+
+    if Config.MODEL_RELOAD_INTERVAL > 0:
+        # Новые версии моделей (после переобучения) подхватываются без рестарта
+        from api.model_cache import start_model_watcher
+        start_model_watcher()
@@ -0,0 +1,195 @@
+"""
+Динамический micro-batching одиночных предсказаний
+
+Одновременные запросы /predict_category к одному маркетплейсу собираются
+в пачку (до MICROBATCH_MAX_SIZE товаров или MICROBATCH_MAX_WAIT_MS миллисекунд)
+и классифицируются одним вызовом модели. Каждый запрос получает свою строку.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import Config
+
+
+class MicroBatcher:
+    """Очередь одиночных предсказаний одного маркетплейса с фоновым потоком-обработчиком"""
+
+    def __init__(self, marketplace, max_batch_size, max_wait_ms):
+        self.marketplace = marketplace
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        # Метрики
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+        self.size_histogram = Counter()
+
+    def submit(self, product_name):
+        """Поставить нормализованное название в очередь, вернуть Future с результатом"""
+        future = Future()
+        self._queue.put((product_name, future))
+        self._ensure_worker()
+        return future
+
+    def _ensure_worker(self):
+        # После fork поток родителя не существует - запускаем заново
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name=f'microbatch-{self.marketplace}', daemon=True
+                )
+                self._thread.start()
+
+    def _collect_batch(self):
+        """Дождаться первого товара, затем добирать до max_batch_size или до истечения max_wait"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            self._process(batch)
+
+    def _process(self, batch):
+        from api.model_cache import get_marketplace_model
+        from api.inference import classify_names, store_predictions
+
+        names = [name for name, _ in batch]
+        try:
+            mp_model = get_marketplace_model(self.marketplace)
+            # Кэш уже проверен в predict_one, здесь только сохраняем новые результаты
+            results = classify_names(mp_model, names, use_cache=False)
+            store_predictions(mp_model, names, results)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen = max(self.max_seen, len(batch))
+            self.size_histogram[len(batch)] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+                'max_batch_size_seen': self.max_seen,
+                'queue_size': self._queue.qsize(),
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.size_histogram.items())}
+            }
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+# Пул для параллельной классификации одного товара по всем маркетплейсам
+_marketplace_executor = None
+
+
+def get_batcher(marketplace):
+    if marketplace not in _batchers:
+        with _batchers_lock:
+            if marketplace not in _batchers:
+                _batchers[marketplace] = MicroBatcher(
+                    marketplace,
+                    max_batch_size=Config.MICROBATCH_MAX_SIZE,
+                    max_wait_ms=Config.MICROBATCH_MAX_WAIT_MS
+                )
+    return _batchers[marketplace]
+
+def predict_one(marketplace, product_name):
+    """Классифицировать одно нормализованное название (через micro-batching, если включён)"""
+    from api.model_cache import get_marketplace_model
+    from api.inference import classify_names
+    from api.exact_match import lookup_exact_matches
+    from api.prediction_cache import prediction_cache, cache_key
+
+    mp_model = get_marketplace_model(marketplace)
+    if not Config.MICROBATCH_ENABLED:
+        return classify_names(mp_model, [product_name])[0]
+
+    # Известное название и результат из кэша отдаём сразу, не дожидаясь сборки пачки
+    exact = lookup_exact_matches(mp_model, [product_name])[0]
+    if exact is not None:
+        return exact
+    if prediction_cache.enabled:
+        cached = prediction_cache.get(cache_key(mp_model, product_name))
+        if cached is not None:
+            return cached
+
+    return get_batcher(marketplace).submit(product_name).result()
+
+def _get_marketplace_executor():
+    global _marketplace_executor
+    if _marketplace_executor is None:
+        with _batchers_lock:
+            if _marketplace_executor is None:
+                _marketplace_executor = ThreadPoolExecutor(
+                    max_workers=len(Config.MARKETPLACES), thread_name_prefix='marketplace-predict'
+                )
+    return _marketplace_executor
+
+def _predict_with_model(marketplace, product_name):
+    from api.model_cache import get_marketplace_model
+    mp_model = get_marketplace_model(marketplace)
+    return mp_model, predict_one(marketplace, product_name)
+
+def predict_all_marketplaces(product_name, marketplaces=None):
+    """
+    Классифицировать одно нормализованное название моделями нескольких маркетплейсов параллельно.
+    Время ответа - время самой медленной модели, а не сумма.
+
+    Returns:
+        {marketplace: (MarketplaceModel, результат) или исключение}
+    """
+    marketplaces = marketplaces or Config.MARKETPLACES
+    executor = _get_marketplace_executor()
+    futures = {
+        marketplace: executor.submit(_predict_with_model, marketplace, product_name)
+        for marketplace in marketplaces
+    }
+
+    results = {}
+    for marketplace, future in futures.items():
+        try:
+            results[marketplace] = future.result()
+        except Exception as e:
+            results[marketplace] = e
+    return results
+
+def get_batching_stats():
+    return {
+        'enabled': Config.MICROBATCH_ENABLED,
+        'max_batch_size': Config.MICROBATCH_MAX_SIZE,
+        'max_wait_ms': Config.MICROBATCH_MAX_WAIT_MS,
+        'marketplaces': {marketplace: batcher.get_stats() for marketplace, batcher in _batchers.items()}
+    }
@@ -3,7 +3,6 @@ API для получения дерева категорий маркетпле
 """
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required
-import pandas as pd
 from pathlib import Path
 from typing import Dict, List
 
@@ -33,6 +32,8 @@ def build_category_tree_from_dataset(csv_file: str) -> Dict:
             }
         }
     """
+    import pandas as pd
+
     if not Path(csv_file).exists():
         return {"categories": [], "tree": {}}
     
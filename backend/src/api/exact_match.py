@@ -0,0 +1,145 @@
+"""
+Ответы без модели для известных названий
+
+1. Исправления пользователей (source = 'correction'): индекс в памяти по маркетплейсам,
+   загружается из хранилища исправлений и пополняется при каждом /feedback/correct.
+   Другие воркеры подхватывают изменения файла исправлений не позже чем через
+   Config.CORRECTIONS_RELOAD_SECONDS.
+2. Обучающий CSV (source = 'exact_match'): индекс строится при загрузке модели маркетплейса
+   из Config.RAW_DATA_FOLDER/{marketplace}_products_list.csv.
+
+В обоих случаях confidence = 1.0.
+"""
+import os
+import threading
+import time
+from config import Config
+
+
+class CorrectionIndex:
+    """(маркетплейс, нормализованное название) -> исправленная категория"""
+
+    def __init__(self, reload_seconds):
+        self.reload_seconds = reload_seconds
+        self._index = None
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _feedback_mtime(self):
+        from api.feedback import FEEDBACK_FILE
+        try:
+            return os.path.getmtime(FEEDBACK_FILE)
+        except OSError:
+            return None
+
+    def _load(self):
+        from api.feedback import load_feedback
+        from api.inference import normalize_product_name
+
+        index = {}
+        # Более поздние исправления важнее ранних
+        for correction in sorted(load_feedback(), key=lambda c: c.get('timestamp', '')):
+            name = normalize_product_name(correction.get('product_name', ''))
+            marketplace = str(correction.get('marketplace', '')).strip().lower()
+            if name and correction.get('corrected_category'):
+                index[(marketplace, name)] = correction['corrected_category']
+        return index
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.reload_seconds:
+            return
+        with self._lock:
+            if self._index is not None and now - self._checked_at < self.reload_seconds:
+                return
+            mtime = self._feedback_mtime()
+            if self._index is None or mtime != self._mtime:
+                self._index = self._load()
+                self._mtime = mtime
+            self._checked_at = now
+
+    def get(self, marketplace, product_name):
+        self._ensure_fresh()
+        return self._index.get((marketplace, product_name))
+
+    def add(self, marketplace, product_name, category_path):
+        """Применить новое исправление сразу (файл уже сохранён вызывающим кодом)"""
+        from api.inference import normalize_product_name
+
+        self._ensure_fresh()
+        with self._lock:
+            self._index[(marketplace, normalize_product_name(product_name))] = category_path
+            self._mtime = self._feedback_mtime()
+
+    def count(self, marketplace=None):
+        self._ensure_fresh()
+        return sum(1 for m, _ in self._index if marketplace is None or m == marketplace)
+
+
+correction_index = CorrectionIndex(Config.CORRECTIONS_RELOAD_SECONDS)
+
+
+def find_training_csv(marketplace):
+    """Путь к обучающему CSV маркетплейса или None"""
+    path = os.path.join(Config.RAW_DATA_FOLDER, f'{marketplace}_products_list.csv')
+    possible_paths = [
+        path,  # "src/data/raw/..." (локальный запуск без --chdir)
+        path.replace('src/', ''),  # "data/raw/..." (Docker с --chdir src)
+        os.path.join('backend', path),  # "backend/src/data/raw/..." (локальная разработка)
+    ]
+    for candidate in possible_paths:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def build_exact_index(marketplace):
+    """
+    Returns:
+        {нормализованное название: category_path} из обучающего CSV
+    """
+    import pandas as pd
+    from api.inference import clean_product_names
+
+    csv_path = find_training_csv(marketplace)
+    if csv_path is None:
+        return {}
+
+    df = pd.read_csv(csv_path, usecols=['product_name', 'category_path'])
+    df = clean_product_names(df)
+    df = df[df['category_path'].notna()]
+
+    # Название, встречающееся в разных категориях, неоднозначно - такие решает модель
+    categories_per_name = df.groupby('product_name')['category_path'].nunique()
+    unambiguous = categories_per_name[categories_per_name == 1].index
+    df = df[df['product_name'].isin(unambiguous)].drop_duplicates(subset=['product_name'])
+    index = dict(zip(df['product_name'], df['category_path']))
+
+    print(f"🔎 Индекс точных совпадений {marketplace}: {len(index)} названий")
+    return index
+
+def exact_match_prediction(product_name, category_path, source='exact_match'):
+    """Результат в формате build_prediction для известного названия"""
+    hierarchy = [level.strip() for level in category_path.split('/')]
+    return {
+        'product_name': product_name,
+        'category': hierarchy[-1] if hierarchy else category_path,
+        'category_path': category_path,
+        'hierarchy': hierarchy,
+        'confidence': 1.0,
+        'top_3': [{'category': category_path, 'confidence': 1.0}],
+        'source': source
+    }
+
+def lookup_exact_matches(mp_model, names):
+    """Результаты для исправленных и известных названий, None - для остальных"""
+    index = mp_model.exact_index
+    results = []
+    for name in names:
+        category_path = correction_index.get(mp_model.marketplace, name)
+        if category_path is not None:
+            results.append(exact_match_prediction(name, category_path, source='correction'))
+            continue
+        category_path = index.get(name)
+        results.append(exact_match_prediction(name, category_path) if category_path is not None else None)
+    return results
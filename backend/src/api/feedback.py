@@ -7,6 +7,7 @@ import json
 import os
 from pathlib import Path
 from datetime import datetime
+from config import Config
 
 feedback_bp = Blueprint('feedback', __name__)
 
@@ -41,6 +42,11 @@ def correct_category():
         for field in required:
             if field not in data:
                 return jsonify({'error': f'Отсутствует поле: {field}'}), 400
+
+        # Тот же ключ маркетплейса, что у предсказаний: иначе исправление не найдётся
+        marketplace = str(data['marketplace']).strip().lower()
+        if marketplace not in Config.MARKETPLACES:
+            return jsonify({'error': f'Неверный маркетплейс. Доступные: {", ".join(Config.MARKETPLACES)}'}), 400
         
         # Загрузить существующие исправления
         feedback_list = load_feedback()
@@ -50,7 +56,7 @@ def correct_category():
             'id': len(feedback_list) + 1,
             'user_id': user_id,
             'product_name': data['product_name'],
-            'marketplace': data['marketplace'],
+            'marketplace': marketplace,
             'predicted_category': data['predicted_category'],
             'corrected_category': data['corrected_category'],
             'confidence': data.get('confidence', 0),
@@ -61,24 +67,29 @@ def correct_category():
         feedback_list.append(correction)
         save_feedback(feedback_list)
         
-        # Получаем marketplace из данных
-        marketplace = data['marketplace']
+
+        # Исправление действует на предсказания сразу, не дожидаясь переобучения
+        from api.exact_match import correction_index
+        correction_index.add(marketplace, data['product_name'], data['corrected_category'])
         
         # Автоматическое переобучение в фоне (если есть новые исправления)
         try:
             # Проверяем количество неиспользованных исправлений
             unused_count = sum(1 for f in feedback_list 
-                             if f.get('marketplace') == marketplace 
+                             if str(f.get('marketplace', '')).strip().lower() == marketplace 
                              and not f.get('used_for_training', False))
             
-            # Если накопилось >= 10 исправлений, запускаем переобучение
-            if unused_count >= 10:
+            # Если накопилось достаточно исправлений, запускаем переобучение
+            if unused_count >= Config.AUTO_RETRAIN_MIN_CORRECTIONS:
                 import threading
                 from training.retrain_with_corrections import retrain_with_corrections
                 
                 def retrain_async():
                     try:
                         retrain_with_corrections(marketplace)
+                        # Подхватываем опубликованную версию сразу, не дожидаясь фоновой проверки
+                        from api.model_cache import check_for_new_version
+                        check_for_new_version(marketplace)
                     except Exception as e:
                         print(f"Ошибка при автоматическом переобучении: {e}")
                 
@@ -94,7 +105,7 @@ def correct_category():
                 return jsonify({
                     'message': 'Исправление сохранено',
                     'correction_id': correction['id'],
-                    'note': f'Накоплено {unused_count}/10 исправлений для автоматического переобучения'
+                    'note': f'Исправление применено. Накоплено {unused_count}/{Config.AUTO_RETRAIN_MIN_CORRECTIONS} исправлений для автоматического переобучения'
                 }), 200
         except Exception as e:
             # Если переобучение не удалось, просто сохраняем исправление
@@ -0,0 +1,246 @@
+"""
+Пакетная классификация товаров: векторизация всей колонки за один вызов
+и предсказание классификатором пачками
+"""
+import re
+import numpy as np
+from config import Config
+
+
+def normalize_product_name(product_name):
+    """Нормализация названия так же, как при обучении (lowercase + схлопывание пробелов)"""
+    product_name = str(product_name).lower().strip()
+    return re.sub(r'\s+', ' ', product_name)
+
+def clean_product_names(df):
+    """Убрать пустые названия и нормализовать колонку product_name (индекс строк сохраняется)"""
+    df = df[df['product_name'].notna()].copy()
+    df['product_name'] = df['product_name'].astype(str).str.lower().str.strip()
+    df['product_name'] = df['product_name'].str.replace(r'\s+', ' ', regex=True)  # множественные пробелы -> один
+    return df[df['product_name'] != '']
+
+def top_k_indices(probs, k=3):
+    """Индексы k самых вероятных классов для каждой строки, по убыванию вероятности"""
+    k = min(k, probs.shape[1])
+    # argpartition находит k лучших за O(n), сортируем только их
+    top = np.argpartition(probs, -k, axis=1)[:, -k:]
+    top_probs = np.take_along_axis(probs, top, axis=1)
+    order = np.argsort(-top_probs, axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+def build_prediction(product_name, probs, top_indices, to_label, source='model'):
+    """Собрать результат для одного товара по строке вероятностей"""
+    pred_label = int(top_indices[0])
+    category_path = to_label.get(pred_label, f'Category_{pred_label}')
+
+    # Разбираем путь на уровни иерархии
+    hierarchy = [level.strip() for level in category_path.split('/')]
+    category_name = hierarchy[-1] if hierarchy else category_path
+
+    top_3 = [
+        {
+            'category': to_label.get(int(idx), f'Category_{int(idx)}'),
+            'confidence': float(probs[int(idx)])
+        }
+        for idx in top_indices
+    ]
+
+    return {
+        'product_name': product_name,
+        'category': category_name,
+        'category_path': category_path,
+        'hierarchy': hierarchy,
+        'confidence': float(probs[pred_label]),
+        'top_3': top_3,
+        'source': source
+    }
+
+def build_error(product_name, error):
+    """Результат для товара, который не удалось классифицировать"""
+    return {
+        'product_name': product_name,
+        'category': 'Error',
+        'confidence': 0,
+        'top_3': [],
+        'error': str(error)
+    }
+
+def _vectorize(vectorizer, names):
+    """
+    Векторизовать все названия одним вызовом.
+    Если вызов упал, векторизуем построчно, чтобы ошибку получили только плохие строки.
+
+    Returns:
+        (X, positions, errors): sparse-матрица, индексы строк в names, {индекс: ошибка}
+    """
+    try:
+        return vectorizer.transform(names), list(range(len(names))), {}
+    except Exception:
+        pass
+
+    from scipy.sparse import vstack
+
+    rows, positions, errors = [], [], {}
+    for i, name in enumerate(names):
+        try:
+            rows.append(vectorizer.transform([name]))
+            positions.append(i)
+        except Exception as e:
+            errors[i] = e
+
+    X = vstack(rows).tocsr() if rows else None
+    return X, positions, errors
+
+def _predict_deep(mp_model, X):
+    if not Config.SPARSE_INPUT:
+        X = X.toarray()
+    _, probs = mp_model.predict_class(X, batch_size=X.shape[0])
+    return probs
+
+def _predict_cascade(mp_model, X):
+    """
+    Линейная модель отвечает на товары с уверенностью не ниже порога,
+    остальные строки классифицирует глубокая модель
+
+    Returns:
+        (probs, sources)
+    """
+    probs = mp_model.linear.predict_proba(X)
+    uncertain = np.flatnonzero(~mp_model.linear.routed(X, probs))
+    if len(uncertain):
+        probs[uncertain] = _predict_deep(mp_model, X[uncertain])
+
+    sources = np.full(X.shape[0], 'linear', dtype=object)
+    sources[uncertain] = 'model'
+    mp_model.count_cascade(linear=X.shape[0] - len(uncertain), model=len(uncertain))
+    return probs, sources
+
+def _predict_rows(mp_model, X, names):
+    """Предсказание для готовой матрицы признаков"""
+    if mp_model.linear is not None:
+        probs, sources = _predict_cascade(mp_model, X)
+    else:
+        probs, sources = _predict_deep(mp_model, X), ['model'] * X.shape[0]
+    top = top_k_indices(probs, 3)
+    return [
+        build_prediction(name, probs[i], top[i], mp_model.to_label, sources[i])
+        for i, name in enumerate(names)
+    ]
+
+def classify_names(mp_model, names, batch_size=None, use_cache=True):
+    """
+    Классифицировать список нормализованных названий
+
+    Args:
+        mp_model: MarketplaceModel из api.model_cache
+        names: список нормализованных названий
+        batch_size: размер пачки для классификатора (по умолчанию Config.PREDICT_BATCH_SIZE)
+        use_cache: брать готовые результаты из кэша предсказаний и сохранять новые
+
+    Returns:
+        список результатов в том же порядке, что и names
+    """
+    from api.exact_match import lookup_exact_matches
+
+    # Одинаковые названия (цвета/размеры одного товара) классифицируем один раз
+    unique_names = list(dict.fromkeys(names))
+    if len(unique_names) < len(names):
+        by_name = dict(zip(unique_names, classify_names(mp_model, unique_names, batch_size, use_cache)))
+        # Копии: у каждой строки файла свои row и confidence
+        return [dict(by_name[name]) for name in names]
+
+    # Названия с известной категорией (обучающий датасет, исправления) - без модели
+    results = lookup_exact_matches(mp_model, names)
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        fresh = _classify_cached(mp_model, [names[i] for i in pending], batch_size, use_cache)
+        for i, result in zip(pending, fresh):
+            results[i] = result
+    return results
+
+def _classify_cached(mp_model, names, batch_size=None, use_cache=True):
+    from api.prediction_cache import prediction_cache, cache_key
+
+    if not use_cache or not prediction_cache.enabled:
+        return _classify_uncached(mp_model, names, batch_size)
+
+    results = [prediction_cache.get(cache_key(mp_model, name)) for name in names]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    # Векторизация и модель - только для названий, которых нет в кэше
+    fresh = _classify_uncached(mp_model, [names[i] for i in missing], batch_size)
+    for i, result in zip(missing, fresh):
+        results[i] = result
+    store_predictions(mp_model, [names[i] for i in missing], fresh)
+
+    return results
+
+def store_predictions(mp_model, names, results):
+    """Сохранить успешные результаты в кэш предсказаний"""
+    from api.prediction_cache import prediction_cache, cache_key
+
+    if not prediction_cache.enabled:
+        return
+    for name, result in zip(names, results):
+        if result.get('source') in ('model', 'linear'):
+            prediction_cache.put(cache_key(mp_model, name), result)
+
+def _classify_uncached(mp_model, names, batch_size=None):
+    batch_size = batch_size or Config.PREDICT_BATCH_SIZE
+    results = [None] * len(names)
+
+    X, positions, errors = _vectorize(mp_model.vectorizer, names)
+    for i, error in errors.items():
+        results[i] = build_error(names[i], error)
+
+    for start in range(0, len(positions), batch_size):
+        chunk = positions[start:start + batch_size]
+        chunk_names = [names[i] for i in chunk]
+        X_chunk = X[start:start + batch_size]
+
+        try:
+            chunk_results = _predict_rows(mp_model, X_chunk, chunk_names)
+        except Exception:
+            # Пачка упала целиком - повторяем построчно, чтобы найти плохие строки
+            chunk_results = []
+            for j, name in enumerate(chunk_names):
+                try:
+                    chunk_results.extend(_predict_rows(mp_model, X_chunk[j], [name]))
+                except Exception as e:
+                    chunk_results.append(build_error(name, e))
+
+        for i, result in zip(chunk, chunk_results):
+            results[i] = result
+
+    return results
+
+def dedup_ratio(total, unique):
+    """Доля строк, не потребовавших отдельной классификации"""
+    return round(1 - unique / total, 4) if total else 0
+
+def classify_csv_chunks(csv_path, mp_model, chunk_size=None):
+    """
+    Читать CSV пачками и классифицировать каждую пачку целиком.
+    В памяти одновременно находится только одна пачка.
+
+    Yields:
+        (results, unique): результаты пачки (confidence в процентах, row - номер строки в файле)
+        и число уникальных названий в пачке
+    """
+    import pandas as pd
+
+    chunk_size = chunk_size or Config.STREAM_CHUNK_SIZE
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        chunk = clean_product_names(chunk)
+        if chunk.empty:
+            continue
+
+        results = classify_names(mp_model, chunk['product_name'].tolist())
+        for row, result in zip(chunk.index, results):
+            if 'error' not in result:
+                result['confidence'] = result['confidence'] * 100
+            result['row'] = int(row)
+
+        yield results, chunk['product_name'].nunique()
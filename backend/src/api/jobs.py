@@ -0,0 +1,335 @@
+"""
+Фоновая классификация больших CSV файлов
+
+/predict_category_from_file?async=1 сохраняет файл и ставит задачу в очередь,
+задачи выполняются пулом потоков (Config.JOB_WORKERS) пачками,
+состояние хранится в таблице classification_jobs и переживает рестарт.
+
+Задача running помечена владельцем (хост:pid:id запуска процесса). Поток job-heartbeat
+каждые JOB_HEARTBEAT_SECONDS обновляет heartbeat_at своих задач и возвращает в очередь
+чужие задачи, владелец которых умер: процесс на этом хосте завершился (или pid занят
+уже новым запуском) либо heartbeat старше JOB_STALE_SECONDS.
+"""
+from flask import Blueprint, Response, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from config import Config
+from database.models import ClassificationJob, db
+
+jobs_bp = Blueprint('jobs', __name__)
+
+_executor = None
+_app = None
+_owner = None
+_heartbeat_thread = None
+
+
+def _job_upload_path(job_id):
+    return os.path.join(Config.UPLOAD_FOLDER, 'jobs', f'{job_id}.csv')
+
+def _job_result_path(job_id):
+    return os.path.join(Config.PROCESSED_FOLDER, 'jobs', f'{job_id}.ndjson')
+
+def _count_rows(path):
+    """Оценка числа строк для прогресса (без заголовка)"""
+    with open(path, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+def _add_missing_columns():
+    """Колонки, появившиеся после создания таблицы (create(checkfirst=True) их не добавляет)"""
+    from sqlalchemy import inspect, text
+
+    existing = {column['name'] for column in inspect(db.engine).get_columns(ClassificationJob.__tablename__)}
+    with db.engine.begin() as connection:
+        for column in ClassificationJob.__table__.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE {ClassificationJob.__tablename__} '
+                                        f'ADD COLUMN {column.name} {column_type}'))
+
+def _owner_is_gone(owner):
+    """Процесс-владелец точно завершился (проверяется только на этом же хосте)"""
+    try:
+        host, pid, boot_id = owner.rsplit(':', 2)
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False  # задача из версии без владельцев - остаётся проверка по времени
+    if host != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        # Тот же pid, но другой запуск (рестарт контейнера): задача осталась от прошлого процесса
+        return owner != _owner
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+def requeue_orphaned_jobs():
+    """
+    Вернуть в очередь задачи running, чей владелец умер
+
+    Returns:
+        id возвращённых задач
+    """
+    stale_before = datetime.now() - timedelta(seconds=Config.JOB_STALE_SECONDS)
+    requeued = []
+    for job in ClassificationJob.query.filter_by(status='running').all():
+        heartbeat = job.heartbeat_at or job.updated_at or job.started_at
+        if job.owner == _owner:
+            continue
+        if not _owner_is_gone(job.owner) and heartbeat is not None and heartbeat >= stale_before:
+            continue
+        # Условие на владельца: задачу не вернёт второй раз параллельная проверка в другом воркере
+        updated = ClassificationJob.query.filter_by(id=job.id, status='running', owner=job.owner).update(
+            {'status': 'queued'}, synchronize_session=False
+        )
+        if updated:
+            requeued.append(job.id)
+    db.session.commit()
+
+    if requeued:
+        print(f"♻️  Возвращено в очередь задач: {len(requeued)}")
+    return requeued
+
+def _heartbeat_loop(interval):
+    while True:
+        time.sleep(interval)
+        with _app.app_context():
+            try:
+                ClassificationJob.query.filter_by(status='running', owner=_owner).update(
+                    {'heartbeat_at': datetime.now()}, synchronize_session=False
+                )
+                db.session.commit()
+                for job_id in requeue_orphaned_jobs():
+                    _executor.submit(_run_job, job_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️  Ошибка проверки фоновых задач: {e}")
+            finally:
+                db.session.remove()
+
+def init_jobs(app):
+    """Создать пул обработчиков, вернуть в очередь задачи, прерванные рестартом, и запустить heartbeat"""
+    global _executor, _app, _owner, _heartbeat_thread
+    _app = app
+    _executor = ThreadPoolExecutor(max_workers=Config.JOB_WORKERS, thread_name_prefix='classification-job')
+    # Новый id при каждом запуске: pid после рестарта контейнера может совпасть
+    _owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    with app.app_context():
+        try:
+            ClassificationJob.__table__.create(db.engine, checkfirst=True)
+            _add_missing_columns()
+            requeue_orphaned_jobs()
+            # queued в очереди пула умершего процесса никто не выполняет
+            pending = [job.id for job in ClassificationJob.query.filter_by(status='queued').all()]
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️  Не удалось восстановить очередь задач: {e}")
+            return
+        finally:
+            db.session.remove()
+
+    for job_id in pending:
+        _executor.submit(_run_job, job_id)
+
+    if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+        _heartbeat_thread = threading.Thread(target=_heartbeat_loop, args=(Config.JOB_HEARTBEAT_SECONDS,),
+                                             name='job-heartbeat', daemon=True)
+        _heartbeat_thread.start()
+
+def submit_job(file_path, marketplace, user_id, filename):
+    """Поставить классификацию файла в очередь. Файл переносится в хранилище задач."""
+    job_id = str(uuid.uuid4())
+    upload_path = _job_upload_path(job_id)
+    os.makedirs(os.path.dirname(upload_path), exist_ok=True)
+    os.replace(file_path, upload_path)
+
+    job = ClassificationJob(
+        id=job_id,
+        user_id=str(user_id) if user_id is not None else None,
+        marketplace=marketplace,
+        filename=filename,
+        status='queued',
+        rows_total=_count_rows(upload_path),
+        created_at=datetime.now()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _executor.submit(_run_job, job_id)
+    return job
+
+def _claim_job(job_id):
+    """Атомарно перевести задачу queued -> running (чтобы её не взяли два обработчика)"""
+    now = datetime.now()
+    claimed = ClassificationJob.query.filter_by(id=job_id, status='queued').update({
+        'status': 'running',
+        'rows_done': 0,
+        'rows_success': 0,
+        'started_at': now,
+        'updated_at': now,
+        'owner': _owner,
+        'heartbeat_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def _run_job(job_id):
+    with _app.app_context():
+        try:
+            if not _claim_job(job_id):
+                return
+            _process_job(job_id)
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ClassificationJob, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = datetime.now()
+                db.session.commit()
+            print(f"❌ Задача {job_id} завершилась с ошибкой: {e}")
+        finally:
+            db.session.remove()
+
+def _process_job(job_id):
+    from api.model_cache import get_marketplace_model
+    from api.inference import classify_csv_chunks
+
+    job = db.session.get(ClassificationJob, job_id)
+    mp_model = get_marketplace_model(job.marketplace)
+    job.model_version = mp_model.version
+    db.session.commit()
+
+    upload_path = _job_upload_path(job_id)
+    result_path = _job_result_path(job_id)
+    os.makedirs(os.path.dirname(result_path), exist_ok=True)
+
+    # Пишем во временный файл: результат появляется только целиком
+    tmp_path = result_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        for results, _ in classify_csv_chunks(upload_path, mp_model):
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+            job.rows_done += len(results)
+            job.rows_success += sum(1 for r in results if 'error' not in r)
+            job.updated_at = datetime.now()
+            job.heartbeat_at = job.updated_at
+            db.session.commit()
+
+    os.replace(tmp_path, result_path)
+
+    job.status = 'done'
+    job.rows_total = job.rows_done
+    job.finished_at = datetime.now()
+    job.updated_at = job.finished_at
+    db.session.commit()
+
+    try:
+        os.remove(upload_path)
+    except OSError:
+        pass
+
+    print(f"✅ Задача {job_id}: {job.rows_done} товаров классифицировано")
+
+def _get_own_job(job_id):
+    """Задача текущего пользователя (админ видит все). None, если нет доступа."""
+    job = db.session.get(ClassificationJob, job_id)
+    if job is None:
+        return None
+    if get_jwt().get('role') != 'admin' and job.user_id != str(get_jwt_identity()):
+        return None
+    return job
+
+def _iter_results(job_id):
+    with open(_job_result_path(job_id), 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def _results_as_csv(job_id):
+    """Результаты задачи в CSV, построчно (без загрузки всего файла в память)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['row', 'product_name', 'category', 'category_path', 'confidence', 'top_3', 'source', 'error'])
+
+    for result in _iter_results(job_id):
+        top_3 = '; '.join(f"{t['category']} ({t['confidence'] * 100:.1f}%)" for t in result.get('top_3', []))
+        writer.writerow([
+            result.get('row'),
+            result['product_name'],
+            result.get('category', ''),
+            result.get('category_path', ''),
+            result.get('confidence', 0),
+            top_3,
+            result.get('source', ''),
+            result.get('error', '')
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+def _results_as_json(job_id, marketplace, model_version, total, success):
+    """Тот же формат, что у синхронного /predict_category_from_file"""
+    yield f'{{"marketplace": {json.dumps(marketplace)}, "model_version": {json.dumps(model_version)}, "results": ['
+    for i, result in enumerate(_iter_results(job_id)):
+        yield (', ' if i else '') + json.dumps(result, ensure_ascii=False)
+    yield f'], "total": {total}, "success": {success}}}'
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def get_job(job_id):
+    """Статус и прогресс задачи"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@jobs_bp.route("/jobs", methods=["GET"])
+@jwt_required()
+def list_jobs():
+    """Задачи текущего пользователя (админ видит все)"""
+    query = ClassificationJob.query
+    if get_jwt().get('role') != 'admin':
+        query = query.filter_by(user_id=str(get_jwt_identity()))
+    jobs = query.order_by(ClassificationJob.created_at.desc()).limit(100).all()
+    return jsonify({'jobs': [job.to_dict() for job in jobs]}), 200
+
+@jobs_bp.route("/jobs/<job_id>/result", methods=["GET"])
+@jwt_required()
+def get_job_result(job_id):
+    """Результат задачи: ?format=json (по умолчанию) или ?format=csv"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != 'done':
+        return jsonify({'error': f'Задача ещё не завершена (status: {job.status})', **job.to_dict()}), 409
+
+    result_format = request.args.get('format', 'json').lower()
+    if result_format == 'csv':
+        download_name = f"classifications_{os.path.splitext(job.filename or job.id)[0]}.csv"
+        return Response(
+            _results_as_csv(job.id),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+        )
+    if result_format == 'json':
+        return Response(
+            _results_as_json(job.id, job.marketplace, job.model_version, job.rows_done, job.rows_success),
+            mimetype='application/json'
+        )
+
+    return jsonify({'error': 'format должен быть json или csv'}), 400
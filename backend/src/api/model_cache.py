@@ -8,63 +8,514 @@ os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 os.environ['TF_FORCE_GPU_ALLOW_GROWTH'] = 'false'
 
-from functools import lru_cache
-from training.processed import load_preprocessing_objects as _load_preprocessing_objects
+import gc
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from training.model_store import get_current_version, get_version_dir
 from config import Config
 
-# Глобальный кэш для моделей
-_model_cache = {}
+# Глобальный кэш для моделей: key -> модель, порядок - от давно использованной к недавней
+_model_cache = OrderedDict()
+_model_cache_lock = threading.RLock()
+_model_cache_hits = {}
+_model_cache_evictions = deque(maxlen=50)
+_model_cache_eviction_count = 0
 _vectorizer_cache = None
 _label_mappings_cache = None
 
+# Реестр моделей по маркетплейсам: marketplace -> MarketplaceModel
+_registry = {}
+# Статус загрузки: marketplace -> 'not_loaded' | 'loading' | 'ready' | 'error'
+_registry_status = {marketplace: 'not_loaded' for marketplace in Config.MARKETPLACES}
+_registry_errors = {}
+# Отдельная блокировка на маркетплейс, чтобы прогрев и запрос не грузили модель дважды
+_registry_locks = {marketplace: threading.Lock() for marketplace in Config.MARKETPLACES}
+_watcher_thread = None
+
+
+class MarketplaceModel:
+    """Всё, что нужно для предсказания категорий одного маркетплейса"""
+
+    def __init__(self, marketplace, vectorizer, to_id, to_label, model, classifier_path, version=None, model_key=None,
+                 exact_index=None, linear=None):
+        self.marketplace = marketplace
+        self.version = version
+        self.model_key = model_key
+        self.vectorizer = vectorizer
+        self.to_id = to_id
+        self.to_label = to_label
+        self.model = model
+        self.classifier_path = classifier_path
+        # Нормализованное название -> category_path известных товаров (api/exact_match.py)
+        self.exact_index = exact_index or {}
+        # Линейная первая ступень каскада (models/linear_model.py) и сколько товаров ответила каждая ступень
+        self.linear = linear
+        self.cascade_counts = {'linear': 0, 'model': 0}
+        self._cascade_lock = threading.Lock()
+        self.input_dim = len(vectorizer.idf_)
+        self.num_classes = len(to_id)
+
+    def predict_class(self, X, batch_size=None):
+        return self.model.predict_class(X, batch_size=batch_size)
+
+    def count_cascade(self, linear, model):
+        with self._cascade_lock:
+            self.cascade_counts['linear'] += linear
+            self.cascade_counts['model'] += model
+
+    def get_cascade_counts(self):
+        with self._cascade_lock:
+            return dict(self.cascade_counts)
+
+
 def get_preprocessing_objects():
     """Получить vectorizer и маппинги категорий (кэшируется)"""
     global _vectorizer_cache, _label_mappings_cache
-    
+
     if _vectorizer_cache is None or _label_mappings_cache is None:
+        from training.processed import load_preprocessing_objects as _load_preprocessing_objects
         vectorizer, to_id, to_label = _load_preprocessing_objects(Config.MODELS_BIN)
         _vectorizer_cache = vectorizer
         _label_mappings_cache = (to_id, to_label)
         print("✅ Preprocessing objects загружены в кэш")
-    
+
     return _vectorizer_cache, _label_mappings_cache[0], _label_mappings_cache[1]
 
 def get_model_key(input_dim, bottleneck_dim, num_classes, classifier_path):
     """Создать ключ для кэша модели"""
     return f"{input_dim}_{bottleneck_dim}_{num_classes}_{classifier_path}"
 
-def get_cached_model(input_dim, bottleneck_dim, num_classes, classifier_path):
-    """Получить модель из кэша или загрузить новую"""
+def _load_model(input_dim, bottleneck_dim, num_classes, classifier_path):
+    """Загрузить классификатор: hierarchical.npz и .npz - NumPy-движком, .h5 - через Keras"""
     # Импортируем только когда модель действительно нужна (lazy import)
     # Это предотвращает падения при старте приложения
+    if os.path.basename(classifier_path) == 'hierarchical.npz':
+        from models.hierarchical_model import HierarchicalClassifier
+        return HierarchicalClassifier.load(classifier_path, beam=Config.HIERARCHICAL_BEAM,
+                                           quantization=Config.INFERENCE_QUANTIZATION)
+
+    if classifier_path.endswith('.npz'):
+        from models.numpy_engine import NumpyClassifier
+        return NumpyClassifier.load(classifier_path, quantization=Config.INFERENCE_QUANTIZATION)
+
     try:
         from models.autoencoder_model import AutoencoderDL
     except Exception as e:
         print(f"❌ Ошибка импорта AutoencoderDL: {e}")
         raise
-    
+
+    model = AutoencoderDL(input_dim=input_dim, bottleneck_dim=bottleneck_dim, num_classes=num_classes)
+    model.load_classifier(classifier_path)
+    return model
+
+def get_model_nbytes(model):
+    """Память под параметры модели (NumpyClassifier и AutoencoderDL считают сами)"""
+    return int(getattr(model, 'nbytes', 0))
+
+def touch_cached_model(model_key):
+    """Отметить использование модели (для LRU)"""
+    with _model_cache_lock:
+        if model_key in _model_cache:
+            _model_cache.move_to_end(model_key)
+            _model_cache_hits[model_key] = _model_cache_hits.get(model_key, 0) + 1
+
+def get_cached_model(input_dim, bottleneck_dim, num_classes, classifier_path):
+    """Получить модель из кэша или загрузить новую"""
     model_key = get_model_key(input_dim, bottleneck_dim, num_classes, classifier_path)
-    
-    if model_key not in _model_cache:
-        print(f"📦 Загрузка модели в кэш: {model_key}")
+
+    with _model_cache_lock:
+        model = _model_cache.get(model_key)
+        if model is not None:
+            touch_cached_model(model_key)
+            print(f"♻️  Использование модели из кэша")
+            return model
+
+    print(f"📦 Загрузка модели в кэш: {model_key}")
+    try:
+        model = _load_model(input_dim, bottleneck_dim, num_classes, classifier_path)
+    except Exception as e:
+        print(f"❌ Ошибка загрузки модели: {e}")
+        raise
+
+    with _model_cache_lock:
+        _model_cache[model_key] = model
+        _model_cache_hits[model_key] = 0
+        print(f"✅ Модель загружена в кэш ({get_model_nbytes(model) / 2**20:.1f} MB)")
+        _evict_over_budget()
+
+    return model
+
+def _evict_over_budget():
+    """Вытеснять давно не использованные модели, пока кэш не уложится в Config.MODEL_CACHE_MAX_MB"""
+    budget = Config.MODEL_CACHE_MAX_MB * 2**20
+    if budget <= 0:
+        return
+
+    # Последнюю (только что загруженную) модель не вытесняем, даже если она одна больше бюджета
+    while len(_model_cache) > 1 and sum(get_model_nbytes(m) for m in _model_cache.values()) > budget:
+        model_key = next(iter(_model_cache))
+        _evict_model(model_key, reason='memory_budget')
+
+def _evict_model(model_key, reason):
+    global _model_cache_eviction_count
+    model = _model_cache.pop(model_key)
+    _model_cache_hits.pop(model_key, None)
+    nbytes = get_model_nbytes(model)
+
+    # Модель вытесненного маркетплейса снимаем с реестра - следующий запрос загрузит её заново.
+    # Блокировку реестра берём без ожидания: держащий её поток (загрузка, горячая замена) может ждать
+    # _model_cache_lock, который держим мы. Занятый маркетплейс пропускаем - его запись и так сейчас меняется
+    for marketplace, mp_model in list(_registry.items()):
+        if mp_model.model is not model:
+            continue
+        if not _registry_locks[marketplace].acquire(blocking=False):
+            continue
         try:
-            model = AutoencoderDL(input_dim=input_dim, bottleneck_dim=bottleneck_dim, num_classes=num_classes)
-            model.load_classifier(classifier_path)
-            _model_cache[model_key] = model
-            print(f"✅ Модель загружена в кэш")
+            if _registry.get(marketplace) is mp_model:
+                _registry.pop(marketplace)
+                _registry_status[marketplace] = 'not_loaded'
+        finally:
+            _registry_locks[marketplace].release()
+
+    _model_cache_eviction_count += 1
+    _model_cache_evictions.append({
+        'key': model_key,
+        'bytes': nbytes,
+        'reason': reason,
+        'evicted_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    })
+    print(f"🗑️  Модель вытеснена из кэша ({reason}, {nbytes / 2**20:.1f} MB): {model_key}")
+
+    # Запросы, которые ещё держат модель, доработают на ней; память освободится вместе с последней ссылкой
+    del model
+    _release_backend_memory()
+
+def _release_backend_memory():
+    """Собрать циклические ссылки Keras-моделей и сбросить глобальное состояние Keras, если Keras-моделей не осталось"""
+    gc.collect()
+    if 'keras' not in sys.modules:
+        return
+    from models.numpy_engine import NumpyClassifier
+    from models.hierarchical_model import HierarchicalClassifier
+    if all(isinstance(m, (NumpyClassifier, HierarchicalClassifier)) for m in _model_cache.values()):
+        import keras
+        keras.backend.clear_session()
+        gc.collect()
+
+def get_model_cache_stats():
+    """Занятость кэша моделей и последние вытеснения (для /admin/model_cache)"""
+    with _model_cache_lock:
+        entries = [
+            {
+                'key': model_key,
+                'bytes': get_model_nbytes(model),
+                'engine': type(model).__name__,
+                'hits': _model_cache_hits.get(model_key, 0),
+                'marketplaces': [m for m, mp in _registry.items() if mp.model is model]
+            }
+            for model_key, model in reversed(_model_cache.items())  # недавно использованные первыми
+        ]
+        used = sum(entry['bytes'] for entry in entries)
+        return {
+            'budget_bytes': Config.MODEL_CACHE_MAX_MB * 2**20,
+            'used_bytes': used,
+            'models': len(entries),
+            'entries': entries,
+            'evictions': _model_cache_eviction_count,
+            'recent_evictions': list(reversed(_model_cache_evictions))
+        }
+
+def get_file_version(path):
+    """Версия модели - короткий хэш содержимого файла классификатора"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()[:12]
+
+def find_classifier_path(model_dir, filename='classifier.h5'):
+    """Найти файл классификатора (пути зависят от того, откуда запущен сервер)"""
+    possible_paths = [
+        os.path.join(model_dir, filename),
+        os.path.join(model_dir.replace('src/', ''), filename),
+        os.path.join('backend', model_dir, filename),
+    ]
+
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+
+    raise FileNotFoundError(f'Не найдена модель в {model_dir}. Пробовали пути: {possible_paths}')
+
+def _find_engine_classifier_path(model_dir):
+    """Файл классификатора для выбранного движка (Config.INFERENCE_ENGINE)"""
+    # Иерархическая модель - если она включена или версия обучена только в иерархическом режиме
+    try:
+        hierarchical_path = find_classifier_path(model_dir, 'hierarchical.npz')
+    except FileNotFoundError:
+        hierarchical_path = None
+        if Config.HIERARCHICAL_CLASSIFIER:
+            print(f"⚠️  hierarchical.npz не найден в {model_dir}, используется плоская модель")
+    else:
+        h5_path = os.path.join(os.path.dirname(hierarchical_path), 'classifier.h5')
+        if Config.HIERARCHICAL_CLASSIFIER or not os.path.exists(h5_path):
+            return hierarchical_path
+
+    # Квантованные веса поддерживает только NumPy-движок
+    if Config.INFERENCE_ENGINE == 'numpy' or Config.INFERENCE_QUANTIZATION != 'none':
+        try:
+            npz_path = find_classifier_path(model_dir, 'classifier.npz')
+        except FileNotFoundError:
+            print(f"⚠️  classifier.npz не найден в {model_dir}, используется Keras. "
+                  f"Выгрузите веса: python -m training.export_numpy_weights")
+        else:
+            h5_path = os.path.join(os.path.dirname(npz_path), 'classifier.h5')
+            if not os.path.exists(h5_path) or os.path.getmtime(npz_path) >= os.path.getmtime(h5_path):
+                return npz_path
+            print(f"⚠️  {npz_path} старее classifier.h5, используется Keras. "
+                  f"Выгрузите веса: python -m training.export_numpy_weights")
+
+    return find_classifier_path(model_dir, 'classifier.h5')
+
+def _build_exact_index(marketplace):
+    if not Config.EXACT_MATCH_ENABLED:
+        return {}
+    from api.exact_match import build_exact_index
+    try:
+        return build_exact_index(marketplace)
+    except Exception as e:
+        # Без индекса всё классифицирует модель
+        print(f"⚠️  Не удалось построить индекс точных совпадений {marketplace}: {e}")
+        return {}
+
+def _load_linear(model_dir):
+    """Линейная ступень каскада, если она обучена для этой версии"""
+    if not Config.CASCADE_ENABLED:
+        return None
+    try:
+        path = find_classifier_path(model_dir, 'linear.npz')
+    except FileNotFoundError:
+        return None
+
+    from models.linear_model import LinearClassifier
+    try:
+        linear = LinearClassifier.load(path)
+    except Exception as e:
+        # Без линейной ступени все товары классифицирует глубокая модель
+        print(f"⚠️  Не удалось загрузить линейную модель {path}: {e}")
+        return None
+
+    # Версии, обученные до CASCADE_MIN_THRESHOLD, могли подобрать порог, при котором
+    # линейная модель отвечает почти на всё с низкой уверенностью
+    if linear.threshold < Config.CASCADE_MIN_THRESHOLD:
+        print(f"⚠️  Порог линейной модели {linear.threshold:.2f} поднят до {Config.CASCADE_MIN_THRESHOLD:.2f}")
+        linear.threshold = Config.CASCADE_MIN_THRESHOLD
+    return linear
+
+def load_marketplace_model(marketplace):
+    """Загрузить vectorizer, маппинги и классификатор активной версии маркетплейса и прогреть их"""
+    # pandas/sklearn импортируются только здесь, чтобы /health отвечал до загрузки моделей
+    from training.processed import load_preprocessing_objects as _load_preprocessing_objects
+
+    # Все артефакты читаются из одной директории версии - vectorizer и модель всегда согласованы
+    version, model_dir = get_version_dir(os.path.join(Config.MODELS_BIN, marketplace))
+    vectorizer, to_id, to_label = _load_preprocessing_objects(model_dir)
+    classifier_path = _find_engine_classifier_path(model_dir)
+
+    model_params = dict(
+        input_dim=len(vectorizer.idf_),
+        bottleneck_dim=Config.BOTTLENECK_DIMS[marketplace],
+        num_classes=len(to_id),
+        classifier_path=classifier_path
+    )
+    model = get_cached_model(**model_params)
+    mp_model = MarketplaceModel(
+        marketplace, vectorizer, to_id, to_label, model, classifier_path,
+        # Старый формат без версий: версия - хэш файла классификатора
+        version=version or get_file_version(classifier_path),
+        model_key=get_model_key(**model_params),
+        exact_index=_build_exact_index(marketplace),
+        linear=_load_linear(model_dir)
+    )
+
+    # Прогрев: первый predict строит граф TensorFlow, делаем это до первого запроса
+    X = vectorizer.transform([''])
+    if not Config.SPARSE_INPUT:
+        X = X.toarray()
+    mp_model.predict_class(X)
+
+    return mp_model
+
+def get_marketplace_model(marketplace):
+    """Получить модель маркетплейса из реестра (загружается при первом обращении)"""
+    if marketplace not in _registry_locks:
+        raise ValueError(f'Неверный маркетплейс. Доступные: {", ".join(Config.MARKETPLACES)}')
+
+    mp_model = _registry.get(marketplace)
+    if mp_model is not None:
+        touch_cached_model(mp_model.model_key)
+        return mp_model
+
+    with _registry_locks[marketplace]:
+        # Пока ждали блокировку, модель мог загрузить другой поток
+        if marketplace in _registry:
+            return _registry[marketplace]
+
+        _registry_status[marketplace] = 'loading'
+        try:
+            mp_model = load_marketplace_model(marketplace)
         except Exception as e:
-            print(f"❌ Ошибка загрузки модели: {e}")
+            _registry_status[marketplace] = 'error'
+            _registry_errors[marketplace] = str(e)
             raise
-    else:
-        print(f"♻️  Использование модели из кэша")
-    
-    return _model_cache[model_key]
+
+        _registry[marketplace] = mp_model
+        _registry_status[marketplace] = 'ready'
+        _registry_errors.pop(marketplace, None)
+        print(f"✅ Модель {marketplace} готова к работе")
+
+    return mp_model
+
+def unload_marketplace_model(marketplace):
+    """Выгрузить модель маркетплейса (после переобучения следующий запрос загрузит новую)"""
+    with _registry_locks[marketplace]:
+        mp_model = _registry.pop(marketplace, None)
+        _registry_status[marketplace] = 'not_loaded'
+        if mp_model is not None:
+            _drop_cached_model(mp_model)
+            print(f"🗑️  Модель {marketplace} выгружена")
+
+def _drop_cached_model(mp_model):
+    with _model_cache_lock:
+        for key in [k for k, m in _model_cache.items() if m is mp_model.model]:
+            del _model_cache[key]
+            _model_cache_hits.pop(key, None)
+        _release_backend_memory()
+
+def check_for_new_version(marketplace):
+    """
+    Перезагрузить модель, если опубликована новая версия.
+    Старая модель обслуживает запросы, пока новая загружается и прогревается,
+    затем ссылка в реестре подменяется одним присваиванием.
+
+    Returns:
+        True, если модель была заменена
+    """
+    current = _registry.get(marketplace)
+    if current is None:
+        # Модель ещё не загружена - первый запрос сам возьмёт актуальную версию
+        return False
+
+    version = get_current_version(os.path.join(Config.MODELS_BIN, marketplace))
+    if version is None or version == current.version:
+        return False
+
+    with _registry_locks[marketplace]:
+        old = _registry.get(marketplace)
+        if old is None or old.version == version:
+            return False
+
+        print(f"🔄 Новая версия модели {marketplace}: {old.version} -> {version}")
+        try:
+            new = load_marketplace_model(marketplace)
+        except Exception as e:
+            # Продолжаем работать на старой версии
+            _registry_errors[marketplace] = f'Не удалось загрузить версию {version}: {e}'
+            print(f"❌ Не удалось загрузить новую версию {marketplace}: {e}")
+            return False
+
+        _registry[marketplace] = new
+        _registry_errors.pop(marketplace, None)
+        _drop_cached_model(old)
+
+    from api.prediction_cache import prediction_cache
+    prediction_cache.invalidate(marketplace, version=old.version)
+    print(f"✅ Модель {marketplace} переключена на версию {new.version}")
+    return True
+
+def check_all_versions():
+    for marketplace in Config.MARKETPLACES:
+        try:
+            check_for_new_version(marketplace)
+        except Exception as e:
+            print(f"❌ Ошибка проверки версии модели {marketplace}: {e}")
+
+def _watch_versions(interval):
+    while True:
+        time.sleep(interval)
+        check_all_versions()
+
+def start_model_watcher(interval=None):
+    """Фоновая проверка новых версий моделей раз в interval секунд (Config.MODEL_RELOAD_INTERVAL)"""
+    global _watcher_thread
+    interval = interval or Config.MODEL_RELOAD_INTERVAL
+    if _watcher_thread is not None and _watcher_thread.is_alive():
+        return _watcher_thread
+
+    _watcher_thread = threading.Thread(target=_watch_versions, args=(interval,), name='model-watcher', daemon=True)
+    _watcher_thread.start()
+    return _watcher_thread
+
+def preload_for_fork():
+    """
+    Загрузить модели в мастере gunicorn до fork (Config.PREFORK_MODELS).
+    Массивы весов NumPy-движка и vectorizer'ы после fork остаются общими страницами.
+    TensorFlow после fork небезопасен (пулы потоков мастера не копируются),
+    поэтому Keras-модели загружаются уже в воркерах.
+    """
+    if Config.INFERENCE_ENGINE != 'numpy' and Config.INFERENCE_QUANTIZATION == 'none':
+        print("⚠️  PREFORK_MODELS работает с INFERENCE_ENGINE=numpy; Keras-модели загрузятся в воркерах")
+        return
+
+    warmup_models()
+    # Объекты мастера больше не трогает сборщик мусора - меньше страниц копируется в воркерах
+    gc.freeze()
+    print(f"✅ Модели загружены до fork: {', '.join(_registry)}")
+
+def warmup_models():
+    """Загрузить и прогреть модели всех маркетплейсов"""
+    for marketplace in Config.MARKETPLACES:
+        try:
+            get_marketplace_model(marketplace)
+        except Exception as e:
+            print(f"❌ Не удалось загрузить модель {marketplace}: {e}")
+
+def start_warmup():
+    """Запустить прогрев моделей в фоне, чтобы воркер сразу начал отвечать"""
+    thread = threading.Thread(target=warmup_models, name='model-warmup', daemon=True)
+    thread.start()
+    return thread
+
+def get_registry_status():
+    """Состояние реестра моделей для /health"""
+    models = {}
+    for marketplace in Config.MARKETPLACES:
+        models[marketplace] = {'status': _registry_status[marketplace]}
+        if marketplace in _registry:
+            models[marketplace]['version'] = _registry[marketplace].version
+            if _registry[marketplace].linear is not None:
+                models[marketplace]['cascade'] = _registry[marketplace].get_cascade_counts()
+        if marketplace in _registry_errors:
+            models[marketplace]['error'] = _registry_errors[marketplace]
+
+    return {
+        'ready': all(_registry_status[m] == 'ready' for m in Config.MARKETPLACES),
+        'models': models
+    }
 
 def clear_cache():
     """Очистить кэш моделей (для тестирования)"""
     global _model_cache, _vectorizer_cache, _label_mappings_cache
-    _model_cache.clear()
+    with _model_cache_lock:
+        _model_cache.clear()
+        _model_cache_hits.clear()
+    _registry.clear()
+    _registry_errors.clear()
+    for marketplace in Config.MARKETPLACES:
+        _registry_status[marketplace] = 'not_loaded'
     _vectorizer_cache = None
     _label_mappings_cache = None
     print("🗑️  Кэш моделей очищен")
-
@@ -0,0 +1,82 @@
+"""
+LRU-кэш результатов предсказаний с TTL
+
+Ключ - (маркетплейс, версия модели, нормализованное название), поэтому после
+переобучения старые записи перестают находиться и вытесняются сами.
+"""
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+
+class PredictionCache:
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._data = OrderedDict()  # key -> (expires_at, payload)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        """Копия сохранённого результата или None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+        # Копия: вызывающий код дописывает в результат свои поля (row, confidence в %)
+        return dict(payload)
+
+    def put(self, key, payload):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, dict(payload))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, marketplace=None, version=None):
+        """Удалить записи маркетплейса (только указанной версии модели) или все"""
+        with self._lock:
+            if marketplace is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if k[0] == marketplace and version in (None, k[1])]:
+                    del self._data[key]
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions
+            }
+
+
+prediction_cache = PredictionCache(Config.PREDICTION_CACHE_SIZE, Config.PREDICTION_CACHE_TTL)
+
+
+def cache_key(mp_model, product_name):
+    return (mp_model.marketplace, mp_model.version, product_name)
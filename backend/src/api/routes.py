@@ -1,9 +1,7 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file
 import json
 import os
 import re
-import pandas as pd
-import numpy as np
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from werkzeug.utils import secure_filename
 from database.models import User, db
@@ -87,6 +85,8 @@ def upload():
 @api_bp.route("/preprocess", methods=["POST"])
 @jwt_required()
 def preprocess():
+    import numpy as np
+    import pandas as pd
     from tensorflow.keras.preprocessing.text import Tokenizer
     from tensorflow.keras.preprocessing.sequence import pad_sequences
 
@@ -116,6 +116,7 @@ def preprocess():
 @api_bp.route("/predict", methods=["POST"])
 @jwt_required()
 def predict():
+    import numpy as np
     from models.autoencoder_model import AutoencoderDL
     data = request.get_json()
     if "features" in data:
@@ -137,8 +138,9 @@ def predict():
 @api_bp.route("/predict_category", methods=["POST"])
 @jwt_required()
 def predict_category():
-    from training.processed import load_preprocessing_objects
-    from models.autoencoder_model import AutoencoderDL
+    from api.model_cache import get_marketplace_model
+    from api.inference import normalize_product_name
+    from api.batching import predict_one
 
     data = request.get_json()
     product_name = data.get('product_name', '').strip()
@@ -147,79 +149,200 @@ def predict_category():
     if not product_name:
         return jsonify({'error': 'product_name не указано'}), 400
 
-    valid_marketplaces = ['wildberries', 'ozon', 'yandex_market']
+    valid_marketplaces = Config.MARKETPLACES
     if marketplace not in valid_marketplaces:
         return jsonify({'error': f'Неверный маркетплейс. Доступные: {", ".join(valid_marketplaces)}'}), 400
 
-    product_name_normalized = product_name.lower().strip()
-    product_name_normalized = re.sub(r'\s+', ' ', product_name_normalized)
+    product_name_normalized = normalize_product_name(product_name)
+
+    # Модель берётся из реестра (загружена и прогрета при старте воркера)
+    try:
+        mp_model = get_marketplace_model(marketplace)
+    except FileNotFoundError as e:
+        return jsonify({'error': f'Не найдена модель для маркетплейса {marketplace}: {str(e)}'}), 500
+
+    # Одновременные запросы собираются в одну пачку для модели (api/batching.py)
+    prediction = predict_one(marketplace, product_name_normalized)
+    if 'error' in prediction:
+        return jsonify({'error': prediction['error']}), 500
 
-    model_dir = os.path.join(Config.MODELS_BIN, marketplace)
-    vectorizer, to_id, to_label = load_preprocessing_objects(model_dir)
+    return json.dumps(
+        _prediction_response(product_name, marketplace, mp_model, prediction),
+        ensure_ascii=False, indent=2
+    ), 200
 
-    X = vectorizer.transform([product_name_normalized]).toarray()
-    input_dim = X.shape[1]
-    num_classes = len(to_id)
-    
 
-    bottleneck_dims = {
-        'wildberries': 128,
-        'ozon': 128,
-        'yandex_market': 256
+def _prediction_response(product_name, marketplace, mp_model, prediction):
+    """Поля ответа /predict_category для одного товара"""
+    return {
+        'product_name': product_name,
+        'marketplace': marketplace,
+        'model_version': mp_model.version,
+        'category': prediction['category'],
+        'category_path': prediction['category_path'],
+        'hierarchy': prediction['hierarchy'],
+        'confidence': prediction['confidence'],
+        'top_3': prediction['top_3'],
+        'source': prediction.get('source', 'model')
     }
-    bottleneck_dim = bottleneck_dims[marketplace]
-    
-    possible_paths = [
-        os.path.join(model_dir, 'classifier.h5'),
-        os.path.join(model_dir.replace('src/', ''), 'classifier.h5'),
-        os.path.join('backend', model_dir, 'classifier.h5'),
-    ]
-    
-    classifier_path = None
-    for path in possible_paths:
-        if os.path.exists(path):
-            classifier_path = path
-            break
-    
-    if not classifier_path:
-        return jsonify({'error': f'Не найдена модель для маркетплейса {marketplace}. Пробовали пути: {possible_paths}'}), 500
-    
-    # Загружаем модель
-    model = AutoencoderDL(input_dim=input_dim, bottleneck_dim=bottleneck_dim, num_classes=num_classes)
-    model.load_classifier(classifier_path)
-
-    pred_labels, pred_probs = model.predict_class(X)
-    pred_label = pred_labels[0]
-    confidence = float(pred_probs[0].max())
-
-    top_3_indices = pred_probs[0].argsort()[-3:][::-1]
-    top_3 = [
-        {
-            'category': to_label.get(idx, f'Category_{idx}'),
-            'confidence': float(pred_probs[0][idx])
-        }
-        for idx in top_3_indices
-    ]
-
-    category_path = to_label.get(pred_label, f'Category_{pred_label}')
-    
-    hierarchy = [level.strip() for level in category_path.split('/')]
-    category_name = hierarchy[-1] if hierarchy else category_path
+
+
+@api_bp.route("/similar_products", methods=["POST"])
+@jwt_required()
+def similar_products():
+    """
+    Ближайшие к названию товары обучающего датасета и их категории
+    (для проверки предсказаний с низкой уверенностью).
+    Тело: {"product_name": "...", "marketplace": "wildberries", "k": 10}
+    """
+    from api.model_cache import get_marketplace_model
+    from api.inference import normalize_product_name
+    from api.similar_products import find_similar_products
+
+    data = request.get_json(silent=True) or {}
+    product_name = str(data.get('product_name') or '').strip()
+    marketplace = str(data.get('marketplace') or 'wildberries').strip().lower()
+
+    if not product_name:
+        return jsonify({'error': 'product_name не указано'}), 400
+    if marketplace not in Config.MARKETPLACES:
+        return jsonify({'error': f'Неверный маркетплейс. Доступные: {", ".join(Config.MARKETPLACES)}'}), 400
+    try:
+        k = int(data.get('k', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k должен быть целым числом'}), 400
+    if not 1 <= k <= Config.SIMILAR_PRODUCTS_MAX_K:
+        return jsonify({'error': f'k должен быть от 1 до {Config.SIMILAR_PRODUCTS_MAX_K}'}), 400
+
+    try:
+        mp_model = get_marketplace_model(marketplace)
+        neighbors, search_ms = find_similar_products(mp_model, normalize_product_name(product_name), k)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
 
     return json.dumps({
         'product_name': product_name,
         'marketplace': marketplace,
-        'category': category_name,
-        'category_path': category_path,
-        'hierarchy': hierarchy,
-        'confidence': confidence,
-        'top_3': top_3
+        'model_version': mp_model.version,
+        'neighbors': neighbors,
+        'search_ms': round(search_ms, 2)
     }, ensure_ascii=False, indent=2), 200
 
 
+@api_bp.route("/predict_category/all_marketplaces", methods=["POST"])
+@jwt_required()
+def predict_category_all_marketplaces():
+    """
+    Категория одного товара сразу на всех маркетплейсах.
+    Тело: {"product_name": "...", "marketplaces": ["wildberries", "ozon"]} (marketplaces необязателен).
+    Модели маркетплейсов работают параллельно.
+    """
+    from api.inference import normalize_product_name
+    from api.batching import predict_all_marketplaces
+
+    data = request.get_json(silent=True) or {}
+    product_name = str(data.get('product_name') or '').strip()
+    marketplaces = data.get('marketplaces') or Config.MARKETPLACES
+
+    if not product_name:
+        return jsonify({'error': 'product_name не указано'}), 400
+    if not isinstance(marketplaces, list):
+        return jsonify({'error': 'marketplaces должен быть списком'}), 400
+
+    marketplaces = [str(m).strip().lower() for m in marketplaces]
+    invalid = [m for m in marketplaces if m not in Config.MARKETPLACES]
+    if invalid:
+        return jsonify({'error': f'Неверный маркетплейс: {", ".join(invalid)}. Доступные: {", ".join(Config.MARKETPLACES)}'}), 400
+
+    predictions = predict_all_marketplaces(normalize_product_name(product_name), list(dict.fromkeys(marketplaces)))
+
+    results = {}
+    for marketplace, outcome in predictions.items():
+        if isinstance(outcome, Exception):
+            results[marketplace] = {'error': str(outcome)}
+            continue
+        mp_model, prediction = outcome
+        if 'error' in prediction:
+            results[marketplace] = {'error': prediction['error']}
+            continue
+        results[marketplace] = _prediction_response(product_name, marketplace, mp_model, prediction)
+        del results[marketplace]['product_name']
+
+    return json.dumps({
+        'product_name': product_name,
+        'results': results,
+        'success': len([r for r in results.values() if 'error' not in r])
+    }, ensure_ascii=False, indent=2), 200
+
+
+@api_bp.route("/predict_category/batch", methods=["POST"])
+@jwt_required()
+def predict_category_batch():
+    """
+    Классификация списка товаров одним запросом.
+
+    Тело: {"marketplace": "wildberries", "items": ["название", {"product_name": "...", "marketplace": "ozon"}, ...]}
+    marketplace на уровне запроса - значение по умолчанию для элементов без своего.
+    Товары группируются по маркетплейсу, каждая группа классифицируется одним вызовом модели.
+    Результаты возвращаются в порядке items, ошибка одного товара не роняет остальные.
+    """
+    from api.model_cache import get_marketplace_model
+    from api.inference import normalize_product_name, classify_names
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    default_marketplace = str(data.get('marketplace') or 'wildberries').strip().lower()
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items должен быть непустым списком'}), 400
+    if len(items) > Config.BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Слишком много товаров в запросе: {len(items)} (максимум {Config.BATCH_MAX_ITEMS})'}), 413
+
+    results = [None] * len(items)
+    groups = {}  # marketplace -> [(позиция, исходное название, нормализованное название)]
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            product_name = str(item.get('product_name') or '').strip()
+            marketplace = str(item.get('marketplace') or default_marketplace).strip().lower()
+        else:
+            product_name = str(item or '').strip()
+            marketplace = default_marketplace
+
+        if not product_name:
+            results[i] = {'product_name': product_name, 'marketplace': marketplace, 'error': 'product_name не указано'}
+        elif marketplace not in Config.MARKETPLACES:
+            results[i] = {'product_name': product_name, 'marketplace': marketplace,
+                          'error': f'Неверный маркетплейс. Доступные: {", ".join(Config.MARKETPLACES)}'}
+        else:
+            groups.setdefault(marketplace, []).append((i, product_name, normalize_product_name(product_name)))
+
+    for marketplace, group in groups.items():
+        try:
+            mp_model = get_marketplace_model(marketplace)
+            predictions = classify_names(mp_model, [normalized for _, _, normalized in group])
+        except Exception as e:
+            for i, product_name, _ in group:
+                results[i] = {'product_name': product_name, 'marketplace': marketplace, 'error': str(e)}
+            continue
+
+        for (i, product_name, _), prediction in zip(group, predictions):
+            if 'error' in prediction:
+                results[i] = {'product_name': product_name, 'marketplace': marketplace, 'error': prediction['error']}
+            else:
+                results[i] = _prediction_response(product_name, marketplace, mp_model, prediction)
+
+    return jsonify({
+        'results': results,
+        'total': len(results),
+        'success': len([r for r in results if 'error' not in r])
+    }), 200
+
+
 @api_bp.route("/predict_category_from_file", methods=["POST"])
 @jwt_required()
 def predict_category_from_file():
+    import pandas as pd
+
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -234,7 +357,7 @@ def predict_category_from_file():
             return jsonify({'error': 'Only CSV files are supported'}), 400
 
         # Валидация маркетплейса
-        valid_marketplaces = ['wildberries', 'ozon', 'yandex_market']
+        valid_marketplaces = Config.MARKETPLACES
         if marketplace not in valid_marketplaces:
             return jsonify({'error': f'Неверный маркетплейс. Доступные: {", ".join(valid_marketplaces)}'}), 400
 
@@ -243,105 +366,54 @@ def predict_category_from_file():
         os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
         file.save(temp_path)
 
+        stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+        run_async = request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
         try:
-            df = pd.read_csv(temp_path)
+            # В потоковом и фоновом режимах читаем только заголовок, строки - пачками
+            df = pd.read_csv(temp_path, nrows=0 if stream or run_async else None)
         except Exception as e:
             return jsonify({'error': f'Failed to read CSV: {str(e)}'}), 400
 
         if 'product_name' not in df.columns:
             return jsonify({'error': 'CSV must have a "product_name" column'}), 400
 
+        if run_async:
+            # Файл классифицируется в фоне, прогресс - GET /jobs/<job_id>
+            from api.jobs import submit_job
+            job = submit_job(temp_path, marketplace, get_jwt_identity(), filename)
+            return jsonify(job.to_dict()), 202
+
+        # Модель маркетплейса из реестра (vectorizer, маппинги и классификатор)
+        from api.model_cache import get_marketplace_model
+        from api.inference import classify_names, clean_product_names, dedup_ratio
+
+        try:
+            mp_model = get_marketplace_model(marketplace)
+        except FileNotFoundError as e:
+            return jsonify({'error': f'Не найдена модель для маркетплейса {marketplace}: {str(e)}'}), 500
+
+        if stream:
+            return Response(
+                _stream_file_predictions(temp_path, mp_model, marketplace),
+                mimetype='application/x-ndjson',
+                headers={'X-Accel-Buffering': 'no'}  # чтобы прокси не буферизовал ответ
+            )
+
         # Очищаем данные
-        df = df[df['product_name'].notna()]
-        df['product_name'] = df['product_name'].astype(str).str.lower().str.strip()
-        df['product_name'] = df['product_name'].str.replace(r'\s+', ' ', regex=True)  # множественные пробелы -> один
-        df = df[df['product_name'] != '']
+        df = clean_product_names(df)
 
         if df.empty:
             return jsonify({'error': 'No valid product names in file'}), 400
 
-        # Загружаем preprocessing objects
-        from training.processed import load_preprocessing_objects
-        from models.autoencoder_model import AutoencoderDL
-        
-        # Путь к модели для конкретного маркетплейса
-        model_dir = os.path.join(Config.MODELS_BIN, marketplace)
-        vectorizer, to_id, to_label = load_preprocessing_objects(model_dir)
-        num_classes = len(to_id)
-
-        # Получаем размерность из первого примера
-        sample_X = vectorizer.transform([df['product_name'].iloc[0]]).toarray()
-        input_dim = sample_X.shape[1]
-        
-        # Определяем bottleneck_dim
-        bottleneck_dims = {
-            'wildberries': 128,
-            'ozon': 128,
-            'yandex_market': 256
-        }
-        bottleneck_dim = bottleneck_dims[marketplace]
-        
-        # Путь к модели
-        possible_paths = [
-            os.path.join(model_dir, 'classifier.h5'),
-            os.path.join(model_dir.replace('src/', ''), 'classifier.h5'),
-            os.path.join('backend', model_dir, 'classifier.h5'),
-        ]
-        
-        classifier_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                classifier_path = path
-                break
-        
-        if not classifier_path:
-            return jsonify({'error': f'Не найдена модель для маркетплейса {marketplace}. Пробовали пути: {possible_paths}'}), 500
-        
-        # Загружаем модель
-        model = AutoencoderDL(input_dim=input_dim, bottleneck_dim=bottleneck_dim, num_classes=num_classes)
-        model.load_classifier(classifier_path)
-
-        results = []
-        for idx, product_name in enumerate(df['product_name'].values):
-            try:
-                X = vectorizer.transform([product_name]).toarray()
-                pred_labels, pred_probs = model.predict_class(X)
-
-                pred_label = pred_labels[0]
-                confidence = float(pred_probs[0].max())
-                category_path = to_label.get(pred_label, f'Category_{pred_label}')
-
-                # Разбираем путь на уровни иерархии
-                hierarchy = [level.strip() for level in category_path.split('/')]
-                category_name = hierarchy[-1] if hierarchy else category_path
-
-                # Получаем топ-3
-                top_3_indices = pred_probs[0].argsort()[-3:][::-1]
-                top_3 = [
-                    {
-                        'category': to_label.get(int(idx), f'Category_{int(idx)}'),
-                        'confidence': float(pred_probs[0][int(idx)])
-                    }
-                    for idx in top_3_indices
-                ]
-
-                results.append({
-                    'product_name': product_name,
-                    'category': category_name,
-                    'category_path': category_path,
-                    'hierarchy': hierarchy,
-                    'confidence': (confidence * 100),
-                    'top_3': top_3
-                })
-            except Exception as e:
-                # Если ошибка для одного товара - добавляем в результаты с ошибкой
-                results.append({
-                    'product_name': product_name,
-                    'category': 'Error',
-                    'confidence': 0,
-                    'top_3': [],
-                    'error': str(e)
-                })
+        # Вся колонка векторизуется за один вызов, классификатор работает пачками,
+        # повторяющиеся названия классифицируются один раз
+        results = classify_names(mp_model, df['product_name'].tolist())
+        for row, result in zip(df.index, results):
+            if 'error' not in result:
+                result['confidence'] = result['confidence'] * 100
+            result['row'] = int(row)
+        unique = int(df['product_name'].nunique())
 
         # Очищаем временный файл
         try:
@@ -352,19 +424,86 @@ def predict_category_from_file():
 
         return jsonify({
             'marketplace': marketplace,
+            'model_version': mp_model.version,
             'results': results,
             'total': len(results),
-            'success': len([r for r in results if 'error' not in r])
+            'success': len([r for r in results if 'error' not in r]),
+            'unique': unique,
+            'dedup_ratio': dedup_ratio(len(results), unique)
         }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _stream_file_predictions(temp_path, mp_model, marketplace):
+    """
+    Читать CSV пачками по Config.STREAM_CHUNK_SIZE строк и отдавать результаты как NDJSON:
+    одна строка JSON на товар, последняя строка - {"summary": {...}}.
+    В памяти одновременно находится только одна пачка.
+    """
+    from api.inference import classify_csv_chunks, dedup_ratio
+
+    total = 0
+    success = 0
+    unique = 0  # сумма уникальных названий по пачкам (повторы между пачками ловит кэш)
+    try:
+        for results, chunk_unique in classify_csv_chunks(temp_path, mp_model):
+            total += len(results)
+            success += sum(1 for r in results if 'error' not in r)
+            unique += chunk_unique
+            yield '\n'.join(json.dumps(r, ensure_ascii=False) for r in results) + '\n'
+
+        yield json.dumps({'summary': {
+            'marketplace': marketplace,
+            'model_version': mp_model.version,
+            'total': total,
+            'success': success,
+            'unique': unique,
+            'dedup_ratio': dedup_ratio(total, unique)
+        }}, ensure_ascii=False) + '\n'
+    except Exception as e:
+        yield json.dumps({'error': str(e)}, ensure_ascii=False) + '\n'
+    finally:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+@api_bp.route("/metrics/batching", methods=["GET"])
+@jwt_required()
+def get_batching_metrics():
+    """Статистика micro-batching: сколько пачек и какого размера собрано"""
+    from api.batching import get_batching_stats
+    return jsonify(get_batching_stats()), 200
+
+
+@api_bp.route("/metrics/prediction_cache", methods=["GET"])
+@jwt_required()
+def get_prediction_cache_metrics():
+    """Статистика кэша предсказаний: попадания, промахи, размер"""
+    from api.prediction_cache import prediction_cache
+    return jsonify(prediction_cache.get_stats()), 200
+
+
+@api_bp.route("/admin/model_cache", methods=["GET"])
+@jwt_required()
+def get_model_cache_info():
+    """Занятость кэша моделей (байты параметров по моделям) и события вытеснения"""
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+
+    from api.model_cache import get_model_cache_stats
+    return jsonify(get_model_cache_stats()), 200
+
+
 @api_bp.route("/metrics/plot", methods=["POST"])
 @jwt_required()
 def get_plot():
     import os
+    import numpy as np
     import matplotlib.pyplot as plt
     from sklearn.manifold import TSNE
 
@@ -0,0 +1,69 @@
+"""
+Похожие товары из обучающего датасета по bottleneck-векторам модели (models/embedding_index.py)
+
+Индекс лежит в директории версии модели и загружается при первом запросе к маркетплейсу;
+после переключения версии загружается индекс новой версии.
+Вектор запроса считает та же модель, что классифицирует (mp_model.model.embed) -
+с NumPy-движком запрос занимает единицы миллисекунд, с Keras дольше из-за predict.
+"""
+import os
+import threading
+import time
+from config import Config
+
+# marketplace -> (версия модели, IVFIndex)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_embedding_index(mp_model):
+    """Индекс версии mp_model (FileNotFoundError, если он не построен)"""
+    from models.embedding_index import IVFIndex, INDEX_FILE
+
+    cached = _indexes.get(mp_model.marketplace)
+    if cached is not None and cached[0] == mp_model.version:
+        return cached[1]
+
+    with _indexes_lock:
+        cached = _indexes.get(mp_model.marketplace)
+        if cached is not None and cached[0] == mp_model.version:
+            return cached[1]
+
+        path = os.path.join(os.path.dirname(mp_model.classifier_path), INDEX_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f'Индекс похожих товаров для {mp_model.marketplace} не построен. '
+                f'Запустите: python -m training.build_embedding_index {mp_model.marketplace}'
+            )
+        index = IVFIndex.load(path)
+        _indexes[mp_model.marketplace] = (mp_model.version, index)
+        return index
+
+def find_similar_products(mp_model, product_name, k=10):
+    """
+    k ближайших товаров обучающего датасета к нормализованному названию
+
+    Returns:
+        (список {product_name, category, category_path, similarity}, время поиска в мс)
+    """
+    index = get_embedding_index(mp_model)
+
+    start = time.perf_counter()
+    X = mp_model.vectorizer.transform([product_name])
+    if X.nnz == 0:
+        # Ни одного слова из словаря модели - вектор запроса ничего не говорит о товаре
+        return [], (time.perf_counter() - start) * 1000
+    query = mp_model.model.embed(X)[0]
+    positions, similarities = index.search(query, k=k, nprobe=Config.SIMILAR_PRODUCTS_NPROBE)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    neighbors = []
+    for position, similarity in zip(positions, similarities):
+        category_path = mp_model.to_label.get(int(index.labels[position]), '')
+        neighbors.append({
+            'product_name': index.name(position),
+            'category': category_path.split('/')[-1].strip(),
+            'category_path': category_path,
+            'similarity': round(float(similarity), 4)
+        })
+    return neighbors, elapsed_ms
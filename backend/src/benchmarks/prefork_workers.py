@@ -0,0 +1,202 @@
+"""
+Бенчмарк многопроцессного режима gunicorn: память воркеров и пропускная способность
+
+Для каждого числа воркеров запускает gunicorn с gunicorn.conf.py, ждёт готовности
+моделей во всех воркерах, снимает RSS/PSS/USS каждого процесса (/proc/<pid>/smaps_rollup)
+и гоняет нагрузку POST /api/predict_category (кэш предсказаний выключен).
+PSS делит общие страницы между процессами, поэтому сумма PSS - реальная память хоста,
+а сумма RSS считает общие страницы весов в каждом воркере заново.
+
+Запуск (из каталога, где лежит src/data/models_bin, например backend/):
+    python src/benchmarks/prefork_workers.py --workers 1 2 4 --mode prefork
+    python src/benchmarks/prefork_workers.py --workers 1 2 4 --mode plain
+
+Результаты (INFERENCE_ENGINE=numpy, 3 маркетплейса, 2 потока на воркер,
+16 клиентских потоков на той же машине, 1 vCPU / 6 GB, --duration 10):
+
+    режим    воркеры  RSS   PSS   USS   Σ PSS (с мастером)  запросов/с
+    prefork  1        186   105   26    243 MB              195
+    prefork  2        186    77   23    266 MB              277
+    prefork  4        186    55   23    312 MB              249
+    plain    1        236   228   224   246 MB              175
+    plain    2        235   205   180   426 MB              255
+    plain    4        236   193   180   787 MB              266
+    (RSS/PSS/USS - на один воркер, MB)
+
+Собственная память воркера в prefork ~25 MB против ~180 MB без него: каждый
+дополнительный воркер стоит ~25-45 MB вместо ~180 MB. На 1 vCPU пропускная
+способность упирается в процессор (клиент нагрузки работает на нём же);
+на хосте с N ядрами ожидается рост примерно до N воркеров - GIL у каждого свой.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JWT_SECRET = 'prefork-benchmark-secret-key-0123456789'
+
+PRODUCT_WORDS = [
+    'чайник', 'электрический', 'кроссовки', 'мужские', 'женские', 'смартфон', 'samsung', 'чехол',
+    'для', 'iphone', 'футболка', 'хлопок', 'набор', 'кастрюль', 'платье', 'летнее', 'детский',
+    'рюкзак', 'школьный', 'кофемолка', 'наушники', 'беспроводные', 'шампунь', 'для', 'волос'
+]
+
+
+def make_token():
+    """JWT access-токен, который примет flask_jwt_extended с тем же JWT_SECRET_KEY"""
+    import jwt
+
+    now = datetime.now(timezone.utc)
+    return jwt.encode({
+        'sub': '1', 'role': 'admin', 'type': 'access', 'fresh': False, 'jti': str(uuid.uuid4()),
+        'iat': now, 'nbf': now, 'exp': now + timedelta(hours=1)
+    }, JWT_SECRET, algorithm='HS256')
+
+def memory_kb(pid):
+    """RSS, PSS и USS процесса в КБ"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'],
+        'uss': values['Private_Clean'] + values['Private_Dirty']
+    }
+
+def child_pids(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+def request_json(port, method, path, body=None, token=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+def wait_ready(port, workers, timeout=300):
+    """Дождаться, пока /health ответит ready от каждого воркера (pid в ответе)"""
+    ready_pids = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, health = request_json(port, 'GET', '/health')
+            if status == 200 and health.get('ready'):
+                ready_pids.add(health['pid'])
+                if len(ready_pids) >= workers:
+                    return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Воркеры не готовы за {timeout} с (готовы: {len(ready_pids)}/{workers})")
+
+def run_load(port, token, clients, duration):
+    """Запросы /api/predict_category из clients потоков в течение duration секунд"""
+    stop_at = time.monotonic() + duration
+    counts = [0] * clients
+    errors = [0] * clients
+
+    def client(i):
+        rng = random.Random(i)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+        while time.monotonic() < stop_at:
+            name = ' '.join(rng.choices(PRODUCT_WORDS, k=rng.randint(2, 6)))
+            body = json.dumps({'product_name': name, 'marketplace': rng.choice(['wildberries', 'ozon', 'yandex_market'])})
+            try:
+                conn.request('POST', '/api/predict_category', body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    counts[i] += 1
+                else:
+                    errors[i] += 1
+            except (OSError, http.client.HTTPException):
+                errors[i] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return sum(counts) / elapsed, sum(errors)
+
+def benchmark(workers, mode, port, clients, duration):
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'WEB_CONCURRENCY': str(workers),
+        'PREFORK_MODELS': 'true' if mode == 'prefork' else 'false',
+        'PRELOAD_MODELS': 'true',
+        'PREDICTION_CACHE_SIZE': '0',
+        'MODEL_RELOAD_INTERVAL': '0',
+        'JWT_SECRET_KEY': JWT_SECRET,
+    })
+    env.setdefault('INFERENCE_ENGINE', 'numpy')
+    env.setdefault('DATABASE_URL', 'sqlite:////tmp/prefork_benchmark.db')
+
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(SRC_DIR, 'gunicorn.conf.py'),
+         '--pythonpath', SRC_DIR, 'main:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(port, workers)
+        token = make_token()
+        run_load(port, token, clients, 2)  # прогрев
+
+        pids = child_pids(master.pid)
+        memory = [memory_kb(pid) for pid in pids]
+        master_memory = memory_kb(master.pid)
+        throughput, errors = run_load(port, token, clients, duration)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+    return {
+        'mode': mode,
+        'workers': workers,
+        'worker_rss_mb': sum(m['rss'] for m in memory) / len(memory) / 1024,
+        'worker_pss_mb': sum(m['pss'] for m in memory) / len(memory) / 1024,
+        'worker_uss_mb': sum(m['uss'] for m in memory) / len(memory) / 1024,
+        'total_pss_mb': (sum(m['pss'] for m in memory) + master_memory['pss']) / 1024,
+        'requests_per_sec': throughput,
+        'errors': errors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--mode', choices=['prefork', 'plain'], default='prefork')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15)
+    args = parser.parse_args()
+
+    print(f"{'режим':<8} {'воркеры':>7} {'RSS':>8} {'PSS':>8} {'USS':>8} {'Σ PSS':>8} {'запросов/с':>11} {'ошибки':>7}")
+    for workers in args.workers:
+        r = benchmark(workers, args.mode, args.port, args.clients, args.duration)
+        print(f"{r['mode']:<8} {r['workers']:>7} {r['worker_rss_mb']:>6.0f}MB {r['worker_pss_mb']:>6.0f}MB "
+              f"{r['worker_uss_mb']:>6.0f}MB {r['total_pss_mb']:>6.0f}MB {r['requests_per_sec']:>11.0f} {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Бенчмарк холодного старта: что импортируется при create_app() и сколько это стоит
+
+Запускает `python -X importtime` в отдельном процессе, печатает самые дорогие
+модули (накопительное время) и проверяет, что до первого запроса не
+импортируются тяжёлые библиотеки (TensorFlow, pandas, sklearn...), а /health отвечает.
+Код возврата 1 - регрессия: запрещённый импорт или превышение бюджета времени.
+
+Запуск (из backend/src): python -m benchmarks.startup_imports [--top 25] [--budget-ms 2000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Эти модули должны импортироваться только при загрузке моделей / обработке файлов
+FORBIDDEN_AT_STARTUP = ('tensorflow', 'keras', 'pandas', 'sklearn', 'scipy', 'matplotlib')
+
+# Код, выполняемый в дочернем процессе: старт приложения + первый запрос /health
+STARTUP_CODE = """
+import json, sys, time
+start = time.perf_counter()
+from api.app import create_app
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/health')
+answered = time.perf_counter()
+print(json.dumps({
+    'create_app_ms': (created - start) * 1000,
+    'first_health_ms': (answered - created) * 1000,
+    'health_status': response.status_code,
+    'modules': sorted(m for m in sys.modules if '.' not in m),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Разобрать вывод -X importtime
+
+    Returns:
+        список (модуль, собственное время мкс, накопительное мкс)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Вложенность импорта обозначается отступом после первого пробела
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def run_startup(src_dir):
+    import json
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    env.setdefault('JWT_SECRET_KEY', 'startup-benchmark-secret-key-0123456789')
+    # Фоновые потоки прогрева импортируют TensorFlow - в замер старта они не входят
+    env['PRELOAD_MODELS'] = 'false'
+    env['MODEL_RELOAD_INTERVAL'] = '0'
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+        cwd=src_dir, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Приложение не стартовало:\n{proc.stderr[-3000:]}")
+
+    summary = json.loads(proc.stdout.strip().splitlines()[-1])
+    return summary, parse_importtime(proc.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=25, help='сколько самых дорогих модулей показать')
+    parser.add_argument('--budget-ms', type=float, default=2000, help='допустимое время create_app()')
+    args = parser.parse_args()
+
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    summary, rows = run_startup(src_dir)
+
+    # Импорты верхнего уровня и их прямые зависимости (отступ - два пробела на уровень)
+    top_level = [r for r in rows if not r[0].startswith(' ')]
+    breakdown = sorted((r for r in rows if not r[0].startswith('    ')), key=lambda r: -r[2])
+    print(f"\n⏱️  Самые дорогие импорты (накопительно):")
+    for name, _, cumulative in breakdown[:args.top]:
+        print(f"   {cumulative / 1000:>8.1f} ms  {name}")
+
+    total_ms = sum(r[2] for r in top_level) / 1000
+    print(f"\n   импорты всего:     {total_ms:.0f} ms ({len(rows)} модулей)")
+    print(f"   create_app():      {summary['create_app_ms']:.0f} ms")
+    print(f"   первый /health:    {summary['first_health_ms']:.0f} ms (HTTP {summary['health_status']})")
+
+    failures = []
+    forbidden = [m for m in FORBIDDEN_AT_STARTUP if m in summary['modules']]
+    if forbidden:
+        failures.append(f"при старте импортированы тяжёлые модули: {', '.join(forbidden)}")
+    if summary['health_status'] != 200:
+        failures.append(f"/health вернул {summary['health_status']}")
+    if summary['create_app_ms'] > args.budget_ms:
+        failures.append(f"create_app() {summary['create_app_ms']:.0f} ms > бюджета {args.budget_ms:.0f} ms")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+
+    print("✅ Старт без тяжёлых импортов")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,6 +19,86 @@ class Config:
     UPLOAD_FOLDER = "src/data/uploads"
     PROCESSED_FOLDER = "src/data/processed"
     MODELS_BIN = "src/data/models_bin"
+    RAW_DATA_FOLDER = "src/data/raw"  # {marketplace}_products_list.csv - обучающие датасеты
+
+    # Маркетплейсы, для которых обучены отдельные модели
+    MARKETPLACES = ['wildberries', 'ozon', 'yandex_market']
+    BOTTLENECK_DIMS = {
+        'wildberries': 128,
+        'ozon': 128,
+        'yandex_market': 256
+    }
+    # Загружать модели всех маркетплейсов при старте воркера (в фоне)
+    PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "true").lower() in ("1", "true", "yes")
+    # Сколько строк CSV классифицировать за один вызов модели
+    PREDICT_BATCH_SIZE = int(os.getenv("PREDICT_BATCH_SIZE", 1024))
+    # Сколько строк CSV читать за раз в потоковом режиме (?stream=1)
+    STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 5000))
+    # Максимум товаров в одном запросе /predict_category/batch
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+    # Micro-batching одновременных запросов /predict_category
+    # (выигрыш растёт с числом потоков gunicorn --threads)
+    MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+    MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", 64))
+    MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", 5))
+    # Кэш результатов предсказаний: (маркетплейс, название, версия модели) -> результат
+    PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 100000))  # 0 - выключен
+    PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", 24 * 3600))
+    # Фоновые задачи классификации файлов (?async=1)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+    # Процесс отмечает свои задачи running раз в JOB_HEARTBEAT_SECONDS; задача без отметки
+    # дольше JOB_STALE_SECONDS (или чей процесс на этом хосте завершился) возвращается в очередь
+    JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 120))
+    # TF-IDF остаётся CSR-матрицей при обучении и предсказании (без .toarray())
+    SPARSE_INPUT = os.getenv("SPARSE_INPUT", "true").lower() in ("1", "true", "yes")
+    # Версии моделей: сколько хранить и как часто сервер проверяет, не опубликована ли новая
+    MODEL_VERSIONS_KEEP = int(os.getenv("MODEL_VERSIONS_KEEP", 3))
+    MODEL_RELOAD_INTERVAL = int(os.getenv("MODEL_RELOAD_INTERVAL", 30))  # секунды, 0 - выключено
+    # Движок инференса: "keras" (classifier.h5) или "numpy" (classifier.npz, без TensorFlow)
+    INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "keras").lower()
+    # Точность весов NumPy-движка: "none" (float32), "float16" или "int8" (включает NumPy-движок)
+    INFERENCE_QUANTIZATION = os.getenv("INFERENCE_QUANTIZATION", "none").lower()
+    # Бюджет памяти кэша моделей (МБ параметров), сверх него вытесняются давно не использованные; 0 - без ограничения
+    MODEL_CACHE_MAX_MB = int(os.getenv("MODEL_CACHE_MAX_MB", 512))
+    # Загрузка моделей в мастере gunicorn до fork (gunicorn.conf.py включает --preload):
+    # воркеры делят страницы весов copy-on-write. Полностью работает с NumPy-движком
+    PREFORK_MODELS = os.getenv("PREFORK_MODELS", "false").lower() in ("1", "true", "yes")
+    # Точное совпадение названия с обучающим датасетом/исправлениями - ответ без модели
+    EXACT_MATCH_ENABLED = os.getenv("EXACT_MATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+    # Как часто проверять, не изменил ли файл исправлений другой воркер (секунды)
+    CORRECTIONS_RELOAD_SECONDS = float(os.getenv("CORRECTIONS_RELOAD_SECONDS", 5))
+    # Исправления применяются сразу, переобучение - после накопления стольких исправлений
+    AUTO_RETRAIN_MIN_CORRECTIONS = int(os.getenv("AUTO_RETRAIN_MIN_CORRECTIONS", 10))
+    # Каскад: линейная модель (linear.npz) отвечает на уверенные товары, остальные - глубокая модель
+    CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "true").lower() in ("1", "true", "yes")
+    # Порог уверенности линейной модели не ниже этого, даже если подбор на валидации дал меньше
+    CASCADE_MIN_THRESHOLD = float(os.getenv("CASCADE_MIN_THRESHOLD", 0.5))
+    # Иерархический классификатор: родитель категории, затем лист среди beam лучших родителей
+    # (обучение пишет hierarchical.npz вместо classifier.h5, сервер предпочитает его плоской модели)
+    HIERARCHICAL_CLASSIFIER = os.getenv("HIERARCHICAL_CLASSIFIER", "false").lower() in ("1", "true", "yes")
+    HIERARCHICAL_BEAM = int(os.getenv("HIERARCHICAL_BEAM", 3))
+    # Поиск похожих товаров (/similar_products): сколько кластеров индекса просматривать и максимум k
+    SIMILAR_PRODUCTS_NPROBE = int(os.getenv("SIMILAR_PRODUCTS_NPROBE", 8))
+    SIMILAR_PRODUCTS_MAX_K = int(os.getenv("SIMILAR_PRODUCTS_MAX_K", 50))
+    # Потоковое обучение (training/streaming.py): CSV читается кусками, память не растёт с размером выгрузки
+    STREAMING_TRAINING = os.getenv("STREAMING_TRAINING", "false").lower() in ("1", "true", "yes")
+    STREAM_TRAIN_CHUNK_ROWS = int(os.getenv("STREAM_TRAIN_CHUNK_ROWS", 50000))
+    STREAM_SHUFFLE_BUFFER = int(os.getenv("STREAM_SHUFFLE_BUFFER", 200000))  # строк в буфере перемешивания
+    # Кэш предобработки (training/feature_cache.py): X, y и TF-IDF по хэшу CSV и параметрам
+    FEATURE_CACHE_ENABLED = os.getenv("FEATURE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "src/data/feature_cache")
+    FEATURE_CACHE_KEEP = int(os.getenv("FEATURE_CACHE_KEEP", 4))
+    # Переобучение по исправлениям: дообучение активной версии (training/fine_tune.py),
+    # полное переобучение - при новых категориях, дрейфе словаря или падении точности
+    INCREMENTAL_RETRAIN = os.getenv("INCREMENTAL_RETRAIN", "true").lower() in ("1", "true", "yes")
+    FINE_TUNE_EPOCHS = int(os.getenv("FINE_TUNE_EPOCHS", 3))
+    FINE_TUNE_REPLAY_SIZE = int(os.getenv("FINE_TUNE_REPLAY_SIZE", 5000))  # товаров обучающего CSV
+    FINE_TUNE_MAX_ROUNDS = int(os.getenv("FINE_TUNE_MAX_ROUNDS", 10))  # дообучений подряд до полного
+    FINE_TUNE_MAX_OOV = float(os.getenv("FINE_TUNE_MAX_OOV", 0.5))  # доля слов исправлений вне словаря
+    FINE_TUNE_MAX_ACCURACY_DROP = float(os.getenv("FINE_TUNE_MAX_ACCURACY_DROP", 0.01))
+    # Минимальная точность дообученной модели на самих исправлениях - иначе полное переобучение
+    FINE_TUNE_MIN_CORRECTIONS_ACCURACY = float(os.getenv("FINE_TUNE_MIN_CORRECTIONS_ACCURACY", 0.9))
 
     WILDBERRIES_API_KEY = os.getenv("WILDBERRIES_API_KEY", None)
     OZON_MGT_API_KEY = os.getenv("OZON_MGT_API_KEY", None)
@@ -14,4 +14,47 @@ class User(db.Model):
         self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        return check_password_hash(self.password_hash, password)
+
+
+class ClassificationJob(db.Model):
+    """Фоновая классификация CSV файла (состояние переживает рестарт сервера)"""
+    __tablename__ = "classification_jobs"
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.String(64), nullable=True)
+    marketplace = db.Column(db.String(32), nullable=False)
+    model_version = db.Column(db.String(64), nullable=True)  # версия модели, которой классифицирован файл
+    filename = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), default="queued", index=True)  # queued | running | done | failed
+    rows_total = db.Column(db.Integer, nullable=True)
+    rows_done = db.Column(db.Integer, default=0)
+    rows_success = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Процесс, выполняющий задачу (хост:pid:id запуска), и время его последнего сигнала
+    owner = db.Column(db.String(128), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or self.updated_at or self.started_at) - self.started_at).total_seconds()
+
+        return {
+            'job_id': self.id,
+            'marketplace': self.marketplace,
+            'model_version': self.model_version,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_total': self.rows_total,
+            'rows_done': self.rows_done,
+            'rows_success': self.rows_success,
+            'rows_per_sec': round(self.rows_done / elapsed, 1) if elapsed else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""
+Конфигурация gunicorn
+
+Обычный режим (по умолчанию): один воркер, приложение загружается в воркере,
+модели прогреваются в фоне после старта.
+
+Режим prefork (PREFORK_MODELS=true, WEB_CONCURRENCY=N): приложение и модели
+(NumPy-движок) загружаются в мастере до fork, N воркеров делят страницы весов
+copy-on-write. Потоки (задачи, прогрев, проверка версий) и подключения к БД
+создаются в каждом воркере в post_fork. Замеры памяти и пропускной способности:
+benchmarks/prefork_workers.py
+"""
+import os
+import sys
+
+# Конфиг читается до --chdir, поэтому src добавляем в путь явно
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import Config
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+# timeout увеличен для загрузки моделей при первом запросе
+timeout = 300
+graceful_timeout = 30
+
+# Без prefork приложение не загружается до форка workers (быстрый старт)
+preload_app = Config.PREFORK_MODELS
+
+
+def post_fork(server, worker):
+    if not Config.PREFORK_MODELS:
+        return
+
+    from main import app
+    from api.app import start_worker_tasks
+    from database.models import db
+
+    # Соединения пула SQLAlchemy нельзя делить между процессами
+    with app.app_context():
+        db.engine.dispose()
+    start_worker_tasks(app)
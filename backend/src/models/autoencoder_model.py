@@ -16,10 +16,48 @@ try:
 except Exception as e:
     print(f"⚠️  Предупреждение при настройке TensorFlow: {e}")
 
+import numpy as np
+from scipy import sparse
 from keras.models import Model, load_model
 from keras.layers import Dense, Input, Dropout, BatchNormalization
 from keras.losses import CategoricalCrossentropy
 from keras.optimizers import Adam
+from keras.utils import PyDataset
+
+
+class SparseBatchSequence(PyDataset):
+    """
+    Мини-батчи из CSR-матрицы TF-IDF: в плотный вид переводится только текущий батч.
+    y может быть one-hot матрицей или вектором индексов классов (кодируется по батчам).
+    """
+
+    def __init__(self, X, y, batch_size, num_classes, shuffle=False, **kwargs):
+        super().__init__(**kwargs)
+        self.X = X
+        self.y = y
+        self.batch_size = batch_size
+        self.num_classes = num_classes
+        self.shuffle = shuffle
+        self.indices = np.arange(X.shape[0])
+        if self.shuffle:
+            np.random.shuffle(self.indices)
+
+    def __len__(self):
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
+    def __getitem__(self, idx):
+        batch = self.indices[idx * self.batch_size:(idx + 1) * self.batch_size]
+        X_batch = self.X[batch].toarray().astype(np.float32)
+        y_batch = self.y[batch]
+        if y_batch.ndim == 1:
+            y_onehot = np.zeros((len(batch), self.num_classes), dtype=np.float32)
+            y_onehot[np.arange(len(batch)), y_batch] = 1
+            y_batch = y_onehot
+        return X_batch, y_batch
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.indices)
 
 
 class AutoencoderDL:
@@ -28,6 +66,11 @@ class AutoencoderDL:
         self.bottleneck_dim = bottleneck_dim
         self.num_classes = num_classes
         self.classifier = None
+        # Для sparse-входа: первый Dense слой считается как sparse @ dense, остальное - tail моделью
+        self._sparse_head = None
+        self._tail = None
+        # Модель до bottleneck_layer для embed()
+        self._encoder = None
 
     def build_model(self, dropout_rate=0.3):
         input_layer = Input(shape=(self.input_dim,), name='input')
@@ -47,6 +90,9 @@ class AutoencoderDL:
         output = Dense(self.num_classes, activation='softmax', name='output')(bottleneck_layer)
 
         self.classifier = Model(inputs=input_layer, outputs=output, name='classifier')
+        self._sparse_head = None
+        self._tail = None
+        self._encoder = None
 
         optimizer = Adam(learning_rate=0.001)
         self.classifier.compile(
@@ -80,15 +126,40 @@ class AutoencoderDL:
             )
             callbacks.append(early_stopping)
 
-        history = self.classifier.fit(
-            X, y,
-            epochs=epochs,
-            batch_size=batch_size,
-            validation_split=validation_split,
-            verbose=1,
-            shuffle=True,
-            callbacks=callbacks
-        )
+        if sparse.issparse(X):
+            # Sparse-режим: X остаётся CSR, в модель идут плотные мини-батчи.
+            # Валидация - последние строки, как у validation_split в Keras
+            X = X.tocsr()
+            n_val = int(X.shape[0] * validation_split)
+            n_train = X.shape[0] - n_val
+
+            train_data = SparseBatchSequence(X[:n_train], y[:n_train], batch_size, self.num_classes, shuffle=True)
+            val_data = None
+            if n_val > 0:
+                val_data = SparseBatchSequence(X[n_train:], y[n_train:], batch_size, self.num_classes)
+
+            history = self.classifier.fit(
+                train_data,
+                epochs=epochs,
+                validation_data=val_data,
+                verbose=1,
+                callbacks=callbacks
+            )
+        else:
+            history = self.classifier.fit(
+                X, y,
+                epochs=epochs,
+                batch_size=batch_size,
+                validation_split=validation_split,
+                verbose=1,
+                shuffle=True,
+                callbacks=callbacks
+            )
+
+        # Веса изменились - sparse-голову нужно пересобрать
+        self._sparse_head = None
+        self._tail = None
+        self._encoder = None
 
         print("\n[OK] Обучение завершено!")
 
@@ -108,14 +179,141 @@ class AutoencoderDL:
 
         return history
 
-    def predict_class(self, X):
+    def train_classifier_stream(self, train_batches, steps_per_epoch, val_batches=None, validation_steps=0,
+                                epochs=30, use_early_stopping=True):
+        """
+        Обучение на бесконечных генераторах (X, y_onehot) мини-батчей (training/streaming.py)
+
+        Args:
+            steps_per_epoch: батчей за эпоху (один проход по обучающей части)
+            validation_steps: батчей валидации за эпоху
+        """
+        if self.classifier is None:
+            self.build_model()
+
+        print(f"\n[INFO] ПОТОКОВОЕ ОБУЧЕНИЕ: epochs={epochs}, "
+              f"steps_per_epoch={steps_per_epoch}, validation_steps={validation_steps}")
+
+        callbacks = []
+        has_validation = val_batches is not None and validation_steps > 0
+        if use_early_stopping and has_validation:
+            from keras.callbacks import EarlyStopping
+            callbacks.append(EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True, verbose=1))
+
+        history = self.classifier.fit(
+            train_batches,
+            steps_per_epoch=steps_per_epoch,
+            epochs=epochs,
+            validation_data=val_batches if has_validation else None,
+            validation_steps=validation_steps if has_validation else None,
+            verbose=1,
+            callbacks=callbacks
+        )
+
+        self._sparse_head = None
+        self._tail = None
+        self._encoder = None
+
+        print("\n[OK] Обучение завершено!")
+        if 'val_accuracy' in history.history:
+            print(f"  Val Accuracy:   {history.history['val_accuracy'][-1] * 100:.1f}%")
+        return history
+
+    def fine_tune(self, X, y, epochs=3, batch_size=32, learning_rate=1e-4):
+        """
+        Дообучение загруженного классификатора (training/fine_tune.py): веса сохраняются,
+        оптимизатор создаётся заново с меньшим шагом, без валидации и early stopping
+
+        Args:
+            X: CSR-матрица TF-IDF
+            y: индексы классов
+        """
+        self.classifier.compile(
+            loss=CategoricalCrossentropy(),
+            optimizer=Adam(learning_rate=learning_rate),
+            metrics=['accuracy']
+        )
+        history = self.classifier.fit(
+            SparseBatchSequence(sparse.csr_matrix(X), y, batch_size, self.num_classes, shuffle=True),
+            epochs=epochs,
+            verbose=0
+        )
+
+        self._sparse_head = None
+        self._tail = None
+        self._encoder = None
+        return history
+
+    def predict_class(self, X, batch_size=None):
         if self.classifier is None:
             raise ValueError("Classifier not built. Call build_model() first.")
 
-        probs = self.classifier.predict(X, verbose=0)
+        if sparse.issparse(X) and self._build_sparse_head():
+            probs = self._predict_sparse(X, batch_size)
+        else:
+            if sparse.issparse(X):
+                X = X.toarray()
+            probs = self.classifier.predict(X, batch_size=batch_size, verbose=0)
         labels = probs.argmax(axis=1)
         return labels, probs
 
+    def _build_sparse_head(self):
+        """
+        Разделить классификатор на первый Dense слой (веса для sparse @ dense)
+        и модель из остальных слоёв. Возвращает False, если архитектура не подходит.
+        """
+        if self._tail is not None:
+            return True
+
+        layers = self.classifier.layers
+        dense_idx = [i for i, layer in enumerate(layers) if isinstance(layer, Dense)]
+        if not dense_idx:
+            return False
+
+        first = layers[dense_idx[0]]
+        activation = first.get_config().get('activation')
+        if activation not in ('relu', 'linear'):
+            return False
+
+        W, b = first.get_weights()
+        tail_input = Input(shape=(W.shape[1],), name='tail_input')
+        x = tail_input
+        for layer in layers[dense_idx[0] + 1:]:
+            x = layer(x)
+
+        self._sparse_head = (W.astype(np.float32), b.astype(np.float32), activation)
+        self._tail = Model(inputs=tail_input, outputs=x, name='classifier_tail')
+        return True
+
+    def _predict_sparse(self, X, batch_size=None):
+        W, b, activation = self._sparse_head
+        # Стоимость умножения пропорциональна числу ненулевых TF-IDF признаков, а не input_dim
+        hidden = X.astype(np.float32) @ W + b
+        if activation == 'relu':
+            hidden = np.maximum(hidden, 0)
+        return self._tail.predict(hidden, batch_size=batch_size, verbose=0)
+
+    def embed(self, X, batch_size=None):
+        """Векторы bottleneck_layer (поиск похожих товаров, api/similar_products.py)"""
+        if self.classifier is None:
+            raise ValueError("Classifier not built. Call build_model() first.")
+        if self._encoder is None:
+            self._encoder = Model(inputs=self.classifier.inputs,
+                                  outputs=self.classifier.get_layer('bottleneck_layer').output)
+        if sparse.issparse(X):
+            X = X.toarray()
+        return self._encoder.predict(X, batch_size=batch_size, verbose=0)
+
+    @property
+    def nbytes(self):
+        """Память под веса классификатора (и копию первого слоя для sparse-пути)"""
+        if self.classifier is None:
+            return 0
+        total = sum(int(np.prod(w.shape)) * np.dtype(w.dtype).itemsize for w in self.classifier.weights)
+        if self._sparse_head is not None:
+            total += self._sparse_head[0].nbytes + self._sparse_head[1].nbytes
+        return total
+
     def save(self, classifier_path):
         self.classifier.save(classifier_path)
 
@@ -133,6 +331,9 @@ class AutoencoderDL:
         
         try:
             self.classifier = load_model(path)
+            self._sparse_head = None
+            self._tail = None
+            self._encoder = None
             print(f"✅ Модель загружена из {path}")
         except Exception as e:
             print(f"❌ Ошибка загрузки модели: {e}")
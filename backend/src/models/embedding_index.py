@@ -0,0 +1,148 @@
+"""
+Индекс ближайших соседей (IVF) по bottleneck-векторам товаров обучающего датасета
+
+Векторы нормализуются, близость - косинусная. k-means делит их на nlist кластеров
+(инвертированные списки); запрос сравнивается со всеми центроидами и точно - только
+с товарами nprobe ближайших кластеров: ~sqrt(N) * 2 * nprobe сравнений вместо N.
+Векторы хранятся во float16 (для dim=128 это 256 байт на товар).
+
+Формат embedding_index.npz: centroids, vectors (отсортированы по кластерам),
+list_offsets (кластер c - строки list_offsets[c]:list_offsets[c+1]), labels (id категории),
+names + name_offsets (UTF-8 байты названий подряд, как в training/flat_artifacts.py).
+Построение: training/build_embedding_index.py
+"""
+import os
+import numpy as np
+
+# Версия формата embedding_index.npz - увеличивать при несовместимых изменениях
+INDEX_FORMAT_VERSION = 1
+INDEX_FILE = 'embedding_index.npz'
+
+
+def normalize_rows(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return X / norms
+
+def _nearest_centroids(X, centroids, chunk_size=8192):
+    return np.concatenate([
+        (X[start:start + chunk_size] @ centroids.T).argmax(axis=1)
+        for start in range(0, X.shape[0], chunk_size)
+    ])
+
+def spherical_kmeans(X, nlist, n_iter=10, sample_size=None, seed=0):
+    """Центроиды k-means по косинусной близости (X уже нормализован); обучение на подвыборке"""
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or 64 * nlist
+    if X.shape[0] > sample_size:
+        X = X[rng.choice(X.shape[0], sample_size, replace=False)]
+
+    centroids = X[rng.choice(X.shape[0], nlist, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = _nearest_centroids(X, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, X)
+        counts = np.bincount(assignment, minlength=nlist)
+        # Пустой кластер получает случайную точку
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = X[rng.choice(X.shape[0], len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+
+    def __init__(self, centroids, vectors, list_offsets, labels, names, name_offsets):
+        self.centroids = centroids.astype(np.float32)
+        self.vectors = vectors.astype(np.float16)
+        self.list_offsets = list_offsets.astype(np.int64)
+        self.labels = labels.astype(np.int32)
+        self.names = names
+        self.name_offsets = name_offsets.astype(np.int64)
+        self.nlist, self.dim = self.centroids.shape
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, embeddings, labels, names, nlist=None, n_iter=10, seed=0):
+        """
+        Args:
+            embeddings: bottleneck-векторы товаров (N x dim)
+            labels: id категорий товаров
+            names: названия товаров
+            nlist: число кластеров (по умолчанию ~sqrt(N))
+        """
+        X = normalize_rows(embeddings)
+        nlist = max(1, min(nlist or int(np.sqrt(X.shape[0])), X.shape[0]))
+        centroids = spherical_kmeans(X, nlist, n_iter=n_iter, seed=seed)
+
+        assignment = _nearest_centroids(X, centroids)
+        order = np.argsort(assignment, kind='stable')
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+
+        encoded = [names[i].encode('utf-8') for i in order]
+        name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        name_offsets[1:] = np.cumsum([len(b) for b in encoded])
+        name_bytes = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        return cls(centroids, X[order], list_offsets, np.asarray(labels)[order], name_bytes, name_offsets)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Index not found at {path}")
+
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version != INDEX_FORMAT_VERSION:
+                raise ValueError(
+                    f"Неподдерживаемая версия формата {path}: {format_version} "
+                    f"(ожидается {INDEX_FORMAT_VERSION}). Перестройте: python -m training.build_embedding_index"
+                )
+            index = cls(data['centroids'], data['vectors'], data['list_offsets'], data['labels'],
+                        data['names'], data['name_offsets'])
+
+        print(f"✅ Индекс похожих товаров ({len(index)} товаров, {index.nlist} кластеров) загружен из {path}")
+        return index
+
+    def save(self, path):
+        # Пишем во временный файл и переименовываем, чтобы сервер не прочитал недописанный
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, format_version=np.array(INDEX_FORMAT_VERSION), centroids=self.centroids,
+                 vectors=self.vectors, list_offsets=self.list_offsets, labels=self.labels,
+                 names=self.names, name_offsets=self.name_offsets)
+        os.replace(tmp_path, path)
+
+    @property
+    def nbytes(self):
+        return (self.centroids.nbytes + self.vectors.nbytes + self.list_offsets.nbytes
+                + self.labels.nbytes + self.names.nbytes + self.name_offsets.nbytes)
+
+    def name(self, i):
+        return self.names[self.name_offsets[i]:self.name_offsets[i + 1]].tobytes().decode('utf-8')
+
+    def search(self, query, k=10, nprobe=8):
+        """
+        k ближайших товаров для одного вектора запроса
+
+        Returns:
+            (позиции товаров в индексе, косинусные близости) по убыванию близости
+        """
+        q = normalize_rows(np.asarray(query).reshape(1, -1))[0]
+        nprobe = min(nprobe, self.nlist)
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+
+        candidates = np.concatenate([
+            np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in probe
+        ])
+        if len(candidates) == 0:
+            return candidates, np.zeros(0, dtype=np.float32)
+
+        sims = self.vectors[candidates].astype(np.float32) @ q
+        k = min(k, len(candidates))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return candidates[top], sims[top]
@@ -0,0 +1,176 @@
+"""
+Иерархический классификатор (HIERARCHICAL_CLASSIFIER): родитель -> лист
+
+category_path двухуровневый ("Родитель/Лист"). Вместо одного softmax по всем листьям:
+    ствол - та же сеть, что в autoencoder_model.py, но выход - softmax по родителям;
+    головы - линейный softmax по листьям каждого родителя на тех же TF-IDF признаках,
+             веса хранятся разреженно: у головы ненулевые только слова товаров её родителя.
+При предсказании головы считаются только для beam лучших родителей,
+p(лист) = p(родитель) * p(лист | родитель), у остальных листьев вероятность 0.
+Стоимость выхода на товар - родители + beam * листьев у родителя вместо всех листьев.
+
+Формат hierarchical.npz: веса ствола как в classifier.npz (W{i}, b{i}, activations)
+и головы всех родителей подряд: head_W (признаки x листья, CSC: head_W_data, head_W_indices,
+head_W_indptr), head_b, head_offsets (колонки родителя p - head_offsets[p]:head_offsets[p+1]),
+head_leaves (id класса колонки). Формат 1 хранил head_W плотным - он тоже загружается.
+Обучение: training/train_hierarchical.py
+"""
+import os
+import numpy as np
+from scipy import sparse
+from models.numpy_engine import NumpyClassifier, ACTIVATIONS, _softmax
+
+# Версия формата hierarchical.npz - увеличивать при несовместимых изменениях
+HIERARCHICAL_FORMAT_VERSION = 2
+HIERARCHICAL_FILE = 'hierarchical.npz'
+
+
+def parent_of(category_path):
+    """Родитель категории - первый уровень пути"""
+    return category_path.split('/')[0].strip()
+
+def build_parent_mapping(to_label):
+    """
+    Returns:
+        (parents, leaf_parent): отсортированные названия родителей и индекс родителя для каждого id класса
+    """
+    parents = sorted({parent_of(to_label[i]) for i in range(len(to_label))})
+    parent_idx = {parent: i for i, parent in enumerate(parents)}
+    leaf_parent = np.array([parent_idx[parent_of(to_label[i])] for i in range(len(to_label))], dtype=np.int64)
+    return parents, leaf_parent
+
+class HierarchicalClassifier:
+    """Тот же интерфейс, что у AutoencoderDL.predict_class и NumpyClassifier"""
+
+    def __init__(self, trunk_layers, head_W, head_b, head_offsets, head_leaves, num_classes, beam=3,
+                 quantization='none'):
+        """
+        Args:
+            trunk_layers: (W, b, activation) ствола, последний слой - softmax по родителям
+            head_*: головы родителей (см. формат hierarchical.npz), head_W - плотная или sparse-матрица
+            beam: для скольких лучших родителей считать головы
+        """
+        self.trunk = NumpyClassifier(trunk_layers, quantization=quantization)
+        self.head_W = sparse.csc_matrix(head_W, dtype=np.float32)
+        self.head_b = head_b.astype(np.float32)
+        self.head_offsets = head_offsets.astype(np.int64)
+        self.head_leaves = head_leaves.astype(np.int64)
+        # Голова каждого родителя отдельной CSR-матрицей: X @ head без нарезки колонок на каждый запрос
+        self.heads = [
+            self.head_W[:, start:end].tocsr()
+            for start, end in zip(self.head_offsets[:-1], self.head_offsets[1:])
+        ]
+        self.num_parents = len(self.head_offsets) - 1
+        self.num_classes = int(num_classes)
+        self.input_dim = self.trunk.input_dim
+        self.beam = max(1, min(int(beam), self.num_parents))
+        self.quantization = quantization
+
+    @property
+    def heads_nbytes(self):
+        return (self.head_W.data.nbytes + self.head_W.indices.nbytes + self.head_W.indptr.nbytes
+                + self.head_b.nbytes + self.head_offsets.nbytes + self.head_leaves.nbytes)
+
+    @property
+    def nbytes(self):
+        return self.trunk.nbytes + self.heads_nbytes
+
+    @classmethod
+    def load(cls, path, beam=3, quantization='none'):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model not found at {path}")
+
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version not in (1, HIERARCHICAL_FORMAT_VERSION):
+                raise ValueError(
+                    f"Неподдерживаемая версия формата {path}: {format_version} "
+                    f"(ожидается {HIERARCHICAL_FORMAT_VERSION}). Переобучите модель"
+                )
+
+            activations = [str(a) for a in data['activations']]
+            trunk_layers = [
+                (data[f'W{i}'], data[f'b{i}'], activation)
+                for i, activation in enumerate(activations)
+            ]
+            if format_version == 1:
+                head_W = data['head_W']
+            else:
+                head_W = sparse.csc_matrix(
+                    (data['head_W_data'], data['head_W_indices'], data['head_W_indptr']),
+                    shape=(trunk_layers[0][0].shape[0], int(data['head_offsets'][-1]))
+                )
+            model = cls(trunk_layers, head_W, data['head_b'], data['head_offsets'], data['head_leaves'],
+                        int(data['num_classes']), beam=beam, quantization=quantization)
+
+        for _, _, activation in trunk_layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Неподдерживаемая активация в {path}: {activation}")
+
+        print(f"✅ Иерархическая модель ({model.num_parents} родителей, {model.num_classes} листьев, "
+              f"{model.nbytes / 2**20:.1f} MB, головы {model.heads_nbytes / 2**20:.2f} MB) загружена из {path}")
+        return model
+
+    @staticmethod
+    def save(path, trunk_layers, head_W, head_b, head_offsets, head_leaves, num_classes):
+        head_W = sparse.csc_matrix(head_W, dtype=np.float32)
+        head_W.eliminate_zeros()
+        arrays = {
+            'format_version': np.array(HIERARCHICAL_FORMAT_VERSION),
+            'activations': np.array([activation for _, _, activation in trunk_layers]),
+            'head_W_data': head_W.data,
+            'head_W_indices': head_W.indices,
+            'head_W_indptr': head_W.indptr,
+            'head_b': head_b.astype(np.float32),
+            'head_offsets': np.asarray(head_offsets, dtype=np.int64),
+            'head_leaves': np.asarray(head_leaves, dtype=np.int64),
+            'num_classes': np.array(num_classes),
+        }
+        for i, (W, b, _) in enumerate(trunk_layers):
+            arrays[f'W{i}'] = W.astype(np.float32)
+            arrays[f'b{i}'] = b.astype(np.float32)
+
+        # Пишем во временный файл и переименовываем, чтобы сервер не прочитал недописанный
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def embed(self, X, batch_size=None):
+        """Векторы bottleneck_layer ствола"""
+        return self.trunk.embed(X, batch_size=batch_size)
+
+    def leaf_proba(self, X, parent):
+        """Вероятности листьев родителя parent (в порядке head_leaves)"""
+        start, end = self.head_offsets[parent], self.head_offsets[parent + 1]
+        scores = X @ self.heads[parent]
+        scores = scores.toarray() if sparse.issparse(scores) else np.asarray(scores)
+        return _softmax(scores + self.head_b[start:end])
+
+    def predict_proba(self, X):
+        if sparse.issparse(X):
+            X = X.astype(np.float32)
+        else:
+            X = np.asarray(X, dtype=np.float32)
+
+        parent_probs = self.trunk.predict_proba(X)
+        top_parents = np.argpartition(parent_probs, -self.beam, axis=1)[:, -self.beam:]
+
+        probs = np.zeros((X.shape[0], self.num_classes), dtype=np.float32)
+        # Голова родителя считается одной пачкой для всех строк, у которых он попал в beam
+        for parent in np.unique(top_parents):
+            rows = np.flatnonzero((top_parents == parent).any(axis=1))
+            start, end = self.head_offsets[parent], self.head_offsets[parent + 1]
+            leaf_probs = self.leaf_proba(X[rows], parent) * parent_probs[rows, parent][:, None]
+            probs[rows[:, None], self.head_leaves[start:end]] = leaf_probs
+        return probs
+
+    def predict_class(self, X, batch_size=None):
+        if batch_size is None or X.shape[0] <= batch_size:
+            probs = self.predict_proba(X)
+        else:
+            probs = np.vstack([
+                self.predict_proba(X[start:start + batch_size])
+                for start in range(0, X.shape[0], batch_size)
+            ])
+        labels = probs.argmax(axis=1)
+        return labels, probs
@@ -0,0 +1,83 @@
+"""
+Линейная первая ступень каскада (CASCADE_ENABLED)
+
+Multinomial логистическая регрессия на тех же TF-IDF признаках: softmax(X @ W + b).
+Если максимальная вероятность >= threshold, ответ даёт она, остальные товары
+уходят в глубокую модель. Строки без единого слова словаря (все признаки нулевые)
+всегда отвечает глубокая модель: у линейной для них остаётся только смещение b.
+threshold подбирается при обучении (training/train_linear.py).
+"""
+import os
+import numpy as np
+from scipy import sparse
+
+# Версия формата linear.npz - увеличивать при несовместимых изменениях
+LINEAR_FORMAT_VERSION = 1
+# Смещение для классов, которых не было в обучающей выборке (вероятность ~0)
+MISSING_CLASS_BIAS = -30.0
+
+
+def nonempty_rows(X):
+    """Маска строк, в которых есть хотя бы одно слово словаря"""
+    if sparse.isspmatrix_csr(X):
+        return np.diff(X.indptr) > 0
+    return np.asarray((X != 0).sum(axis=1)).ravel() > 0
+
+
+class LinearClassifier:
+
+    def __init__(self, W, b, threshold=1.0):
+        self.W = W.astype(np.float32)
+        self.b = b.astype(np.float32)
+        self.threshold = float(threshold)
+        self.input_dim, self.num_classes = self.W.shape
+
+    @classmethod
+    def from_sklearn(cls, clf, num_classes, threshold=1.0):
+        """Перенести веса обученной LogisticRegression (классы - индексы категорий)"""
+        W = np.zeros((clf.coef_.shape[1], num_classes), dtype=np.float32)
+        b = np.full(num_classes, MISSING_CLASS_BIAS, dtype=np.float32)
+        W[:, clf.classes_] = clf.coef_.T
+        b[clf.classes_] = clf.intercept_
+        return cls(W, b, threshold)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model not found at {path}")
+
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version != LINEAR_FORMAT_VERSION:
+                raise ValueError(
+                    f"Неподдерживаемая версия формата {path}: {format_version} "
+                    f"(ожидается {LINEAR_FORMAT_VERSION}). Переобучите: python -m training.train_linear"
+                )
+            model = cls(data['W'], data['b'], float(data['threshold']))
+
+        print(f"✅ Линейная модель загружена из {path} (порог {model.threshold:.2f})")
+        return model
+
+    def save(self, path):
+        # Пишем во временный файл и переименовываем, чтобы сервер не прочитал недописанный
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, format_version=np.array(LINEAR_FORMAT_VERSION),
+                 W=self.W, b=self.b, threshold=np.array(self.threshold))
+        os.replace(tmp_path, path)
+
+    @property
+    def nbytes(self):
+        return self.W.nbytes + self.b.nbytes
+
+    def routed(self, X, probs):
+        """Маска строк, на которые отвечает линейная модель (probs - её predict_proba(X))"""
+        return (probs.max(axis=1) >= self.threshold) & nonempty_rows(X)
+
+    def predict_proba(self, X):
+        if sparse.issparse(X):
+            X = X.astype(np.float32)
+        scores = np.asarray(X @ self.W) + self.b
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
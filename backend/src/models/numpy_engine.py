@@ -0,0 +1,178 @@
+"""
+Инференс классификатора на чистом NumPy (без импорта TensorFlow/Keras)
+
+Сеть из autoencoder_model.py при инференсе - это цепочка Dense слоёв
+(Dropout не активен), поэтому достаточно весов, выгруженных в .npz
+скриптом training/export_numpy_weights.py
+
+Веса можно хранить квантованными (INFERENCE_QUANTIZATION):
+    float16 - вдвое меньше памяти, точность ~1e-3
+    int8    - вчетверо меньше, симметричная квантизация со шкалой на каждый выход слоя
+Перед умножением веса восстанавливаются во float32: для разреженного входа (TF-IDF,
+в т.ч. переданного плотной матрицей) - только строки признаков, встретившихся в пачке,
+для плотного - блоками по DEQUANTIZE_BLOCK значений, так что полная float32-копия
+матрицы не создаётся. Смещения остаются float32.
+Отчёт о потере точности: python -m training.quantization_report
+"""
+import os
+import numpy as np
+from scipy import sparse
+
+# Версия формата .npz - увеличивать при несовместимых изменениях
+NPZ_FORMAT_VERSION = 1
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+def _softmax(x):
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': _relu,
+    'softmax': _softmax,
+}
+
+QUANTIZATION_MODES = ('none', 'float16', 'int8')
+# Сколько весов восстанавливать во float32 за раз при плотном входе (1 MB)
+DEQUANTIZE_BLOCK = 1 << 18
+# Плотный вход с долей ненулевых значений ниже этой считается как CSR
+SPARSE_INPUT_DENSITY = 0.1
+
+
+def quantize_weights(W, mode):
+    """
+    Returns:
+        (квантованные веса, шкала по выходам или None)
+    """
+    if mode == 'none':
+        return W.astype(np.float32), None
+    if mode == 'float16':
+        return W.astype(np.float16), None
+    if mode == 'int8':
+        scale = np.abs(W).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        q = np.clip(np.rint(W / scale), -127, 127).astype(np.int8)
+        return q, scale.astype(np.float32)
+    raise ValueError(f"Неизвестный режим квантизации: {mode}. Доступные: {', '.join(QUANTIZATION_MODES)}")
+
+def _matmul(X, W, scale):
+    """X @ W для весов любой точности; результат float32"""
+    if W.dtype == np.float32:
+        out = X @ W
+    else:
+        if not sparse.issparse(X) and np.count_nonzero(X) < SPARSE_INPUT_DENSITY * X.size:
+            X = sparse.csr_matrix(X)
+        if sparse.issparse(X):
+            # Восстанавливаем только строки W для признаков, которые есть в пачке
+            cols, inverse = np.unique(X.indices, return_inverse=True)
+            X = sparse.csr_matrix((X.data, inverse, X.indptr), shape=(X.shape[0], len(cols)))
+            out = X @ W[cols].astype(np.float32)
+        else:
+            # Блоками по выходам: во float32 одновременно не больше DEQUANTIZE_BLOCK весов
+            out = np.empty((X.shape[0], W.shape[1]), dtype=np.float32)
+            step = max(1, DEQUANTIZE_BLOCK // W.shape[0])
+            for start in range(0, W.shape[1], step):
+                out[:, start:start + step] = X @ W[:, start:start + step].astype(np.float32)
+
+    out = np.asarray(out)
+    if scale is not None:
+        out *= scale
+    return out
+
+
+class NumpyClassifier:
+    """Прямой проход по Dense слоям с тем же интерфейсом, что у AutoencoderDL.predict_class"""
+
+    def __init__(self, layers, source_sha256=None, quantization='none'):
+        """
+        Args:
+            layers: список (W, b, activation) в порядке прохода (float32)
+            source_sha256: хэш classifier.h5, из которого выгружены веса
+            quantization: 'none', 'float16' или 'int8'
+        """
+        self.source_sha256 = source_sha256
+        self.quantization = quantization
+        self.input_dim = layers[0][0].shape[0]
+        self.num_classes = layers[-1][0].shape[1]
+        # (W, scale, b, activation)
+        self.layers = [
+            (*quantize_weights(W, quantization), b.astype(np.float32), activation)
+            for W, b, activation in layers
+        ]
+
+    @property
+    def nbytes(self):
+        """Память под веса модели"""
+        return sum(
+            W.nbytes + b.nbytes + (scale.nbytes if scale is not None else 0)
+            for W, scale, b, _ in self.layers
+        )
+
+    @classmethod
+    def load(cls, path, quantization='none'):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model not found at {path}")
+
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version'])
+            if format_version != NPZ_FORMAT_VERSION:
+                raise ValueError(
+                    f"Неподдерживаемая версия формата {path}: {format_version} "
+                    f"(ожидается {NPZ_FORMAT_VERSION}). Перевыгрузите веса export_numpy_weights.py"
+                )
+
+            activations = [str(a) for a in data['activations']]
+            layers = [
+                (data[f'W{i}'].astype(np.float32), data[f'b{i}'].astype(np.float32), activation)
+                for i, activation in enumerate(activations)
+            ]
+            source_sha256 = str(data['source_sha256'])
+
+        for _, _, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Неподдерживаемая активация в {path}: {activation}")
+
+        model = cls(layers, source_sha256, quantization)
+        suffix = f", {quantization}" if quantization != 'none' else ''
+        print(f"✅ Модель (NumPy{suffix}, {model.nbytes / 2**20:.1f} MB) загружена из {path}")
+        return model
+
+    def _forward(self, X, layers):
+        """X - плотная матрица или CSR; первый слой считается как sparse @ dense"""
+        if sparse.issparse(X):
+            X = X.astype(np.float32)
+        else:
+            X = np.asarray(X, dtype=np.float32)
+
+        for W, scale, b, activation in layers:
+            X = _matmul(X, W, scale) + b
+            X = ACTIVATIONS[activation](X)
+        return X
+
+    def predict_proba(self, X):
+        return self._forward(X, self.layers)
+
+    def embed(self, X, batch_size=None):
+        """Выход предпоследнего слоя - векторы bottleneck_layer"""
+        if batch_size is None or X.shape[0] <= batch_size:
+            return self._forward(X, self.layers[:-1])
+        return np.vstack([
+            self._forward(X[start:start + batch_size], self.layers[:-1])
+            for start in range(0, X.shape[0], batch_size)
+        ])
+
+    def predict_class(self, X, batch_size=None):
+        if batch_size is None or X.shape[0] <= batch_size:
+            probs = self.predict_proba(X)
+        else:
+            probs = np.vstack([
+                self.predict_proba(X[start:start + batch_size])
+                for start in range(0, X.shape[0], batch_size)
+            ])
+        labels = probs.argmax(axis=1)
+        return labels, probs
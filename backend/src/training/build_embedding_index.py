@@ -0,0 +1,79 @@
+"""
+Индекс похожих товаров (models/embedding_index.py) для версии модели маркетплейса
+
+Товары обучающего CSV (нормализованные уникальные названия известных модели категорий)
+прогоняются через классификатор до bottleneck_layer, по векторам строится IVF-индекс
+и сохраняется рядом с моделью (embedding_index.npz в директории версии).
+Векторы зависят от весов, поэтому индекс строится заново для каждой версии.
+
+train_marketplace_models.py и retrain_with_corrections.py вызывают build_embedding_index
+после обучения. Запуск для уже обученных версий:
+    python -m training.build_embedding_index [marketplace ...]
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+from config import Config
+from models.embedding_index import IVFIndex, INDEX_FILE
+
+
+def load_index_products(csv_path, to_id):
+    """Уникальные нормализованные названия из CSV и id их категорий"""
+    from api.inference import clean_product_names
+
+    df = pd.read_csv(csv_path, usecols=['product_name', 'category_path'])
+    df = clean_product_names(df)
+    df = df[df['category_path'].isin(to_id)].drop_duplicates(subset=['product_name'], keep='last')
+    return df['product_name'].tolist(), df['category_path'].map(to_id).values
+
+def build_embedding_index(model, vectorizer, to_id, csv_path, output_dir, nlist=None):
+    """
+    Args:
+        model: классификатор версии (AutoencoderDL, NumpyClassifier или HierarchicalClassifier - у всех есть embed)
+        csv_path: датасет, на котором обучалась версия
+    """
+    start = time.perf_counter()
+    names, labels = load_index_products(csv_path, to_id)
+
+    # Названия без единого слова из словаря получают одинаковый вектор - в индекс их не берём
+    X = vectorizer.transform(names)
+    known = np.flatnonzero(X.getnnz(axis=1) > 0)
+    X, labels = X[known], labels[known]
+    names = [names[i] for i in known]
+
+    batch_size = Config.PREDICT_BATCH_SIZE
+    embeddings = np.vstack([
+        model.embed(X[i:i + batch_size])
+        for i in range(0, X.shape[0], batch_size)
+    ])
+
+    index = IVFIndex.build(embeddings, labels, names, nlist=nlist)
+    index.save(os.path.join(output_dir, INDEX_FILE))
+    print(f"🧭 Индекс похожих товаров: {len(index)} товаров, {index.nlist} кластеров, "
+          f"{index.nbytes / 2**20:.1f} MB, {time.perf_counter() - start:.1f} с")
+    return index
+
+def build_for_active_version(marketplace):
+    """Построить индекс для активной версии уже обученной модели"""
+    from pathlib import Path
+    from training.processed import load_preprocessing_objects
+    from training.model_store import get_version_dir, load_version_classifier
+    from training.train_marketplace_models import MARKETPLACE_CONFIG
+
+    config = MARKETPLACE_CONFIG[marketplace]
+    _, model_dir = get_version_dir(os.path.join(Config.MODELS_BIN, marketplace))
+    vectorizer, to_id, _ = load_preprocessing_objects(model_dir)
+    model = load_version_classifier(model_dir, len(vectorizer.vocabulary_), config['bottleneck_dim'], len(to_id))
+
+    project_root = Path(__file__).parent.parent.parent
+    build_embedding_index(model, vectorizer, to_id, project_root / config['csv_file'], model_dir)
+    # Сервер подхватит индекс при первом запросе похожих товаров
+    print(f"✅ {marketplace}: индекс записан в {model_dir}")
+
+
+if __name__ == '__main__':
+    import sys
+
+    for marketplace in sys.argv[1:] or Config.MARKETPLACES:
+        build_for_active_version(marketplace)
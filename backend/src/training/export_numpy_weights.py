@@ -0,0 +1,125 @@
+"""
+Выгрузка весов classifier.h5 в classifier.npz для NumPy-инференса (INFERENCE_ENGINE=numpy)
+
+Запуск: python -m training.export_numpy_weights [marketplace ...]
+"""
+import os
+import hashlib
+import numpy as np
+from config import Config
+from training.processed import load_preprocessing_objects
+from models.numpy_engine import NumpyClassifier, NPZ_FORMAT_VERSION
+
+# Допустимое расхождение вероятностей NumPy и Keras
+PARITY_TOLERANCE = 1e-4
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def extract_dense_layers(classifier):
+    """Достать (W, b, activation) всех Dense слоёв Keras-модели по порядку"""
+    from keras.layers import Dense, Dropout, InputLayer
+
+    layers = []
+    for layer in classifier.layers:
+        if isinstance(layer, (InputLayer, Dropout)):
+            # Dropout при инференсе ничего не делает
+            continue
+        if not isinstance(layer, Dense):
+            raise ValueError(f"Слой {layer.name} ({type(layer).__name__}) не поддерживается NumPy-инференсом")
+
+        W, b = layer.get_weights()
+        activation = layer.get_config().get('activation', 'linear')
+        layers.append((W.astype(np.float32), b.astype(np.float32), activation))
+
+    return layers
+
+def export_classifier(classifier_path, output_path):
+    """Сохранить веса classifier.h5 в .npz"""
+    from keras.models import load_model
+
+    classifier = load_model(classifier_path)
+    layers = extract_dense_layers(classifier)
+
+    arrays = {
+        'format_version': np.array(NPZ_FORMAT_VERSION),
+        'source_sha256': np.array(file_sha256(classifier_path)),
+        'activations': np.array([activation for _, _, activation in layers]),
+    }
+    for i, (W, b, _) in enumerate(layers):
+        arrays[f'W{i}'] = W
+        arrays[f'b{i}'] = b
+
+    # Пишем во временный файл и переименовываем, чтобы сервер не прочитал недописанный
+    tmp_path = output_path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, output_path)
+
+    print(f"✅ Веса выгружены: {output_path} ({len(layers)} Dense слоёв)")
+    return classifier
+
+def check_parity(classifier, npz_path, X, tolerance=PARITY_TOLERANCE, quantization='none'):
+    """
+    Сравнить вероятности Keras и NumPy на одних и тех же входах (X - CSR, как при инференсе)
+
+    Returns:
+        (max_abs_diff, argmax_agreement)
+    """
+    keras_probs = classifier.predict(X.toarray(), verbose=0)
+    _, numpy_probs = NumpyClassifier.load(npz_path, quantization=quantization).predict_class(X)
+
+    max_abs_diff = float(np.abs(keras_probs - numpy_probs).max())
+    agreement = float((keras_probs.argmax(axis=1) == numpy_probs.argmax(axis=1)).mean())
+
+    print(f"   max |keras - numpy| = {max_abs_diff:.2e}, совпадение top-1: {agreement * 100:.2f}%")
+    if max_abs_diff > tolerance:
+        raise AssertionError(f"NumPy-инференс расходится с Keras: {max_abs_diff:.2e} > {tolerance:.0e}")
+
+    return max_abs_diff, agreement
+
+def parity_inputs(vectorizer, n_samples=500, seed=0):
+    """TF-IDF случайных названий из слов словаря vectorizer'а - входы для check_parity"""
+    vocabulary = list(vectorizer.vocabulary_.keys())
+    rng = np.random.default_rng(seed)
+    texts = [
+        ' '.join(rng.choice(vocabulary, size=rng.integers(1, 8)))
+        for _ in range(n_samples)
+    ]
+    return vectorizer.transform(texts)
+
+def export_checked(classifier_path, output_path, vectorizer, n_parity_samples=500):
+    """
+    export_classifier + check_parity. Обучение вызывает её до publish_version:
+    при расхождении (AssertionError) версия не публикуется
+    """
+    classifier = export_classifier(classifier_path, output_path)
+    check_parity(classifier, output_path, parity_inputs(vectorizer, n_parity_samples))
+    return classifier
+
+def export_marketplace(marketplace, n_parity_samples=500):
+    """Выгрузить веса активной версии модели маркетплейса и проверить совпадение с Keras"""
+    from api.model_cache import find_classifier_path
+    from training.model_store import get_version_dir
+
+    _, model_dir = get_version_dir(os.path.join(Config.MODELS_BIN, marketplace))
+    classifier_path = find_classifier_path(model_dir)
+    npz_path = os.path.join(os.path.dirname(classifier_path), 'classifier.npz')
+
+    print(f"\n📦 {marketplace}: {classifier_path} -> {npz_path}")
+    vectorizer, _, _ = load_preprocessing_objects(model_dir)
+    export_checked(classifier_path, npz_path, vectorizer, n_parity_samples)
+
+    return npz_path
+
+
+if __name__ == '__main__':
+    import sys
+
+    marketplaces = sys.argv[1:] or Config.MARKETPLACES
+    for marketplace in marketplaces:
+        export_marketplace(marketplace)
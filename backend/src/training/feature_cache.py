@@ -0,0 +1,109 @@
+"""
+Кэш предобработанных обучающих матриц (FEATURE_CACHE_ENABLED)
+
+preprocess_data на каждом запуске обучения заново читает CSV, чистит названия,
+обучает TF-IDF и кодирует метки. Результат зависит только от содержимого CSV
+и параметров min_samples/max_features, поэтому он сохраняется под ключом
+sha256(CSV) + параметры и переиспользуется, пока ничего из этого не изменилось.
+
+Запись кэша - директория <FEATURE_CACHE_DIR>/<ключ>/:
+    features.npz  - X (CSR: data, indices, indptr, shape), y, categories (отсортированные category_path)
+    tokenizer.pkl - обученный TfidfVectorizer
+Хранятся FEATURE_CACHE_KEEP последних использованных записей.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+from config import Config
+
+# Версия формата записей кэша - увеличивать при несовместимых изменениях (в т.ч. preprocess_data)
+FEATURE_CACHE_FORMAT_VERSION = 1
+FEATURES_FILE = 'features.npz'
+
+
+def dataset_key(csv_file, min_samples_per_category, max_features):
+    """Ключ записи: хэш содержимого CSV и параметров предобработки"""
+    digest = hashlib.sha256()
+    with open(csv_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(f'|{min_samples_per_category}|{max_features}|{FEATURE_CACHE_FORMAT_VERSION}'.encode())
+    return digest.hexdigest()[:32]
+
+def load_cached_features(entry_dir):
+    """(X, y, vectorizer, to_id, to_label) из записи кэша или None, если её нет или формат устарел"""
+    from scipy.sparse import csr_matrix
+
+    features_path = os.path.join(entry_dir, FEATURES_FILE)
+    if not os.path.exists(features_path):
+        return None
+
+    with np.load(features_path, allow_pickle=False) as data:
+        if int(data['format_version']) != FEATURE_CACHE_FORMAT_VERSION:
+            return None
+        X = csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+        y = data['y']
+        categories = data['categories'].tolist()
+
+    with open(os.path.join(entry_dir, 'tokenizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+
+    to_id = {cat: i for i, cat in enumerate(categories)}
+    to_label = {i: cat for cat, i in to_id.items()}
+    return X, y, vectorizer, to_id, to_label
+
+def save_cached_features(entry_dir, X, y, vectorizer, to_label):
+    """Пишем во временную директорию и переименовываем, чтобы параллельный запуск не прочитал недописанную"""
+    tmp_dir = f'{entry_dir}.tmp-{os.getpid()}'
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    X = X.tocsr()
+    categories = np.array([to_label[i] for i in range(len(to_label))], dtype=str)
+    np.savez(os.path.join(tmp_dir, FEATURES_FILE), format_version=np.array(FEATURE_CACHE_FORMAT_VERSION),
+             data=X.data, indices=X.indices, indptr=X.indptr, shape=np.array(X.shape),
+             y=np.asarray(y), categories=categories)
+    with open(os.path.join(tmp_dir, 'tokenizer.pkl'), 'wb') as f:
+        pickle.dump(vectorizer, f)
+
+    if os.path.exists(entry_dir):
+        shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+
+def _evict(cache_dir, keep):
+    entries = [
+        os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+        if os.path.isdir(os.path.join(cache_dir, name)) and '.tmp-' not in name
+    ]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for entry in entries[keep:]:
+        shutil.rmtree(entry, ignore_errors=True)
+
+def preprocess_data_cached(csv_file, min_samples_per_category=20, max_features=2000, sparse=False):
+    """preprocess_data с кэшем на диске; без FEATURE_CACHE_ENABLED - просто preprocess_data"""
+    from training.processed import preprocess_data
+
+    if not Config.FEATURE_CACHE_ENABLED:
+        return preprocess_data(csv_file, min_samples_per_category, max_features, sparse=sparse)
+
+    start = time.perf_counter()
+    entry_dir = os.path.join(Config.FEATURE_CACHE_DIR,
+                             dataset_key(csv_file, min_samples_per_category, max_features))
+    cached = load_cached_features(entry_dir)
+    if cached is not None:
+        os.utime(entry_dir)  # запись недавно использована - вытесняется последней
+        X, y, vectorizer, to_id, to_label = cached
+        print(f"⚡ Признаки из кэша {entry_dir}: {X.shape[0]} товаров в {len(to_id)} категориях "
+              f"({time.perf_counter() - start:.2f} с)")
+    else:
+        X, y, vectorizer, to_id, to_label = preprocess_data(
+            csv_file, min_samples_per_category, max_features, sparse=True
+        )
+        os.makedirs(Config.FEATURE_CACHE_DIR, exist_ok=True)
+        save_cached_features(entry_dir, X, y, vectorizer, to_label)
+        _evict(Config.FEATURE_CACHE_DIR, Config.FEATURE_CACHE_KEEP)
+        print(f"💾 Признаки сохранены в кэш {entry_dir}")
+
+    return (X if sparse else X.toarray()), y, vectorizer, to_id, to_label
@@ -0,0 +1,233 @@
+"""
+Дообучение модели на исправлениях пользователей вместо полного переобучения (INCREMENTAL_RETRAIN)
+
+retrain_with_corrections обучает новую модель с нуля на всём датасете. Здесь активная
+версия сохраняет vectorizer, категории и веса и дообучается FINE_TUNE_EPOCHS эпох
+на исправлениях (все исправления маркетплейса, повторённые CORRECTION_REPEATS раз)
+вместе со случайной выборкой обучающего CSV (replay), чтобы модель не забыла остальные товары.
+
+Нужно полное переобучение (fine_tune_with_corrections возвращает None), если:
+- у активной версии нет classifier.h5 (иерархическая модель);
+- в новых исправлениях есть категории, которых нет у модели;
+- дрейф словаря: в среднем больше FINE_TUNE_MAX_OOV слов названий исправлений нет в словаре TF-IDF;
+- точность на отложенной части replay после дообучения упала больше FINE_TUNE_MAX_ACCURACY_DROP;
+- точность на исправлениях после дообучения ниже FINE_TUNE_MIN_CORRECTIONS_ACCURACY;
+- версия получена FINE_TUNE_MAX_ROUNDS дообучениями подряд.
+
+Новая версия получает дообученные classifier.h5/classifier.npz, заново построенный
+индекс похожих товаров и fine_tune.json (базовая версия, номер дообучения, точности).
+Линейная ступень каскада (linear.npz) копируется из базовой версии, но её порог
+подбирается заново под дообученную модель на половине отложенной части replay вместе
+с исправлениями; cascade_report.json считается на второй половине. Сами исправленные
+названия отвечает индекс исправлений (api/exact_match.py) раньше любой модели.
+Если у базовой версии каскад отключён, linear.npz берётся из версии полного переобучения
+(пока она не удалена по MODEL_VERSIONS_KEEP).
+"""
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from config import Config
+
+FINE_TUNE_FILE = 'fine_tune.json'
+LEARNING_RATE = 3e-4
+BATCH_SIZE = 128
+# Исправлений на порядки меньше, чем replay - повторяем их, чтобы они влияли на веса
+CORRECTION_REPEATS = 5
+# Отложенная часть replay для проверки, что модель не забыла старые товары
+HOLDOUT_SIZE = 2000
+
+
+def load_all_corrections(marketplace):
+    """Все исправления маркетплейса (и уже использованные): нормализованное название -> категория"""
+    from training.retrain_with_corrections import FEEDBACK_FILE
+    from api.inference import normalize_product_name
+
+    if not os.path.exists(FEEDBACK_FILE):
+        return {}
+    with open(FEEDBACK_FILE, 'r', encoding='utf-8') as f:
+        all_corrections = json.load(f)
+
+    corrections = {}
+    # Более поздние исправления важнее ранних
+    for correction in sorted(all_corrections, key=lambda c: c.get('timestamp', '')):
+        name = normalize_product_name(correction.get('product_name', ''))
+        same_marketplace = str(correction.get('marketplace', '')).strip().lower() == marketplace
+        if same_marketplace and name and correction.get('corrected_category'):
+            corrections[name] = correction['corrected_category']
+    return corrections
+
+def load_replay_sample(csv_path, to_id, exclude_names, size, seed=0):
+    """Случайные уникальные товары обучающего CSV известных модели категорий (кроме exclude_names)"""
+    from api.inference import clean_product_names
+
+    df = pd.read_csv(csv_path, usecols=['product_name', 'category_path'])
+    df = clean_product_names(df).drop_duplicates(subset=['product_name'])
+    df = df[df['category_path'].isin(to_id) & ~df['product_name'].isin(exclude_names)]
+    if len(df) > size:
+        df = df.sample(size, random_state=seed)
+    return df['product_name'].tolist(), df['category_path'].map(to_id).values
+
+def oov_share(vectorizer, names):
+    """Средняя доля слов названия, которых нет в словаре vectorizer"""
+    analyzer = vectorizer.build_analyzer()
+    shares = [
+        sum(token not in vectorizer.vocabulary_ for token in tokens) / len(tokens)
+        for tokens in map(analyzer, names) if tokens
+    ]
+    return float(np.mean(shares)) if shares else 0.0
+
+def _read_fine_tune_info(model_dir):
+    path = os.path.join(model_dir, FINE_TUNE_FILE)
+    if not os.path.exists(path):
+        return {'rounds': 0}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _accuracy(model, X, y):
+    return float((model.predict_class(X)[0] == y).mean()) if len(y) else 0.0
+
+def carry_linear_stage(source_dirs, version_dir, model, X_holdout, y_holdout, X_corr, y_corr):
+    """
+    Скопировать linear.npz с порогом, подобранным под дообученную модель
+
+    Args:
+        source_dirs: где искать linear.npz, по порядку (базовая версия, версия полного переобучения)
+    """
+    from scipy.sparse import vstack
+    from models.linear_model import LinearClassifier
+    from training.train_linear import LINEAR_FILE, fit_threshold, save_linear_stage
+
+    paths = [os.path.join(d, LINEAR_FILE) for d in source_dirs if d]
+    paths = [path for path in paths if os.path.exists(path)]
+    half = len(y_holdout) // 2
+    if not paths or half == 0:
+        return None
+
+    linear = LinearClassifier.load(paths[0])
+    # Линейная модель не знает исправлений: там, где она с ними спорит, порог растёт
+    X_tune = vstack([X_holdout[:half], X_corr]).tocsr()
+    y_tune = np.concatenate([y_holdout[:half], y_corr])
+    linear.threshold = fit_threshold(linear, model, X_tune, y_tune)
+
+    linear, _ = save_linear_stage(linear, model, X_holdout[half:], y_holdout[half:], version_dir,
+                                  tuning_samples=len(y_tune))
+    return linear
+
+def fine_tune_with_corrections(marketplace, corrections, dataset_path):
+    """
+    Args:
+        corrections: новые (неиспользованные) исправления из load_corrections
+        dataset_path: обучающий CSV маркетплейса (источник replay)
+
+    Returns:
+        (model, history) или None, если нужно полное переобучение (причина печатается)
+    """
+    from scipy.sparse import vstack
+    from api.inference import normalize_product_name
+    from training.processed import load_preprocessing_objects, save_preprocessing_objects
+    from training.model_store import resolve_model_dir, get_version_dir, create_version_dir, publish_version
+    from training.train_marketplace_models import MARKETPLACE_CONFIG
+    from models.autoencoder_model import AutoencoderDL
+
+    def full_retrain(reason):
+        print(f"↪️ Дообучение невозможно ({reason}) - полное переобучение")
+        return None
+
+    if not corrections:
+        return full_retrain('нет новых исправлений')
+
+    start = time.perf_counter()
+    config = MARKETPLACE_CONFIG[marketplace]
+    model_dir = resolve_model_dir(os.path.join(Config.MODELS_BIN, marketplace))
+    base_version, base_dir = get_version_dir(model_dir)
+    h5_path = os.path.join(base_dir, 'classifier.h5')
+    if not os.path.exists(h5_path):
+        return full_retrain(f'нет {h5_path}')
+
+    info = _read_fine_tune_info(base_dir)
+    if info['rounds'] >= Config.FINE_TUNE_MAX_ROUNDS:
+        return full_retrain(f"версия уже дообучалась {info['rounds']} раз подряд")
+
+    vectorizer, to_id, to_label = load_preprocessing_objects(base_dir)
+
+    new_categories = {c['corrected_category'] for c in corrections} - set(to_id)
+    if new_categories:
+        return full_retrain(f'новые категории: {sorted(new_categories)[:5]}')
+
+    new_names = [normalize_product_name(c['product_name']) for c in corrections]
+    oov = oov_share(vectorizer, new_names)
+    if oov > Config.FINE_TUNE_MAX_OOV:
+        return full_retrain(f'дрейф словаря: {oov:.0%} слов исправлений вне словаря')
+
+    # Все исправления маркетплейса: уже вписанные в модель не должны забываться при следующих дообучениях
+    all_corrections = {name: cat for name, cat in load_all_corrections(marketplace).items() if cat in to_id}
+    correction_names = list(all_corrections)
+    X_corr = vectorizer.transform(correction_names)
+    y_corr = np.array([to_id[all_corrections[name]] for name in correction_names])
+
+    replay_names, replay_y = load_replay_sample(
+        dataset_path, to_id, set(correction_names), Config.FINE_TUNE_REPLAY_SIZE + HOLDOUT_SIZE
+    )
+    X_replay = vectorizer.transform(replay_names)
+    n_holdout = min(HOLDOUT_SIZE, len(replay_y) // 5)
+    X_holdout, y_holdout = X_replay[:n_holdout], replay_y[:n_holdout]
+    X_replay, replay_y = X_replay[n_holdout:], replay_y[n_holdout:]
+
+    model = AutoencoderDL(input_dim=len(vectorizer.vocabulary_), bottleneck_dim=config['bottleneck_dim'],
+                          num_classes=len(to_id))
+    model.load_classifier(h5_path)
+    holdout_before = _accuracy(model, X_holdout, y_holdout)
+    corrections_before = _accuracy(model, X_corr, y_corr)
+
+    X_train = vstack([X_replay] + [X_corr] * CORRECTION_REPEATS).tocsr()
+    y_train = np.concatenate([replay_y] + [y_corr] * CORRECTION_REPEATS)
+    print(f"\n🎯 Дообучение: {len(correction_names)} исправлений x{CORRECTION_REPEATS} + {len(replay_y)} товаров replay, "
+          f"{Config.FINE_TUNE_EPOCHS} эпох")
+    history = model.fine_tune(X_train, y_train, epochs=Config.FINE_TUNE_EPOCHS, batch_size=BATCH_SIZE,
+                             learning_rate=LEARNING_RATE)
+
+    holdout_after = _accuracy(model, X_holdout, y_holdout)
+    corrections_after = _accuracy(model, X_corr, y_corr)
+    print(f"   Точность на отложенных товарах: {holdout_before * 100:.1f}% -> {holdout_after * 100:.1f}%")
+    print(f"   Точность на исправлениях:       {corrections_before * 100:.1f}% -> {corrections_after * 100:.1f}%")
+    if holdout_before - holdout_after > Config.FINE_TUNE_MAX_ACCURACY_DROP:
+        return full_retrain(f'точность на отложенных товарах упала на {(holdout_before - holdout_after) * 100:.1f} п.п.')
+    if corrections_after < Config.FINE_TUNE_MIN_CORRECTIONS_ACCURACY:
+        return full_retrain(f'точность на исправлениях {corrections_after * 100:.1f}% ниже '
+                            f'{Config.FINE_TUNE_MIN_CORRECTIONS_ACCURACY * 100:.0f}%')
+
+    version, version_dir = create_version_dir(model_dir)
+    save_preprocessing_objects(vectorizer, to_id, to_label, output_dir=version_dir)
+    classifier_path = os.path.join(version_dir, 'classifier.h5')
+    model.save(classifier_path)
+
+    from training.export_numpy_weights import export_checked
+    from models.numpy_engine import NumpyClassifier
+    npz_path = os.path.join(version_dir, 'classifier.npz')
+    export_checked(classifier_path, npz_path, vectorizer)
+
+    # Векторы товаров изменились вместе с весами
+    from training.build_embedding_index import build_embedding_index
+    build_embedding_index(NumpyClassifier.load(npz_path), vectorizer, to_id, dataset_path, version_dir)
+
+    original_dir = get_version_dir(model_dir, info['base_version'])[1] if info.get('base_version') else None
+    carry_linear_stage([base_dir, original_dir], version_dir, model, X_holdout, y_holdout, X_corr, y_corr)
+
+    elapsed = time.perf_counter() - start
+    with open(os.path.join(version_dir, FINE_TUNE_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            'base_version': info.get('base_version', base_version),
+            'rounds': info['rounds'] + 1,
+            'corrections': len(correction_names),
+            'replay': len(replay_y),
+            'holdout_accuracy': [holdout_before, holdout_after],
+            'corrections_accuracy': [corrections_before, corrections_after],
+            'seconds': round(elapsed, 2)
+        }, f, ensure_ascii=False, indent=2)
+
+    publish_version(model_dir, version, keep=Config.MODEL_VERSIONS_KEEP)
+    print(f"\n✅ МОДЕЛЬ ДООБУЧЕНА за {elapsed:.1f} с (дообучение {info['rounds'] + 1}/{Config.FINE_TUNE_MAX_ROUNDS})")
+    print(f"   Путь: {classifier_path}")
+    return model, history
@@ -0,0 +1,234 @@
+"""
+Компактный формат артефактов предобработки вместо pickle
+
+    vectorizer.json              параметры TfidfVectorizer и версия формата
+    idf.npy                      веса IDF по индексу признака
+    vocab.npy, vocab_offsets.npy словарь: UTF-8 байты всех токенов подряд + смещения (токен i = признак i)
+    vocab_sorted.npy             токены в UTF-8 как отсортированный массив фиксированной ширины (dtype S)
+    vocab_ids.npy                номер признака для каждой строки vocab_sorted.npy
+    labels.npy, labels_offsets.npy  category_path по id класса в том же формате
+
+Массивы открываются через np.load(mmap_mode='r'): страницы файлов общие для
+всех воркеров gunicorn, а загрузка не создаёт тысяч Python-объектов unpickle.
+Сервер получает MmapTfidfVectorizer: transform ищет токены двоичным поиском
+(np.searchsorted) прямо в vocab_sorted.npy, словарь-dict в воркере не строится.
+Результат transform совпадает с исходным TfidfVectorizer.
+
+Запуск (конвертация уже обученных моделей): python -m training.flat_artifacts [marketplace ...]
+"""
+import os
+import json
+import numpy as np
+
+# Версия формата - увеличивать при несовместимых изменениях
+FLAT_FORMAT_VERSION = 2
+VECTORIZER_FILE = 'vectorizer.json'
+
+# Параметры TfidfVectorizer, которые влияют на transform и сохраняются в vectorizer.json
+VECTORIZER_PARAMS = (
+    'analyzer', 'binary', 'decode_error', 'encoding', 'input', 'lowercase', 'max_df', 'min_df',
+    'ngram_range', 'norm', 'smooth_idf', 'strip_accents', 'sublinear_tf', 'token_pattern', 'use_idf'
+)
+
+
+def save_string_table(output_dir, name, strings):
+    """Сохранить список строк как UTF-8 байты + смещения"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    np.save(os.path.join(output_dir, f'{name}.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(output_dir, f'{name}_offsets.npy'), offsets)
+
+def load_string_table(model_dir, name):
+    data = np.load(os.path.join(model_dir, f'{name}.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(model_dir, f'{name}_offsets.npy'), mmap_mode='r')
+    raw = data.tobytes()
+    offsets = offsets.tolist()  # индексация Python-списка намного быстрее, чем numpy-скаляров
+    return [raw[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+def save_flat_artifacts(vectorizer, to_label, output_dir):
+    """Записать vectorizer и таблицу категорий в компактном формате"""
+    params = vectorizer.get_params()
+    for key in ('preprocessor', 'tokenizer', 'stop_words'):
+        if params.get(key) is not None:
+            raise ValueError(f"TfidfVectorizer с {key}={params[key]!r} не поддерживается компактным форматом")
+
+    vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    save_string_table(output_dir, 'vocab', vocabulary)
+    # Порядок байтов UTF-8 совпадает с порядком кодовых точек - searchsorted работает с тем же сравнением
+    encoded = np.array([token.encode('utf-8') for token in vocabulary], dtype=bytes)
+    order = np.argsort(encoded, kind='stable')
+    np.save(os.path.join(output_dir, 'vocab_sorted.npy'), encoded[order])
+    np.save(os.path.join(output_dir, 'vocab_ids.npy'), order.astype(np.int32))
+    np.save(os.path.join(output_dir, 'idf.npy'), np.asarray(vectorizer.idf_))
+    save_string_table(output_dir, 'labels', [to_label[i] for i in range(len(to_label))])
+
+    meta = {key: params[key] for key in VECTORIZER_PARAMS}
+    meta['ngram_range'] = list(meta['ngram_range'])
+    meta['dtype'] = np.dtype(params['dtype']).name
+    meta['format_version'] = FLAT_FORMAT_VERSION
+    meta['n_features'] = len(vocabulary)
+    meta['n_classes'] = len(to_label)
+
+    # vectorizer.json пишется последним: по нему загрузчик понимает, что артефакты полные
+    tmp_path = os.path.join(output_dir, VECTORIZER_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, VECTORIZER_FILE))
+
+def has_flat_artifacts(model_dir):
+    """
+    Есть ли компактные артефакты текущего формата и не устарели ли они относительно tokenizer.pkl
+    (артефакты старого формата пропускаются - загрузится pickle)
+    """
+    meta_path = os.path.join(model_dir, VECTORIZER_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        if json.load(f).get('format_version') != FLAT_FORMAT_VERSION:
+            return False
+    pickle_path = os.path.join(model_dir, 'tokenizer.pkl')
+    return not os.path.exists(pickle_path) or os.path.getmtime(meta_path) >= os.path.getmtime(pickle_path)
+
+class MmapTfidfVectorizer:
+    """
+    transform как у TfidfVectorizer, но словарь не загружается в память воркера:
+    токены ищутся np.searchsorted в отсортированном массиве vocab_sorted.npy (mmap)
+
+    vocabulary_ (dict) собирается только при первом обращении - это нужно
+    офлайн-скриптам, сервер его не трогает.
+    """
+
+    def __init__(self, model_dir, params):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.model_dir = model_dir
+        self.params = params
+        self.idf_ = np.load(os.path.join(model_dir, 'idf.npy'), mmap_mode='r')
+        self.sorted_tokens = np.load(os.path.join(model_dir, 'vocab_sorted.npy'), mmap_mode='r')
+        self.sorted_ids = np.load(os.path.join(model_dir, 'vocab_ids.npy'), mmap_mode='r')
+        self.n_features = len(self.idf_)
+        # Токенизатор без словаря: build_analyzer не требует fit
+        self._analyzer = TfidfVectorizer(**params).build_analyzer()
+        self._vocabulary = None
+
+    def get_params(self, deep=True):
+        return dict(self.params, vocabulary=None, preprocessor=None, tokenizer=None, stop_words=None)
+
+    def build_analyzer(self):
+        return self._analyzer
+
+    @property
+    def vocabulary_(self):
+        if self._vocabulary is None:
+            self._vocabulary = {token: i for i, token in enumerate(load_string_table(self.model_dir, 'vocab'))}
+        return self._vocabulary
+
+    def to_sklearn(self):
+        """Обычный TfidfVectorizer с тем же словарём и idf (для pickle)"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(vocabulary=dict(self.vocabulary_), **self.params)
+        vectorizer.idf_ = np.array(self.idf_)
+        return vectorizer
+
+    def _lookup(self, tokens):
+        """Номер признака для каждого токена, -1 - нет в словаре"""
+        if not tokens:
+            return np.zeros(0, dtype=np.int64)
+        encoded = np.char.encode(np.array(tokens, dtype=str), 'utf-8')
+        # Токены длиннее самого длинного слова словаря после обрезки могли бы совпасть ложно
+        too_long = np.char.str_len(encoded) > self.sorted_tokens.dtype.itemsize
+        encoded = encoded.astype(self.sorted_tokens.dtype)
+
+        positions = np.searchsorted(self.sorted_tokens, encoded)
+        positions = np.minimum(positions, len(self.sorted_tokens) - 1)
+        found = (self.sorted_tokens[positions] == encoded) & ~too_long
+        return np.where(found, self.sorted_ids[positions], -1)
+
+    def transform(self, raw_documents):
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+
+        tokens, lengths = [], []
+        for document in raw_documents:
+            document_tokens = self._analyzer(document)
+            tokens.extend(document_tokens)
+            lengths.append(len(document_tokens))
+
+        features = self._lookup(tokens)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        known = features >= 0
+        # Повторы (строка, признак) при сборке CSR складываются - получаются частоты слов
+        X = sparse.csr_matrix(
+            (np.ones(known.sum(), dtype=self.params['dtype']), (rows[known], features[known])),
+            shape=(len(lengths), self.n_features), dtype=self.params['dtype']
+        )
+        X.sum_duplicates()
+
+        if self.params['binary']:
+            X.data.fill(1)
+        if self.params['sublinear_tf']:
+            np.log(X.data, X.data)
+            X.data += 1
+        if self.params['use_idf']:
+            X.data *= np.asarray(self.idf_, dtype=X.dtype)[X.indices]
+        if self.params['norm']:
+            X = normalize(X, norm=self.params['norm'], copy=False)
+        return X
+
+
+def load_flat_artifacts(model_dir):
+    """
+    Returns:
+        (vectorizer, to_id, to_label) - как у load_preprocessing_objects
+    """
+    with open(os.path.join(model_dir, VECTORIZER_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta['format_version'] != FLAT_FORMAT_VERSION:
+        raise ValueError(
+            f"Неподдерживаемая версия формата {model_dir}: {meta['format_version']} "
+            f"(ожидается {FLAT_FORMAT_VERSION}). Перевыгрузите: python -m training.flat_artifacts"
+        )
+
+    params = {key: meta[key] for key in VECTORIZER_PARAMS}
+    params['ngram_range'] = tuple(params['ngram_range'])
+    params['dtype'] = np.dtype(meta['dtype']).type
+    vectorizer = MmapTfidfVectorizer(model_dir, params)
+
+    to_label = dict(enumerate(load_string_table(model_dir, 'labels')))
+    to_id = {label: i for i, label in to_label.items()}
+    return vectorizer, to_id, to_label
+
+def export_marketplace(marketplace):
+    """Сконвертировать pickle-артефакты активной версии маркетплейса"""
+    import pickle
+    from config import Config
+    from training.model_store import get_version_dir
+
+    _, model_dir = get_version_dir(os.path.join(Config.MODELS_BIN, marketplace))
+    with open(os.path.join(model_dir, 'tokenizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+    with open(os.path.join(model_dir, 'idx2label.pkl'), 'rb') as f:
+        to_label = pickle.load(f)
+
+    save_flat_artifacts(vectorizer, to_label, model_dir)
+
+    # Проверка: transform восстановленного vectorizer'а совпадает с исходным
+    flat_vectorizer, _, flat_to_label = load_flat_artifacts(model_dir)
+    tokens = list(vectorizer.vocabulary_)
+    texts = [' '.join(tokens[i:i + 5]) for i in range(0, len(tokens), 5)]
+    diff = abs(vectorizer.transform(texts) - flat_vectorizer.transform(texts)).max()
+    if diff > 1e-6 or flat_to_label != to_label:
+        raise AssertionError(f"Компактные артефакты {marketplace} расходятся с pickle (max diff {diff:.2e})")
+
+    print(f"✅ {marketplace}: компактные артефакты записаны в {model_dir}")
+    return model_dir
+
+
+if __name__ == '__main__':
+    import sys
+    from config import Config
+
+    for marketplace in sys.argv[1:] or Config.MARKETPLACES:
+        export_marketplace(marketplace)
@@ -0,0 +1,104 @@
+"""
+Версионированное хранилище моделей маркетплейса
+
+models_bin/<marketplace>/
+    versions/<version>/   classifier.h5, classifier.npz, tokenizer.pkl, label2idx.pkl, idx2label.pkl
+    current               имя активной версии (переключается атомарно через os.replace)
+
+Новая версия полностью записывается в свою директорию и только потом
+публикуется, поэтому сервер никогда не видит смесь старых и новых файлов.
+Старый плоский формат (файлы прямо в models_bin/<marketplace>) читается,
+пока не опубликована первая версия.
+"""
+import os
+import shutil
+from datetime import datetime
+
+CURRENT_FILE = 'current'
+VERSIONS_DIR = 'versions'
+
+
+def resolve_model_dir(model_dir):
+    """Найти директорию модели на диске (пути зависят от того, откуда запущен сервер)"""
+    possible_paths = [
+        model_dir,  # "src/data/models_bin/..." (локальный запуск без --chdir)
+        model_dir.replace('src/', ''),  # "data/models_bin/..." (Docker с --chdir src)
+        os.path.join('backend', model_dir),  # "backend/src/data/models_bin/..." (локальная разработка)
+    ]
+    for path in possible_paths:
+        if os.path.isdir(path):
+            return path
+    return model_dir
+
+def get_current_version(model_dir):
+    """Имя активной версии или None (старый формат без версий)"""
+    path = os.path.join(resolve_model_dir(model_dir), CURRENT_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def get_version_dir(model_dir, version=None):
+    """
+    Returns:
+        (version, директория с артефактами); для старого формата version=None
+    """
+    base = resolve_model_dir(model_dir)
+    version = version or get_current_version(base)
+    if version is None:
+        return None, base
+    return version, os.path.join(base, VERSIONS_DIR, version)
+
+def load_version_classifier(model_dir, input_dim, bottleneck_dim, num_classes):
+    """
+    Классификатор версии для офлайн-скриптов: hierarchical.npz (если включён или единственный),
+    иначе classifier.npz (NumPy, без TensorFlow), иначе classifier.h5
+    """
+    from config import Config
+
+    npz_path = os.path.join(model_dir, 'classifier.npz')
+    hierarchical_path = os.path.join(model_dir, 'hierarchical.npz')
+    if os.path.exists(hierarchical_path) and (Config.HIERARCHICAL_CLASSIFIER or not os.path.exists(npz_path)):
+        from models.hierarchical_model import HierarchicalClassifier
+        return HierarchicalClassifier.load(hierarchical_path, beam=Config.HIERARCHICAL_BEAM)
+    if os.path.exists(npz_path):
+        from models.numpy_engine import NumpyClassifier
+        return NumpyClassifier.load(npz_path)
+
+    from models.autoencoder_model import AutoencoderDL
+    model = AutoencoderDL(input_dim=input_dim, bottleneck_dim=bottleneck_dim, num_classes=num_classes)
+    model.load_classifier(os.path.join(model_dir, 'classifier.h5'))
+    return model
+
+def create_version_dir(model_dir):
+    """Создать директорию для новой версии. Сервер её не видит до publish_version."""
+    version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(model_dir, VERSIONS_DIR, version)
+    os.makedirs(path)
+    return version, path
+
+def publish_version(model_dir, version, keep=3):
+    """Атомарно переключить current на новую версию и удалить старые (кроме keep последних)"""
+    tmp_path = os.path.join(model_dir, CURRENT_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILE))
+    print(f"✅ Опубликована версия модели {version}")
+
+    cleanup_old_versions(model_dir, keep)
+
+def cleanup_old_versions(model_dir, keep=3):
+    """Удалить старые версии; активная и keep последних остаются"""
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return
+
+    current = get_current_version(model_dir)
+    # Имена версий - метки времени, сортировка по имени = по времени
+    versions = sorted(os.listdir(versions_dir))
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
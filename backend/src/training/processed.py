@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pickle
 import os
@@ -5,7 +6,14 @@ import re
 from config import Config
 from sklearn.feature_extraction.text import TfidfVectorizer
 
-def preprocess_data(csv_file, min_samples_per_category=20, max_features=2000):
+def preprocess_data(csv_file, min_samples_per_category=20, max_features=2000, sparse=False):
+    """
+    Загрузить датасет, отфильтровать редкие категории и построить TF-IDF признаки
+
+    Args:
+        sparse: вернуть X как CSR-матрицу float32 вместо плотной (экономит память:
+            у названий товаров меньше 20 ненулевых признаков из тысяч)
+    """
     df = pd.read_csv(csv_file)
 
     if 'product_name' not in df.columns or 'category_path' not in df.columns:
@@ -26,8 +34,10 @@ def preprocess_data(csv_file, min_samples_per_category=20, max_features=2000):
     
     print(f"✅ После фильтрации: {len(df)} товаров в {len(valid_categories)} категориях")
 
-    vectorizer = TfidfVectorizer(max_features=max_features, lowercase=False)  # lowercase уже применен
-    X = vectorizer.fit_transform(df['product_name']).toarray()
+    vectorizer = TfidfVectorizer(max_features=max_features, lowercase=False, dtype=np.float32)  # lowercase уже применен
+    X = vectorizer.fit_transform(df['product_name'])
+    if not sparse:
+        X = X.toarray()
 
     unique_categories = sorted(df['category_path'].unique())
     to_id = {cat: i for i, cat in enumerate(unique_categories)}
@@ -41,12 +51,20 @@ def preprocess_data(csv_file, min_samples_per_category=20, max_features=2000):
 def save_preprocessing_objects(vectorizer, to_id, to_label, output_dir=Config.MODELS_BIN):
     os.makedirs(output_dir, exist_ok=True)
 
+    if hasattr(vectorizer, 'to_sklearn'):
+        # MmapTfidfVectorizer (training/flat_artifacts.py) ссылается на файлы версии - в pickle идёт обычный
+        vectorizer = vectorizer.to_sklearn()
+
     with open(os.path.join(output_dir, 'tokenizer.pkl'), 'wb') as f:
         pickle.dump(vectorizer, f)
 
     with open(os.path.join(output_dir, 'label2idx.pkl'), 'wb') as f:
         pickle.dump(to_id, f)
 
+    # Компактная копия для сервера (training/flat_artifacts.py), pickle остаётся для совместимости
+    from training.flat_artifacts import save_flat_artifacts
+    save_flat_artifacts(vectorizer, to_label, output_dir)
+
     with open(os.path.join(output_dir, 'idx2label.pkl'), 'wb') as f:
         pickle.dump(to_label, f)
 
@@ -60,7 +78,7 @@ def load_preprocessing_objects(output_dir=Config.MODELS_BIN):
     found_path = None
     for path in possible_paths:
         tokenizer_path = os.path.join(path, 'tokenizer.pkl')
-        if os.path.exists(tokenizer_path):
+        if os.path.exists(tokenizer_path) or os.path.exists(os.path.join(path, 'vectorizer.json')):
             found_path = path
             break
     
@@ -73,6 +91,10 @@ def load_preprocessing_objects(output_dir=Config.MODELS_BIN):
             f"Ожидаемые файлы: tokenizer.pkl, label2idx.pkl, idx2label.pkl"
         )
     
+    from training.flat_artifacts import has_flat_artifacts, load_flat_artifacts
+    if has_flat_artifacts(found_path):
+        return load_flat_artifacts(found_path)
+
     with open(os.path.join(found_path, 'tokenizer.pkl'), 'rb') as f:
         vectorizer = pickle.load(f)
 
@@ -0,0 +1,106 @@
+"""
+Отчёт о потере точности квантованного инференса (INFERENCE_QUANTIZATION)
+
+Для каждого маркетплейса сравнивает float16 и int8 с float32 на выборке
+из обучающего CSV: память весов, top-1 accuracy, совпадение top-1 с float32
+и максимальное расхождение вероятностей. Отчёт сохраняется рядом с моделью
+(quantization_report.json в директории активной версии).
+
+Запуск: python -m training.quantization_report [marketplace ...]
+"""
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from config import Config
+from training.processed import load_preprocessing_objects
+from training.model_store import get_version_dir
+from models.numpy_engine import NumpyClassifier
+
+REPORT_FILE = 'quantization_report.json'
+MODES = ('float16', 'int8')
+
+
+def load_eval_sample(marketplace, to_id, n_samples=20000, seed=0):
+    """Названия и метки из обучающего CSV маркетплейса (только известные модели категории)"""
+    from training.train_marketplace_models import MARKETPLACE_CONFIG
+
+    project_root = Path(__file__).parent.parent.parent
+    df = pd.read_csv(project_root / MARKETPLACE_CONFIG[marketplace]['csv_file'],
+                     usecols=['product_name', 'category_path'])
+    df = df[df['product_name'].notna() & df['category_path'].isin(to_id)]
+    df = df.drop_duplicates(subset=['product_name'])
+    if len(df) > n_samples:
+        df = df.sample(n_samples, random_state=seed)
+
+    names = df['product_name'].astype(str).str.lower().str.strip().str.replace(r'\s+', ' ', regex=True)
+    return names.tolist(), df['category_path'].map(to_id).values
+
+def _timed_predict(model, X, batch_size):
+    start = time.perf_counter()
+    labels, probs = model.predict_class(X, batch_size=batch_size)
+    return labels, probs, time.perf_counter() - start
+
+def evaluate_marketplace(marketplace, n_samples=20000):
+    _, model_dir = get_version_dir(os.path.join(Config.MODELS_BIN, marketplace))
+    npz_path = os.path.join(model_dir, 'classifier.npz')
+    if not os.path.exists(npz_path):
+        raise FileNotFoundError(f"{npz_path} не найден. Выгрузите веса: python -m training.export_numpy_weights")
+
+    vectorizer, to_id, _ = load_preprocessing_objects(model_dir)
+    names, y = load_eval_sample(marketplace, to_id, n_samples)
+    X = vectorizer.transform(names)
+    batch_size = Config.PREDICT_BATCH_SIZE
+
+    base = NumpyClassifier.load(npz_path)
+    base_labels, base_probs, base_time = _timed_predict(base, X, batch_size)
+    base_accuracy = float((base_labels == y).mean())
+
+    report = {
+        'marketplace': marketplace,
+        'samples': len(names),
+        'float32': {
+            'weights_mb': round(base.nbytes / 2**20, 2),
+            'accuracy': round(base_accuracy, 4),
+            'predict_seconds': round(base_time, 3)
+        }
+    }
+
+    for mode in MODES:
+        model = NumpyClassifier.load(npz_path, quantization=mode)
+        labels, probs, elapsed = _timed_predict(model, X, batch_size)
+        accuracy = float((labels == y).mean())
+        report[mode] = {
+            'weights_mb': round(model.nbytes / 2**20, 2),
+            'memory_ratio': round(model.nbytes / base.nbytes, 3),
+            'accuracy': round(accuracy, 4),
+            'accuracy_delta': round(accuracy - base_accuracy, 4),
+            'top1_agreement': round(float((labels == base_labels).mean()), 4),
+            'max_prob_diff': float(np.abs(probs - base_probs).max()),
+            'predict_seconds': round(elapsed, 3)
+        }
+
+    with open(os.path.join(model_dir, REPORT_FILE), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return report
+
+def print_report(report):
+    print(f"\n📊 {report['marketplace']} ({report['samples']} товаров)")
+    print(f"   {'режим':<8} {'MB':>7} {'accuracy':>9} {'Δ acc':>8} {'top-1 =':>8} {'max |Δp|':>9} {'сек':>6}")
+    for mode in ('float32',) + MODES:
+        r = report[mode]
+        print(f"   {mode:<8} {r['weights_mb']:>7.2f} {r['accuracy'] * 100:>8.2f}% "
+              f"{r.get('accuracy_delta', 0) * 100:>+7.2f}% "
+              f"{r.get('top1_agreement', 1) * 100:>7.2f}% "
+              f"{r.get('max_prob_diff', 0):>9.2e} {r['predict_seconds']:>6.2f}")
+
+
+if __name__ == '__main__':
+    import sys
+
+    marketplaces = sys.argv[1:] or Config.MARKETPLACES
+    for marketplace in marketplaces:
+        print_report(evaluate_marketplace(marketplace))
@@ -1,19 +1,29 @@
 """
 Простое переобучение модели с учетом исправлений пользователей
+
+С INCREMENTAL_RETRAIN сначала пробуется дообучение активной версии (training/fine_tune.py),
+полное переобучение - только если дообучение невозможно.
 """
 import pandas as pd
 import json
 import os
 from pathlib import Path
 from config import Config
-from training.processed import preprocess_data, save_preprocessing_objects
+from training.processed import save_preprocessing_objects
+from training.feature_cache import preprocess_data_cached
+from training.model_store import resolve_model_dir, create_version_dir, publish_version
 from models.autoencoder_model import AutoencoderDL
 from keras.utils import to_categorical
 
 FEEDBACK_FILE = "src/data/feedback_corrections.json"
 
-def load_corrections(marketplace: str):
-    """Загрузить исправления для маркетплейса"""
+def load_corrections(marketplace: str, include_fine_tuned=False):
+    """
+    Загрузить исправления для маркетплейса
+
+    Args:
+        include_fine_tuned: добавить исправления, учтённые только дообучением (training/fine_tune.py)
+    """
     file_path = Path(FEEDBACK_FILE)
     if not file_path.exists():
         return []
@@ -24,7 +34,8 @@ def load_corrections(marketplace: str):
     # Фильтруем по маркетплейсу и неиспользованным
     corrections = [
         c for c in all_corrections 
-        if c.get('marketplace') == marketplace and not c.get('used_for_training', False)
+        if str(c.get('marketplace', '')).strip().lower() == marketplace
+        and (not c.get('used_for_training', False) or (include_fine_tuned and c.get('fine_tuned', False)))
     ]
     
     return corrections
@@ -55,8 +66,15 @@ def add_corrections_to_dataset(corrections, marketplace: str):
     
     return pd.DataFrame(data)
 
-def mark_corrections_as_used(marketplace: str):
-    """Пометить исправления как использованные"""
+def mark_corrections_as_used(marketplace: str, ids, fine_tuned=False):
+    """
+    Пометить исправления как использованные
+
+    Args:
+        ids: id исправлений, которые попали в обучение (пришедшие во время обучения не помечаются)
+        fine_tuned: исправления учтены дообучением - следующее полное переобучение добавит их в датасет
+    """
+    ids = set(ids)
     file_path = Path(FEEDBACK_FILE)
     if not file_path.exists():
         return
@@ -66,7 +84,11 @@ def mark_corrections_as_used(marketplace: str):
     
     # Пометить как использованные
     for corr in corrections:
-        if corr.get('marketplace') == marketplace:
+        if str(corr.get('marketplace', '')).strip().lower() == marketplace and corr.get('id') in ids:
+            if not fine_tuned:
+                corr.pop('fine_tuned', None)
+            elif not corr.get('used_for_training', False):
+                corr['fine_tuned'] = True
             corr['used_for_training'] = True
     
     with open(file_path, 'w', encoding='utf-8') as f:
@@ -99,6 +121,17 @@ def retrain_with_corrections(marketplace: str):
     
     if not dataset_path.exists():
         raise FileNotFoundError(f"Датасет не найден: {dataset_path}")
+
+    if Config.INCREMENTAL_RETRAIN:
+        # Дообучение активной версии за секунды; None - нужна полная перетренировка
+        from training.fine_tune import fine_tune_with_corrections
+        result = fine_tune_with_corrections(marketplace, corrections, dataset_path)
+        if result is not None:
+            mark_corrections_as_used(marketplace, [c['id'] for c in corrections], fine_tuned=True)
+            return result
+
+    # Исправления, до сих пор учтённые только дообучением, тоже идут в датасет
+    corrections = load_corrections(marketplace, include_fine_tuned=True)
     
     existing_df = pd.read_csv(dataset_path)
     print(f"\n📊 Существующий датасет: {len(existing_df)} товаров")
@@ -133,13 +166,13 @@ def retrain_with_corrections(marketplace: str):
     config = MARKETPLACE_CONFIG[marketplace]
     
     print(f"\n📊 Предобработка данных...")
-    print(f"   Используем category_name (дочерняя категория)")
+    print(f"   Используем category_path (как при обучении и в API)")
     
-    X, y, vectorizer, to_id, to_label = preprocess_data(
+    X, y, vectorizer, to_id, to_label = preprocess_data_cached(
         csv_file=str(temp_dataset),
         min_samples_per_category=config['min_samples'],
-        category_column='category_name',
-        max_features=config['max_features']
+        max_features=config['max_features'],
+        sparse=Config.SPARSE_INPUT
     )
     
     print(f"✅ После предобработки:")
@@ -147,38 +180,65 @@ def retrain_with_corrections(marketplace: str):
     print(f"   Количество категорий: {len(to_id)}")
     
     # 6. Обучение
-    y_cat = to_categorical(y)
-    num_classes = y_cat.shape[1]
+    num_classes = len(to_id)
+    y_cat = y if Config.SPARSE_INPUT else to_categorical(y, num_classes)
     
-    model_dir = os.path.join(Config.MODELS_BIN, marketplace)
+    # Новая версия пишется в отдельную директорию: сервер не увидит
+    # новый vectorizer вместе со старой моделью
+    model_dir = resolve_model_dir(os.path.join(Config.MODELS_BIN, marketplace))
     os.makedirs(model_dir, exist_ok=True)
+    version, version_dir = create_version_dir(model_dir)
     
-    save_preprocessing_objects(vectorizer, to_id, to_label, output_dir=model_dir)
-    
-    model = AutoencoderDL(
-        input_dim=X.shape[1],
-        bottleneck_dim=config['bottleneck_dim'],
-        num_classes=num_classes
-    )
+    save_preprocessing_objects(vectorizer, to_id, to_label, output_dir=version_dir)
     
     epochs = 50 if X.shape[0] < 30000 else 30
-    
-    print(f"\n🏋️ Обучение модели...")
-    history = model.train_classifier(
-        X, y_cat,
-        epochs=epochs,
-        batch_size=32,
-        validation_split=0.2,
-        use_early_stopping=True
-    )
-    
-    # 7. Сохранить модель
-    classifier_path = os.path.join(model_dir, 'classifier.h5')
-    model.save(classifier_path)
+
+    if Config.HIERARCHICAL_CLASSIFIER:
+        # Классификатор родителей и головы по листьям -> hierarchical.npz
+        from training.train_hierarchical import train_hierarchical_model
+        from models.hierarchical_model import HIERARCHICAL_FILE
+        model, history = train_hierarchical_model(
+            X, y, to_label, config['bottleneck_dim'], version_dir, epochs=epochs
+        )
+        classifier_path = os.path.join(version_dir, HIERARCHICAL_FILE)
+    else:
+        model = AutoencoderDL(
+            input_dim=X.shape[1],
+            bottleneck_dim=config['bottleneck_dim'],
+            num_classes=num_classes
+        )
+
+        print(f"\n🏋️ Обучение модели...")
+        history = model.train_classifier(
+            X, y_cat,
+            epochs=epochs,
+            batch_size=32,
+            validation_split=0.2,
+            use_early_stopping=True
+        )
+
+        # 7. Сохранить модель
+        classifier_path = os.path.join(version_dir, 'classifier.h5')
+        model.save(classifier_path)
+
+        # Веса для NumPy-инференса (INFERENCE_ENGINE=numpy), проверенные на совпадение с Keras
+        from training.export_numpy_weights import export_checked
+        export_checked(classifier_path, os.path.join(version_dir, 'classifier.npz'), vectorizer)
+
+    # Линейная первая ступень каскада (CASCADE_ENABLED) и отчёт cascade_report.json
+    from training.train_linear import train_linear_stage
+    train_linear_stage(X, y, num_classes, model, version_dir)
+
+    # Индекс похожих товаров по bottleneck-векторам (/api/similar_products)
+    from training.build_embedding_index import build_embedding_index
+    build_embedding_index(model, vectorizer, to_id, temp_dataset, version_dir)
+
+    # Атомарное переключение на новую версию (сервер подхватит её в фоне)
+    publish_version(model_dir, version, keep=Config.MODEL_VERSIONS_KEEP)
     
     # 8. Пометить исправления как использованные
     if corrections:
-        mark_corrections_as_used(marketplace)
+        mark_corrections_as_used(marketplace, [c['id'] for c in corrections])
         print(f"\n✅ Исправления помечены как использованные")
     
     print(f"\n✅ МОДЕЛЬ ПЕРЕОБУЧЕНА!")
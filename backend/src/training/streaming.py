@@ -0,0 +1,238 @@
+"""
+Потоковое обучение из CSV для датасетов больше памяти (STREAMING_TRAINING)
+
+preprocess_data держит весь CSV в pandas и всю матрицу признаков; здесь CSV читается
+кусками по Config.STREAM_TRAIN_CHUNK_ROWS строк:
+
+1. Проход 1: нормализация названий, дубликаты (по 64-битному хэшу названия, остаётся
+   первое вхождение), число товаров в категориях -> категории с min_samples и метка каждой строки
+2. Проход 2: частоты слов по оставшимся строкам -> словарь из max_features самых частых
+   слов и idf, как у TfidfVectorizer.fit (тот же токенизатор)
+3. Каждая эпоха - новый проход: куски превращаются в CSR и копятся в буфере
+   Config.STREAM_SHUFFLE_BUFFER строк, буфер перемешивается и отдаётся мини-батчами
+
+Валидация - товары, у которых хэш названия попадает в долю validation_split:
+разбиение детерминированное и не зависит от порядка строк в файле.
+
+Память не постоянная, а O(строк файла): метка каждой строки файла (int32, 4 байта на строку)
+держится всё обучение, а на время прохода 1 - ещё отсортированные хэши уникальных названий
+(8 байт на название, при слиянии с куском - вдвое больше). Замер (tracemalloc, куски по 50 тыс.
+строк, 40% уникальных названий): пик прохода 1 растёт на ~27 байт на каждую строку файла,
+1 млн строк - 50 MB, 2 млн - 76 MB. Кроме того: буфер перемешивания
+(CSR, ~100 байт на строку буфера), словарь и модель.
+Буфер перемешивает только соседние строки: если CSV отсортирован по категориям,
+буфер должен вмещать несколько категорий (или файл стоит один раз перемешать).
+"""
+import math
+import numpy as np
+import pandas as pd
+from collections import Counter
+from config import Config
+
+# Сколько слов держать в счётчике прохода 2, прежде чем выбросить самые редкие
+TOKEN_COUNTER_LIMIT = 2_000_000
+HASH_BUCKETS = 10000
+
+
+def name_hashes(names):
+    """Стабильный между запусками 64-битный хэш названий"""
+    return pd.util.hash_pandas_object(names, index=False).values
+
+
+def _add_counts(counts, codes, size):
+    """counts + число вхождений каждого кода (массив растёт вместе с числом категорий)"""
+    counts = np.pad(counts, (0, size - len(counts)))
+    return counts + np.bincount(codes, minlength=size)
+
+
+class StreamingDataset:
+    """Разметка и словарь, собранные проходами по CSV, и генераторы мини-батчей"""
+
+    def __init__(self, csv_file, min_samples_per_category=20, max_features=2000, validation_split=0.2,
+                 chunk_rows=None, shuffle_buffer=None):
+        self.csv_file = str(csv_file)
+        self.min_samples_per_category = min_samples_per_category
+        self.max_features = max_features
+        self.validation_split = validation_split
+        self.chunk_rows = chunk_rows or Config.STREAM_TRAIN_CHUNK_ROWS
+        self.shuffle_buffer = shuffle_buffer or Config.STREAM_SHUFFLE_BUFFER
+        self.row_labels = None
+        self.vectorizer = None
+        self.to_id = None
+        self.to_label = None
+        self.n_train = 0
+        self.n_val = 0
+
+    @property
+    def num_classes(self):
+        return len(self.to_id)
+
+    def _raw_chunks(self):
+        """Куски CSV как есть; индекс строк - номер строки в файле"""
+        return pd.read_csv(self.csv_file, usecols=['product_name', 'category_path'], chunksize=self.chunk_rows)
+
+    def _chunks(self):
+        """Очищенные куски CSV (индекс строк сохраняется)"""
+        from api.inference import clean_product_names
+
+        for chunk in self._raw_chunks():
+            chunk = clean_product_names(chunk)
+            yield chunk[chunk['category_path'].notna()]
+
+    def _is_validation(self, names):
+        return (name_hashes(names) % HASH_BUCKETS) < int(self.validation_split * HASH_BUCKETS)
+
+    def scan(self):
+        """Проходы 1 и 2: метки строк, категории, словарь и idf"""
+        self._scan_labels()
+        self._fit_vectorizer()
+        print(f"✅ Потоковая предобработка: {self.n_train + self.n_val} товаров в {self.num_classes} категориях "
+              f"(обучение {self.n_train}, валидация {self.n_val}), словарь {len(self.vectorizer.vocabulary_)}")
+        return self
+
+    def _scan_labels(self):
+        from api.inference import clean_product_names
+
+        seen = np.zeros(0, dtype=np.uint64)  # отсортированные хэши уже встреченных названий
+        codes = []
+        categories = {}
+        counts, val_counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        for raw in self._raw_chunks():
+            # Как в preprocess_data: дубликаты убираются по исходному названию, до нормализации,
+            # остаётся первое вхождение в файле
+            hashes, first = np.unique(name_hashes(raw['product_name']), return_index=True)
+            positions = np.minimum(np.searchsorted(seen, hashes), max(len(seen) - 1, 0))
+            new = seen[positions] != hashes if len(seen) else np.ones(len(hashes), dtype=bool)
+            # Слияние двух отсортированных массивов: stable-сортировка (timsort) линейна
+            seen = np.sort(np.concatenate([seen, hashes[new]]), kind='stable')
+            is_first = np.zeros(len(raw), dtype=bool)
+            is_first[first[new]] = True
+
+            chunk = clean_product_names(raw)
+            chunk = chunk[chunk['category_path'].notna()]
+            positions = raw.index.get_indexer(chunk.index)
+            chunk = chunk[is_first[positions]]
+            positions = positions[is_first[positions]]
+
+            chunk_codes = np.full(len(raw), -1, dtype=np.int32)
+            chunk_codes[positions] = [categories.setdefault(c, len(categories)) for c in chunk['category_path']]
+            codes.append(chunk_codes)
+
+            kept_codes = chunk_codes[positions]
+            counts = _add_counts(counts, kept_codes, len(categories))
+            val_counts = _add_counts(val_counts, kept_codes[self._is_validation(chunk['product_name'])],
+                                     len(categories))
+        del seen
+
+        names_by_code = {code: category for category, code in categories.items()}
+        valid = sorted(names_by_code[c] for c in np.flatnonzero(counts >= self.min_samples_per_category))
+        self.to_id = {category: i for i, category in enumerate(valid)}
+        self.to_label = {i: category for category, i in self.to_id.items()}
+
+        code_to_label = np.full(len(categories) + 1, -1, dtype=np.int32)  # последний элемент - для кода -1
+        for category, i in self.to_id.items():
+            code_to_label[categories[category]] = i
+
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int32)
+        self.row_labels = code_to_label[codes]
+        del codes
+
+        kept = code_to_label[:-1] >= 0
+        self.n_val = int(val_counts[kept].sum())
+        self.n_train = int(counts[kept].sum()) - self.n_val
+
+    def _labeled_rows(self, chunk):
+        """Строки куска, попавшие в выборку, и их метки"""
+        labels = self.row_labels[chunk.index.values]
+        keep = labels >= 0
+        return chunk[keep], labels[keep]
+
+    def _fit_vectorizer(self):
+        from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+        params = dict(lowercase=False, dtype=np.float32)  # как в preprocess_data: lowercase уже применен
+        term_counts, doc_counts = Counter(), Counter()
+        n_docs = 0
+        for chunk in self._chunks():
+            chunk, _ = self._labeled_rows(chunk)
+            if chunk.empty:
+                continue
+            counter = CountVectorizer(**params)
+            X = counter.fit_transform(chunk['product_name'])
+            tf = np.asarray(X.sum(axis=0)).ravel()
+            df = np.bincount(X.indices, minlength=X.shape[1])
+            for token, i in counter.vocabulary_.items():
+                term_counts[token] += int(tf[i])
+                doc_counts[token] += int(df[i])
+            n_docs += X.shape[0]
+
+            if len(term_counts) > TOKEN_COUNTER_LIMIT:
+                # Самые редкие слова всё равно не попадут в max_features
+                threshold = sorted(term_counts.values())[len(term_counts) // 2]
+                for token in [t for t, c in term_counts.items() if c <= threshold]:
+                    del term_counts[token], doc_counts[token]
+
+        # Как TfidfVectorizer(max_features): тот же отбор самых частых слов по алфавитному
+        # списку (совпадает и выбор среди равных по частоте), индексы - в алфавитном порядке
+        tokens = sorted(term_counts)
+        if len(tokens) > self.max_features:
+            tf = np.array([term_counts[t] for t in tokens], dtype=np.int64)
+            tokens = sorted(tokens[i] for i in (-tf).argsort()[:self.max_features])
+        vocabulary = {token: i for i, token in enumerate(tokens)}
+        df = np.array([doc_counts[token] for token in tokens], dtype=np.float64)
+
+        self.vectorizer = TfidfVectorizer(vocabulary=vocabulary, **params)
+        self.vectorizer.idf_ = np.log((1 + n_docs) / (1 + df)) + 1  # smooth_idf=True
+
+    def steps(self, subset, batch_size):
+        return math.ceil((self.n_train if subset == 'train' else self.n_val) / batch_size)
+
+    def batches(self, subset, batch_size, shuffle=True, seed=0):
+        """
+        Бесконечный генератор (X, y_onehot) плотных мини-батчей; одна эпоха - ровно steps() батчей
+
+        Args:
+            subset: 'train' или 'val'
+        """
+        epoch = 0
+        while True:
+            rng = np.random.default_rng(seed + epoch)
+            buffer_X, buffer_y, buffered = [], [], 0
+            carry = None
+            for chunk in self._chunks():
+                chunk, labels = self._labeled_rows(chunk)
+                in_subset = self._is_validation(chunk['product_name']) == (subset == 'val')
+                chunk, labels = chunk[in_subset], labels[in_subset]
+                if chunk.empty:
+                    continue
+                buffer_X.append(self.vectorizer.transform(chunk['product_name']))
+                buffer_y.append(labels)
+                buffered += len(labels)
+                if buffered >= self.shuffle_buffer:
+                    carry = yield from self._drain(buffer_X, buffer_y, carry, batch_size, shuffle, rng, final=False)
+                    buffer_X, buffer_y, buffered = [], [], 0
+            yield from self._drain(buffer_X, buffer_y, carry, batch_size, shuffle, rng, final=True)
+            epoch += 1
+
+    def _drain(self, buffer_X, buffer_y, carry, batch_size, shuffle, rng, final):
+        """Отдать буфер батчами; неполный хвост возвращается и попадёт в следующий буфер"""
+        from scipy.sparse import vstack
+
+        if carry is not None:
+            buffer_X.insert(0, carry[0])
+            buffer_y.insert(0, carry[1])
+        if not buffer_X:
+            return None
+        X = vstack(buffer_X).tocsr()
+        y = np.concatenate(buffer_y)
+        order = rng.permutation(len(y)) if shuffle else np.arange(len(y))
+
+        end = len(y) if final else len(y) - len(y) % batch_size
+        for start in range(0, end, batch_size):
+            batch = order[start:start + batch_size]
+            y_onehot = np.zeros((len(batch), self.num_classes), dtype=np.float32)
+            y_onehot[np.arange(len(batch)), y[batch]] = 1
+            yield X[batch].toarray().astype(np.float32), y_onehot
+
+        rest = order[end:]
+        return (X[rest], y[rest]) if len(rest) else None
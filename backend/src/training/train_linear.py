@@ -0,0 +1,225 @@
+"""
+Линейная первая ступень каскада (CASCADE_ENABLED, models/linear_model.py)
+
+Обучает multinomial логистическую регрессию на тех же TF-IDF признаках, что и
+глубокая модель. Валидационная часть (последние 20% строк - те же, что validation_split
+при обучении глубокой модели) делится пополам: на первой половине подбирается порог
+уверенности, на второй считается отчёт, чтобы точность каскада не была оценена
+на тех же товарах, под которые подогнан порог.
+Порог - самый низкий, при котором точность каскада не хуже глубокой модели больше
+чем на tolerance, но не ниже Config.CASCADE_MIN_THRESHOLD. Если при таком пороге
+линейная модель не отвечает ни на один товар, linear.npz не сохраняется и сервер
+работает только с глубокой моделью. Отчёт (доля товаров, на которые ответила
+линейная модель, точность каскада и только глубокой модели, время) сохраняется
+рядом с моделью: cascade_report.json в директории версии.
+
+train_marketplace_models.py вызывает train_linear_stage после обучения глубокой модели.
+Запуск для уже обученных версий: python -m training.train_linear [marketplace ...]
+"""
+import os
+import json
+import time
+import numpy as np
+from config import Config
+from models.linear_model import LinearClassifier, nonempty_rows
+
+LINEAR_FILE = 'linear.npz'
+REPORT_FILE = 'cascade_report.json'
+# Допустимая потеря точности каскада относительно глубокой модели на валидации
+CASCADE_TOLERANCE = 0.005
+
+
+def tune_threshold(linear_probs, deep_labels, y, tolerance=CASCADE_TOLERANCE, eligible=None):
+    """
+    Самый низкий порог уверенности линейной модели, при котором каскад теряет
+    не больше tolerance точности относительно глубокой модели
+
+    Товары сортируются по уверенности линейной модели. Если линейная модель отвечает
+    на первые n, каскад теряет (верные ответы глубокой - верные ответы линейной) среди
+    них; берётся наибольшее n, при котором потеря не больше tolerance * n.
+
+    Args:
+        eligible: маска строк, на которые линейная модель может ответить (непустые строки)
+    """
+    if eligible is not None:
+        linear_probs, deep_labels, y = linear_probs[eligible], deep_labels[eligible], y[eligible]
+    confidence = linear_probs.max(axis=1)
+    order = np.argsort(-confidence, kind='stable')
+    linear_correct = np.cumsum(linear_probs.argmax(axis=1)[order] == y[order])
+    deep_correct = np.cumsum(deep_labels[order] == y[order])
+    n = np.arange(1, len(y) + 1)
+
+    allowed = np.flatnonzero(linear_correct >= deep_correct - tolerance * n)
+    if len(allowed) == 0:
+        return np.inf  # линейная модель не отвечает никогда
+    return float(confidence[order[allowed[-1]]])
+
+def _timed(predict, X):
+    start = time.perf_counter()
+    result = predict(X)
+    return result, time.perf_counter() - start
+
+def cascade_report(linear, deep_model, X_val, y_val):
+    """Сравнение каскада с одной глубокой моделью на валидационной части"""
+    batch_size = Config.PREDICT_BATCH_SIZE
+    (deep_labels, _), deep_seconds = _timed(lambda X: deep_model.predict_class(X, batch_size=batch_size), X_val)
+
+    def predict_cascade(X):
+        probs = linear.predict_proba(X)
+        labels = probs.argmax(axis=1)
+        uncertain = np.flatnonzero(~linear.routed(X, probs))
+        if len(uncertain):
+            labels[uncertain] = deep_model.predict_class(X[uncertain], batch_size=batch_size)[0]
+        return labels, len(uncertain)
+
+    (cascade_labels, deep_routed), cascade_seconds = _timed(predict_cascade, X_val)
+    routed = len(y_val) - deep_routed
+    linear_probs = linear.predict_proba(X_val)
+    linear_labels = linear_probs.argmax(axis=1)
+    confident = linear.routed(X_val, linear_probs)
+
+    return {
+        'samples': int(len(y_val)),
+        'threshold': linear.threshold,
+        'linear_fraction': round(routed / len(y_val), 4) if len(y_val) else 0,
+        'linear_accuracy_on_routed': round(float((linear_labels[confident] == y_val[confident]).mean()), 4) if routed else None,
+        'linear_only_accuracy': round(float((linear_labels == y_val).mean()), 4),
+        'deep_only_accuracy': round(float((deep_labels == y_val).mean()), 4),
+        'cascade_accuracy': round(float((cascade_labels == y_val).mean()), 4),
+        'deep_only_seconds': round(deep_seconds, 3),
+        'cascade_seconds': round(cascade_seconds, 3),
+        'linear_weights_mb': round(linear.nbytes / 2**20, 2)
+    }
+
+def train_linear_stage(X, y, num_classes, deep_model, output_dir, validation_split=0.2,
+                       tolerance=CASCADE_TOLERANCE):
+    """
+    Обучить линейную модель, подобрать порог и сохранить linear.npz и cascade_report.json
+
+    Args:
+        X, y: признаки (CSR или плотные) и индексы категорий - те же, что у глубокой модели
+        deep_model: обученная глубокая модель (predict_class как у AutoencoderDL)
+        output_dir: директория версии модели
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    # Та же граница, что у validation_split в Keras: валидация - последние строки.
+    # Первая половина валидации - подбор порога, вторая - отчёт
+    split = X.shape[0] - int(X.shape[0] * validation_split)
+    tune_end = split + (X.shape[0] - split) // 2
+    X_train, y_train = X[:split], y[:split]
+    X_tune, y_tune = X[split:tune_end], y[split:tune_end]
+    X_val, y_val = X[tune_end:], y[tune_end:]
+
+    print(f"\n📈 Обучение линейной модели ({X_train.shape[0]:,} товаров)...")
+    clf = LogisticRegression(C=10.0, max_iter=300)
+    clf.fit(X_train, y_train)
+    linear = LinearClassifier.from_sklearn(clf, num_classes)
+
+    linear.threshold = fit_threshold(linear, deep_model, X_tune, y_tune, tolerance)
+    return save_linear_stage(linear, deep_model, X_val, y_val, output_dir, tuning_samples=len(y_tune))
+
+def fit_threshold(linear, deep_model, X_tune, y_tune, tolerance=CASCADE_TOLERANCE):
+    """Порог tune_threshold, поднятый до Config.CASCADE_MIN_THRESHOLD"""
+    deep_labels, _ = deep_model.predict_class(X_tune, batch_size=Config.PREDICT_BATCH_SIZE)
+    threshold = tune_threshold(linear.predict_proba(X_tune), deep_labels, y_tune, tolerance,
+                               eligible=nonempty_rows(X_tune))
+    return max(threshold, Config.CASCADE_MIN_THRESHOLD)
+
+def save_linear_stage(linear, deep_model, X_val, y_val, output_dir, tuning_samples):
+    """
+    Посчитать отчёт на отложенной части и сохранить linear.npz и cascade_report.json
+
+    Если линейная модель не отвечает ни на один товар, linear.npz не сохраняется
+    (и удаляется, если остался в директории) - сервер работает без каскада.
+    """
+    linear_path = os.path.join(output_dir, LINEAR_FILE)
+    answers = linear.routed(X_val, linear.predict_proba(X_val)).any() if np.isfinite(linear.threshold) else False
+    if answers:
+        report = cascade_report(linear, deep_model, X_val, y_val)
+        linear.save(linear_path)
+    else:
+        deep_labels, _ = deep_model.predict_class(X_val, batch_size=Config.PREDICT_BATCH_SIZE)
+        report = {
+            'samples': int(len(y_val)),
+            'threshold': None,
+            'linear_fraction': 0,
+            'deep_only_accuracy': round(float((deep_labels == y_val).mean()), 4)
+        }
+        linear = None
+        if os.path.exists(linear_path):
+            os.remove(linear_path)
+    report['tuning_samples'] = int(tuning_samples)
+
+    with open(os.path.join(output_dir, REPORT_FILE), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print_report(report)
+    return linear, report
+
+def print_report(report):
+    if report['threshold'] is None:
+        print(f"\n📊 Каскад отключён: линейная модель не уверена ни в одном товаре "
+              f"(порог не ниже {Config.CASCADE_MIN_THRESHOLD:.2f}), отвечает только глубокая модель")
+        return
+    print(f"\n📊 Каскад (отчёт: {report['samples']} товаров, порог подобран на {report['tuning_samples']}: "
+          f"{report['threshold']:.3f})")
+    print(f"   Ответила линейная модель: {report['linear_fraction'] * 100:.1f}%")
+    print(f"   Accuracy: каскад {report['cascade_accuracy'] * 100:.2f}% / "
+          f"только глубокая {report['deep_only_accuracy'] * 100:.2f}% / "
+          f"только линейная {report['linear_only_accuracy'] * 100:.2f}%")
+    print(f"   Время: каскад {report['cascade_seconds']:.3f} с / только глубокая {report['deep_only_seconds']:.3f} с")
+
+def train_existing_version(marketplace):
+    """
+    Добавить линейную ступень к активной версии уже обученной модели.
+    Опубликованные версии не меняются: артефакты активной версии копируются в новую,
+    линейная ступень обучается в ней, и новая версия публикуется.
+    """
+    import shutil
+    from pathlib import Path
+    from training.processed import load_preprocessing_objects
+    from training.feature_cache import preprocess_data_cached
+    from training.model_store import (resolve_model_dir, get_version_dir, create_version_dir,
+                                      publish_version, load_version_classifier)
+    from training.train_marketplace_models import MARKETPLACE_CONFIG
+
+    config = MARKETPLACE_CONFIG[marketplace]
+    model_dir = resolve_model_dir(os.path.join(Config.MODELS_BIN, marketplace))
+    base_version, base_dir = get_version_dir(model_dir)
+    vectorizer, to_id, _ = load_preprocessing_objects(base_dir)
+
+    # Признаки пересчитываются так же, как при обучении; словарь должен совпасть с моделью
+    project_root = Path(__file__).parent.parent.parent
+    X, y, new_vectorizer, new_to_id, _ = preprocess_data_cached(
+        csv_file=str(project_root / config['csv_file']),
+        min_samples_per_category=config['min_samples'],
+        max_features=config['max_features'],
+        sparse=True
+    )
+    if new_vectorizer.vocabulary_ != vectorizer.vocabulary_ or new_to_id != to_id:
+        raise ValueError(f"Датасет {marketplace} изменился после обучения модели - переобучите: "
+                         f"python -m training.train_marketplace_models {marketplace}")
+
+    version, version_dir = create_version_dir(model_dir)
+    # В старом плоском формате base_dir - сама директория модели: versions/ и current не копируем
+    for name in os.listdir(base_dir):
+        path = os.path.join(base_dir, name)
+        if os.path.isfile(path) and name not in (LINEAR_FILE, REPORT_FILE, 'current'):
+            shutil.copy2(path, os.path.join(version_dir, name))
+
+    deep_model = load_version_classifier(version_dir, X.shape[1], config['bottleneck_dim'], len(to_id))
+    linear, report = train_linear_stage(X, y, len(to_id), deep_model, version_dir)
+
+    # Сервер переключится на новую версию при следующей проверке версий (MODEL_RELOAD_INTERVAL)
+    publish_version(model_dir, version, keep=Config.MODEL_VERSIONS_KEEP)
+    if linear is not None:
+        print(f"✅ {marketplace}: линейная ступень добавлена к версии {base_version or 'без версии'} -> {version}")
+    return report
+
+
+if __name__ == '__main__':
+    import sys
+
+    for marketplace in sys.argv[1:] or Config.MARKETPLACES:
+        train_existing_version(marketplace)
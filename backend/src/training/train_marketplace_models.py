@@ -5,9 +5,11 @@ import numpy as np
 from keras.utils import to_categorical
 import os
 from pathlib import Path
-from ..config import Config
-from .processed import preprocess_data, save_preprocessing_objects
-from ..models.autoencoder_model import AutoencoderDL
+from config import Config
+from training.processed import save_preprocessing_objects
+from training.feature_cache import preprocess_data_cached
+from training.model_store import resolve_model_dir, create_version_dir, publish_version
+from models.autoencoder_model import AutoencoderDL
 
 # Рекомендуемые параметры для каждого маркетплейса (из анализа)
 MARKETPLACE_CONFIG = {
@@ -64,10 +66,13 @@ def train_marketplace_model(marketplace_name: str, output_base_dir: str = None):
     if output_base_dir is None:
         output_base_dir = Config.MODELS_BIN
     
-    model_dir = os.path.join(output_base_dir, marketplace_name)
+    model_dir = resolve_model_dir(os.path.join(output_base_dir, marketplace_name))
     os.makedirs(model_dir, exist_ok=True)
     
-    print(f"\n📁 Директория модели: {model_dir}")
+    # Артефакты пишутся в новую версию, сервер переключится на неё после publish_version
+    version, version_dir = create_version_dir(model_dir)
+    
+    print(f"\n📁 Директория модели: {model_dir} (версия {version})")
     print(f"📄 CSV файл: {CSV_PATH}")
     
     # 3. Предобработка данных
@@ -75,11 +80,15 @@ def train_marketplace_model(marketplace_name: str, output_base_dir: str = None):
     print(f"   min_samples_per_category: {config['min_samples']}")
     print(f"   category_column: {config['category_column']}")
     print(f"   max_features: {config['max_features']}")
+
+    if Config.STREAMING_TRAINING:
+        return train_streaming(marketplace_name, config, CSV_PATH, model_dir, version, version_dir)
     
-    X, y, vectorizer, to_id, to_label = preprocess_data(
+    X, y, vectorizer, to_id, to_label = preprocess_data_cached(
         csv_file=str(CSV_PATH),
         min_samples_per_category=config['min_samples'],
-        max_features=config['max_features']
+        max_features=config['max_features'],
+        sparse=Config.SPARSE_INPUT
     )
     
     print(f"✅ После предобработки:")
@@ -87,37 +96,62 @@ def train_marketplace_model(marketplace_name: str, output_base_dir: str = None):
     print(f"   Количество классов: {len(to_id)}")
     
     # 4. Преобразование меток в категориальный формат
-    y_cat = to_categorical(y)
-    num_classes = y_cat.shape[1]
+    # (в sparse-режиме one-hot строится по батчам, чтобы не держать матрицу rows x classes)
+    num_classes = len(to_id)
+    y_cat = y if Config.SPARSE_INPUT else to_categorical(y, num_classes)
     
     # 5. Сохранение preprocessing объектов
     print(f"\n💾 Сохранение preprocessing объектов...")
-    save_preprocessing_objects(vectorizer, to_id, to_label, output_dir=model_dir)
-    
-    # 6. Создание и обучение модели
-    print(f"\n🧠 Создание модели...")
-    model = AutoencoderDL(
-        input_dim=X.shape[1],
-        bottleneck_dim=config['bottleneck_dim'],
-        num_classes=num_classes
-    )
+    save_preprocessing_objects(vectorizer, to_id, to_label, output_dir=version_dir)
     
     # Определяем количество эпох в зависимости от размера датасета
     epochs = 50 if X.shape[0] < 30000 else 30
-    
-    print(f"\n🏋️ Обучение модели...")
-    history = model.train_classifier(
-        X, y_cat,
-        epochs=epochs,
-        batch_size=32,
-        validation_split=0.2,
-        use_early_stopping=True
-    )
-    
-    # 7. Сохранение модели
-    print(f"\n💾 Сохранение модели...")
-    classifier_path = os.path.join(model_dir, 'classifier.h5')
-    model.save(classifier_path)
+
+    if Config.HIERARCHICAL_CLASSIFIER:
+        # 6-7. Классификатор родителей и головы по листьям -> hierarchical.npz
+        from training.train_hierarchical import train_hierarchical_model
+        from models.hierarchical_model import HIERARCHICAL_FILE
+        model, history = train_hierarchical_model(
+            X, y, to_label, config['bottleneck_dim'], version_dir, epochs=epochs
+        )
+        classifier_path = os.path.join(version_dir, HIERARCHICAL_FILE)
+    else:
+        # 6. Создание и обучение модели
+        print(f"\n🧠 Создание модели...")
+        model = AutoencoderDL(
+            input_dim=X.shape[1],
+            bottleneck_dim=config['bottleneck_dim'],
+            num_classes=num_classes
+        )
+
+        print(f"\n🏋️ Обучение модели...")
+        history = model.train_classifier(
+            X, y_cat,
+            epochs=epochs,
+            batch_size=32,
+            validation_split=0.2,
+            use_early_stopping=True
+        )
+
+        # 7. Сохранение модели
+        print(f"\n💾 Сохранение модели...")
+        classifier_path = os.path.join(version_dir, 'classifier.h5')
+        model.save(classifier_path)
+
+        # Веса для NumPy-инференса (INFERENCE_ENGINE=numpy), проверенные на совпадение с Keras
+        from training.export_numpy_weights import export_checked
+        export_checked(classifier_path, os.path.join(version_dir, 'classifier.npz'), vectorizer)
+
+    # Линейная первая ступень каскада (CASCADE_ENABLED) и отчёт cascade_report.json
+    from training.train_linear import train_linear_stage
+    train_linear_stage(X, y, num_classes, model, version_dir)
+
+    # Индекс похожих товаров по bottleneck-векторам (/api/similar_products)
+    from training.build_embedding_index import build_embedding_index
+    build_embedding_index(model, vectorizer, to_id, CSV_PATH, version_dir)
+
+    # 8. Атомарное переключение на новую версию
+    publish_version(model_dir, version, keep=Config.MODEL_VERSIONS_KEEP)
     
     print(f"\n✅ МОДЕЛЬ ДЛЯ {marketplace_name.upper()} ОБУЧЕНА И СОХРАНЕНА!")
     print(f"   Путь: {classifier_path}")
@@ -127,6 +161,60 @@ def train_marketplace_model(marketplace_name: str, output_base_dir: str = None):
     return model, history
 
 
+def train_streaming(marketplace_name, config, csv_path, model_dir, version, version_dir):
+    """
+    Обучение без загрузки CSV в память (STREAMING_TRAINING, training/streaming.py)
+
+    Только плоский классификатор; линейная ступень каскада не обучается
+    (ей нужна вся матрица признаков), сервер работает без каскада.
+    """
+    from training.streaming import StreamingDataset
+    from training.export_numpy_weights import export_checked
+    from training.build_embedding_index import build_embedding_index
+
+    if Config.HIERARCHICAL_CLASSIFIER:
+        print("⚠️ HIERARCHICAL_CLASSIFIER не поддерживается потоковым обучением - обучается плоская модель")
+
+    dataset = StreamingDataset(
+        csv_path,
+        min_samples_per_category=config['min_samples'],
+        max_features=config['max_features']
+    ).scan()
+    save_preprocessing_objects(dataset.vectorizer, dataset.to_id, dataset.to_label, output_dir=version_dir)
+
+    n_rows = dataset.n_train + dataset.n_val
+    epochs = 50 if n_rows < 30000 else 30
+    batch_size = 32
+
+    model = AutoencoderDL(
+        input_dim=len(dataset.vectorizer.vocabulary_),
+        bottleneck_dim=config['bottleneck_dim'],
+        num_classes=dataset.num_classes
+    )
+    history = model.train_classifier_stream(
+        dataset.batches('train', batch_size),
+        dataset.steps('train', batch_size),
+        dataset.batches('val', batch_size, shuffle=False),
+        dataset.steps('val', batch_size),
+        epochs=epochs
+    )
+
+    classifier_path = os.path.join(version_dir, 'classifier.h5')
+    model.save(classifier_path)
+    export_checked(classifier_path, os.path.join(version_dir, 'classifier.npz'), dataset.vectorizer)
+    print("ℹ️ Потоковый режим: линейная ступень каскада не обучается")
+
+    build_embedding_index(model, dataset.vectorizer, dataset.to_id, csv_path, version_dir)
+    publish_version(model_dir, version, keep=Config.MODEL_VERSIONS_KEEP)
+
+    print(f"\n✅ МОДЕЛЬ ДЛЯ {marketplace_name.upper()} ОБУЧЕНА И СОХРАНЕНА (потоковый режим)!")
+    print(f"   Путь: {classifier_path}")
+    print(f"   Количество категорий: {dataset.num_classes}")
+    print(f"   Товаров для обучения: {n_rows:,}")
+
+    return model, history
+
+
 def train_all_marketplaces():
     """Обучение моделей для всех маркетплейсов"""
     print(f"\n{'='*80}")
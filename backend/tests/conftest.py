@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бэкенда импортируются как в gunicorn --chdir src: "from config import Config"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,64 @@
+"""
+Каскад (models/linear_model.py, training/train_linear.py): порог и маршрутизация строк
+"""
+import numpy as np
+from scipy import sparse
+
+
+class StubDeep:
+    """Глубокая модель, которая всегда отвечает заданными метками"""
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def predict_class(self, X, batch_size=None):
+        return self.labels[:X.shape[0]], None
+
+
+def make_linear(threshold):
+    from models.linear_model import LinearClassifier
+
+    W = np.array([[4.0, 0.0], [0.0, 4.0]], dtype=np.float32)
+    return LinearClassifier(W, np.zeros(2, dtype=np.float32), threshold)
+
+
+def test_empty_rows_go_to_deep_model():
+    linear = make_linear(threshold=0.0)
+    X = sparse.csr_matrix(np.array([[1, 0], [0, 0], [0, 1]], dtype=np.float32))
+
+    routed = linear.routed(X, linear.predict_proba(X))
+
+    assert routed.tolist() == [True, False, True]
+    assert linear.routed(X.toarray(), linear.predict_proba(X)).tolist() == [True, False, True]
+
+
+def test_tune_threshold_ignores_ineligible_rows():
+    from training.train_linear import tune_threshold
+
+    probs = np.array([[0.9, 0.1], [0.2, 0.8], [0.6, 0.4]])
+    y = np.array([0, 1, 1])
+    deep_labels = np.array([0, 1, 1])
+
+    assert tune_threshold(probs, deep_labels, y, tolerance=0.0) == 0.8
+    # Без первой строки линейная модель всё ещё отвечает верно на вторую
+    assert tune_threshold(probs, deep_labels, y, tolerance=0.0, eligible=np.array([False, True, True])) == 0.8
+
+
+def test_threshold_not_below_minimum(tmp_path, monkeypatch):
+    from config import Config
+    from training.train_linear import fit_threshold, save_linear_stage, LINEAR_FILE
+
+    monkeypatch.setattr(Config, 'CASCADE_MIN_THRESHOLD', 0.99)
+    linear = make_linear(threshold=1.0)
+    X = sparse.csr_matrix(np.array([[1, 0], [0, 1]] * 5, dtype=np.float32))
+    y = np.array([0, 1] * 5)
+    deep = StubDeep(y)
+
+    linear.threshold = fit_threshold(linear, deep, X, y)
+    assert linear.threshold == 0.99
+
+    # softmax(4, 0) ~ 0.982 < 0.99: линейная модель не отвечает - каскад не сохраняется
+    (tmp_path / LINEAR_FILE).write_bytes(b'stale')
+    saved, report = save_linear_stage(linear, deep, X, y, str(tmp_path), tuning_samples=len(y))
+    assert saved is None and report['threshold'] is None
+    assert not (tmp_path / LINEAR_FILE).exists()
@@ -0,0 +1,30 @@
+"""
+Пометка исправлений после обучения (training/retrain_with_corrections.py)
+"""
+import json
+
+
+def test_only_used_ids_are_marked(tmp_path, monkeypatch):
+    import training.retrain_with_corrections as retrain
+
+    feedback = [
+        {'id': 1, 'marketplace': 'wildberries', 'used_for_training': False},
+        {'id': 2, 'marketplace': 'Wildberries ', 'used_for_training': False},
+        # Пришло во время обучения - в модель не попало
+        {'id': 3, 'marketplace': 'wildberries', 'used_for_training': False},
+        {'id': 4, 'marketplace': 'ozon', 'used_for_training': False},
+    ]
+    path = tmp_path / 'feedback_corrections.json'
+    path.write_text(json.dumps(feedback), encoding='utf-8')
+    monkeypatch.setattr(retrain, 'FEEDBACK_FILE', str(path))
+
+    retrain.mark_corrections_as_used('wildberries', [1, 2, 4], fine_tuned=True)
+    marked = {c['id']: c for c in json.loads(path.read_text(encoding='utf-8'))}
+    assert [i for i, c in marked.items() if c['used_for_training']] == [1, 2]
+    assert marked[1]['fine_tuned'] and 'fine_tuned' not in marked[3]
+    assert [c['id'] for c in retrain.load_corrections('wildberries')] == [3]
+
+    retrain.mark_corrections_as_used('wildberries', [1, 3])
+    marked = {c['id']: c for c in json.loads(path.read_text(encoding='utf-8'))}
+    assert 'fine_tuned' not in marked[1] and marked[2]['fine_tuned'] and marked[3]['used_for_training']
+    assert not marked[4]['used_for_training']
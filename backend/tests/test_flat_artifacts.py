@@ -0,0 +1,36 @@
+"""
+Компактные артефакты (training/flat_artifacts.py): MmapTfidfVectorizer против TfidfVectorizer
+"""
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+TRAIN = [
+    'чайник электрический 1.7л', 'чайник стеклянный', 'ноутбук 15.6 игровой', 'ноутбук asus',
+    'ёлка искусственная 180 см', 'картридж hp 123 черный', 'картридж canon', 'мышь беспроводная',
+]
+QUERIES = TRAIN + ['', 'неизвестное слово', 'ЧАЙНИК чайник чайник', 'x' * 300, 'ноутбук 日本語 ёлка']
+
+
+@pytest.mark.parametrize('params', [
+    dict(lowercase=False, dtype=np.float32),
+    dict(lowercase=True, sublinear_tf=True, dtype=np.float64),
+    dict(binary=True, norm='l1', max_features=10, dtype=np.float32),
+])
+def test_transform_matches_sklearn(tmp_path, params):
+    from training.flat_artifacts import save_flat_artifacts, load_flat_artifacts, MmapTfidfVectorizer
+
+    vectorizer = TfidfVectorizer(**params).fit(TRAIN)
+    save_flat_artifacts(vectorizer, {0: 'a', 1: 'b'}, str(tmp_path))
+    flat, to_id, to_label = load_flat_artifacts(str(tmp_path))
+
+    assert isinstance(flat, MmapTfidfVectorizer)
+    assert to_label == {0: 'a', 1: 'b'} and to_id == {'a': 0, 'b': 1}
+    expected = vectorizer.transform(QUERIES)
+    actual = flat.transform(QUERIES)
+    assert actual.dtype == expected.dtype
+    assert abs(expected - actual).max() <= 1e-6
+    # Словарь-dict не строится для transform
+    assert flat._vocabulary is None
+    assert flat.vocabulary_ == vectorizer.vocabulary_
+    assert abs(flat.to_sklearn().transform(QUERIES) - expected).max() <= 1e-6
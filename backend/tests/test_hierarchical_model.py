@@ -0,0 +1,67 @@
+"""
+Иерархический классификатор (models/hierarchical_model.py): разреженные головы и формат 1
+"""
+import numpy as np
+import pytest
+from scipy import sparse
+
+INPUT_DIM = 50
+HIDDEN = 8
+# Листья 0-2 у родителя 0, 3-4 у родителя 1
+HEAD_OFFSETS = np.array([0, 3, 5])
+HEAD_LEAVES = np.array([0, 1, 2, 3, 4])
+
+
+@pytest.fixture(scope='module')
+def parts():
+    rng = np.random.default_rng(0)
+    trunk_layers = [
+        (rng.normal(size=(INPUT_DIM, HIDDEN)).astype(np.float32), np.zeros(HIDDEN, dtype=np.float32), 'relu'),
+        (rng.normal(size=(HIDDEN, 2)).astype(np.float32), np.zeros(2, dtype=np.float32), 'softmax'),
+    ]
+    head_W = rng.normal(size=(INPUT_DIM, 5)).astype(np.float32)
+    head_W[np.abs(head_W) < 1] = 0
+    head_b = rng.normal(size=5).astype(np.float32)
+    return trunk_layers, head_W, head_b
+
+@pytest.fixture(scope='module')
+def X():
+    return sparse.random(40, INPUT_DIM, density=0.1, format='csr', dtype=np.float32, random_state=1)
+
+
+def test_sparse_heads_match_dense(tmp_path, parts, X):
+    from models.hierarchical_model import HierarchicalClassifier
+
+    trunk_layers, head_W, head_b = parts
+    path = str(tmp_path / 'hierarchical.npz')
+    HierarchicalClassifier.save(path, trunk_layers, sparse.csc_matrix(head_W), head_b, HEAD_OFFSETS, HEAD_LEAVES, 5)
+    model = HierarchicalClassifier.load(path, beam=2)
+
+    assert model.head_W.nnz == np.count_nonzero(head_W)
+    dense = X.toarray()
+    expected = np.zeros((X.shape[0], 5), dtype=np.float32)
+    parent_probs = model.trunk.predict_proba(X)
+    for parent in range(2):
+        start, end = HEAD_OFFSETS[parent], HEAD_OFFSETS[parent + 1]
+        scores = dense @ head_W[:, start:end] + head_b[start:end]
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        expected[:, start:end] = scores / scores.sum(axis=1, keepdims=True) * parent_probs[:, [parent]]
+
+    np.testing.assert_allclose(model.predict_proba(X), expected, atol=1e-5)
+    np.testing.assert_allclose(model.predict_proba(dense), expected, atol=1e-5)
+
+
+def test_loads_format_1_dense_heads(tmp_path, parts, X):
+    from models.hierarchical_model import HierarchicalClassifier
+
+    trunk_layers, head_W, head_b = parts
+    path = str(tmp_path / 'hierarchical.npz')
+    HierarchicalClassifier.save(path, trunk_layers, head_W, head_b, HEAD_OFFSETS, HEAD_LEAVES, 5)
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files if not key.startswith('head_W_')}
+    arrays.update(format_version=np.array(1), head_W=head_W)
+    old_path = str(tmp_path / 'v1.npz')
+    np.savez(old_path, **arrays)
+
+    np.testing.assert_allclose(HierarchicalClassifier.load(old_path, beam=2).predict_proba(X),
+                               HierarchicalClassifier.load(path, beam=2).predict_proba(X), atol=1e-6)
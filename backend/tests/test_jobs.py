@@ -0,0 +1,70 @@
+"""
+Фоновые задачи (api/jobs.py): какие задачи running возвращаются в очередь
+"""
+import os
+import socket
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    from database.models import db
+    import api.jobs as jobs
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "jobs.db"}'
+    db.init_app(app)
+    monkeypatch.setattr(jobs, '_owner', f'{socket.gethostname()}:{os.getpid()}:current')
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_requeues_jobs_of_dead_owners(app):
+    from database.models import db, ClassificationJob
+    from api.jobs import requeue_orphaned_jobs
+
+    ClassificationJob.__table__.create(db.engine)
+    host, now = socket.gethostname(), datetime.now()
+    old = now - timedelta(hours=1)
+    owners = {
+        'own': (f'{host}:{os.getpid()}:current', now),
+        'dead_pid': (f'{host}:{dead_pid()}:x', now),
+        'previous_boot': (f'{host}:{os.getpid()}:previous', now),
+        'alive_pid': (f'{host}:{os.getppid()}:x', now),
+        'other_host_fresh': ('other-host:1:x', now),
+        'other_host_stale': ('other-host:1:x', old),
+        'legacy_fresh': (None, now),
+    }
+    for job_id, (owner, heartbeat) in owners.items():
+        db.session.add(ClassificationJob(id=job_id, marketplace='wildberries', status='running',
+                                         owner=owner, heartbeat_at=heartbeat, updated_at=heartbeat))
+    db.session.commit()
+
+    assert sorted(requeue_orphaned_jobs()) == ['dead_pid', 'other_host_stale', 'previous_boot']
+    assert requeue_orphaned_jobs() == []
+
+
+def test_adds_columns_to_old_table(app):
+    from sqlalchemy import inspect, text
+    from database.models import db, ClassificationJob
+    from api.jobs import _add_missing_columns
+
+    with db.engine.begin() as connection:
+        connection.execute(text('CREATE TABLE classification_jobs (id VARCHAR(36) PRIMARY KEY, '
+                                'marketplace VARCHAR(32), status VARCHAR(20), updated_at DATETIME)'))
+    _add_missing_columns()
+
+    columns = {column['name'] for column in inspect(db.engine).get_columns('classification_jobs')}
+    assert columns == {column.name for column in ClassificationJob.__table__.columns}
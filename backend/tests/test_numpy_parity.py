@@ -0,0 +1,96 @@
+"""
+NumPy-инференс (models/numpy_engine.py) против Keras на небольшой модели из autoencoder_model.py
+"""
+import numpy as np
+import pytest
+from scipy import sparse
+
+INPUT_DIM = 300
+NUM_CLASSES = 12
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory):
+    """(Keras-модель, путь к classifier.npz) - модель со случайными весами, выгруженная export_classifier"""
+    from models.autoencoder_model import AutoencoderDL
+    from training.export_numpy_weights import export_classifier
+
+    model = AutoencoderDL(input_dim=INPUT_DIM, bottleneck_dim=16, num_classes=NUM_CLASSES)
+    model.build_model()
+    directory = tmp_path_factory.mktemp('model')
+    classifier_path = str(directory / 'classifier.h5')
+    model.save(classifier_path)
+    return export_classifier(classifier_path, str(directory / 'classifier.npz')), str(directory / 'classifier.npz')
+
+@pytest.fixture(scope='module')
+def X():
+    """TF-IDF-подобные строки: несколько ненулевых признаков, L2-норма 1, одна пустая строка"""
+    X = sparse.random(200, INPUT_DIM, density=0.02, format='lil', dtype=np.float32, random_state=0)
+    X[5] = 0
+    X = X.tocsr()
+    norms = sparse.linalg.norm(X, axis=1)
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ X, dtype=np.float32)
+
+
+def test_sparse_input_matches_keras(exported, X):
+    from training.export_numpy_weights import check_parity, PARITY_TOLERANCE
+
+    classifier, npz_path = exported
+    max_abs_diff, agreement = check_parity(classifier, npz_path, X)
+    assert max_abs_diff <= PARITY_TOLERANCE
+    assert agreement == 1.0
+
+def test_dense_input_matches_sparse(exported, X):
+    from models.numpy_engine import NumpyClassifier
+
+    model = NumpyClassifier.load(exported[1])
+    np.testing.assert_allclose(model.predict_proba(X.toarray()), model.predict_proba(X), atol=1e-6)
+
+def test_embed_matches_keras_bottleneck(exported, X):
+    from keras.models import Model
+    from models.numpy_engine import NumpyClassifier
+
+    classifier, npz_path = exported
+    encoder = Model(classifier.input, classifier.get_layer('bottleneck_layer').output)
+    expected = encoder.predict(X.toarray(), verbose=0)
+    np.testing.assert_allclose(NumpyClassifier.load(npz_path).embed(X), expected, atol=1e-4)
+
+@pytest.mark.parametrize('quantization, tolerance', [('float16', 1e-2), ('int8', 5e-2)])
+def test_quantized_close_to_keras(exported, X, quantization, tolerance):
+    from models.numpy_engine import NumpyClassifier
+    from training.export_numpy_weights import check_parity
+
+    classifier, npz_path = exported
+    keras_probs = classifier.predict(X.toarray(), verbose=0)
+    model = NumpyClassifier.load(npz_path, quantization=quantization)
+    for X_input in (X, X.toarray()):
+        assert np.abs(keras_probs - model.predict_proba(X_input)).max() <= tolerance
+    _, agreement = check_parity(classifier, npz_path, X, tolerance=tolerance, quantization=quantization)
+    assert agreement >= 0.95
+
+@pytest.mark.parametrize('quantization', ['float16', 'int8'])
+def test_quantized_dense_input_matches_sparse(exported, X, monkeypatch, quantization):
+    from models import numpy_engine
+    from models.numpy_engine import NumpyClassifier
+
+    _, npz_path = exported
+    model = NumpyClassifier.load(npz_path, quantization=quantization)
+    expected = model.predict_proba(X)
+    # Маленький блок: плотный путь восстанавливает веса по частям, а не всю матрицу
+    monkeypatch.setattr(numpy_engine, 'DEQUANTIZE_BLOCK', 1000)
+    monkeypatch.setattr(numpy_engine, 'SPARSE_INPUT_DENSITY', 0)
+    np.testing.assert_allclose(model.predict_proba(X.toarray()), expected, atol=1e-5)
+
+def test_check_parity_rejects_mismatch(exported, X, tmp_path):
+    from training.export_numpy_weights import check_parity
+
+    classifier, npz_path = exported
+    with np.load(npz_path) as data:
+        arrays = dict(data)
+    arrays['b0'] = arrays['b0'] + 1.0
+    broken_path = str(tmp_path / 'broken.npz')
+    np.savez(broken_path, **arrays)
+
+    with pytest.raises(AssertionError):
+        check_parity(classifier, broken_path, X)
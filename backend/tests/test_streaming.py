@@ -0,0 +1,24 @@
+"""
+Потоковая разметка (training/streaming.py): дубликаты между кусками CSV
+"""
+import pandas as pd
+
+
+def test_duplicates_across_chunks_keep_first_row(tmp_path):
+    from training.streaming import StreamingDataset
+
+    rows = [
+        ('Чайник', 'Дом/Кухня'), ('Ноутбук', 'Техника/Ноутбуки'), ('Чайник', 'Техника/Ноутбуки'),
+        ('  ', 'Дом/Кухня'), ('Кружка', 'Дом/Кухня'), ('Ноутбук', 'Дом/Кухня'), ('Мышь', None),
+        ('Кружка', 'Дом/Кухня'),
+    ]
+    path = tmp_path / 'products.csv'
+    pd.DataFrame(rows, columns=['product_name', 'category_path']).to_csv(path, index=False)
+
+    dataset = StreamingDataset(path, min_samples_per_category=1, validation_split=0, chunk_rows=2)
+    dataset._scan_labels()
+
+    assert dataset.to_id == {'Дом/Кухня': 0, 'Техника/Ноутбуки': 1}
+    # Остаются первые вхождения названий; пустое название и строка без категории выбрасываются
+    assert dataset.row_labels.tolist() == [0, 1, -1, -1, 0, -1, -1, -1]
+    assert (dataset.n_train, dataset.n_val) == (3, 0)
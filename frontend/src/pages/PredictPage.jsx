@@ -211,8 +211,10 @@ const PredictPage = () => {
     setResults([]);
 
     try {
-      const data = await classification.classificationFromFile(file, marketplace);
-      setResults(data.results || []);
+      // Результаты приходят порциями и показываются по мере классификации
+      await classification.classificationFromFileStream(file, marketplace, (batch) => {
+        setResults(prev => [...prev, ...batch]);
+      });
       setUploadProgress(100);
     } catch (err) {
       setError(err.response?.data?.error || 'Ошибка при загрузке файла');
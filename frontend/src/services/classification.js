@@ -21,6 +21,69 @@ export const classification = {
         const response = await api.post('/predict_category_from_file', formData, {headers: { 'Content-Type': 'multipart/form-data' }});
         return response.data;
     },
+    // Потоковая классификация файла: сервер отдаёт NDJSON (одна строка - один товар),
+    // onResults вызывается с каждой новой порцией результатов
+    classificationFromFileStream: async (file, marketplace = 'wildberries', onResults = () => {}) => {
+        const formData = new FormData();
+        formData.append('file', file);
+        formData.append('marketplace', marketplace);
+
+        const token = localStorage.getItem('token');
+        const response = await fetch(`${api.defaults.baseURL}/predict_category_from_file?stream=1`, {
+            method: 'POST',
+            headers: token ? { Authorization: `Bearer ${token}` } : {},
+            body: formData
+        });
+
+        if (!response.ok) {
+            if (response.status === 401) {
+                localStorage.removeItem('token');
+                localStorage.removeItem('username');
+                localStorage.removeItem('role');
+                window.location.href = '/login';
+            }
+            const data = await response.json().catch(() => ({}));
+            // Та же форма ошибки, что у axios (err.response.data.error)
+            const error = new Error(data.error || `HTTP ${response.status}`);
+            error.response = { status: response.status, data };
+            throw error;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let summary = null;
+
+        const handleLines = (lines) => {
+            const batch = [];
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const item = JSON.parse(line);
+                if (item.summary) {
+                    summary = item.summary;
+                } else if (item.error && !item.product_name) {
+                    const error = new Error(item.error);
+                    error.response = { data: item };
+                    throw error;
+                } else {
+                    batch.push(item);
+                }
+            }
+            if (batch.length > 0) onResults(batch);
+        };
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            handleLines(lines);
+        }
+        handleLines([buffer + decoder.decode()]);
+
+        return summary;
+    },
     correctCategory: async (productName, marketplace, predictedCategory, correctedCategory, confidence = 0) => {
         const response = await api.post('/feedback/correct', {
             product_name: productName,